@@ -18,19 +18,55 @@
 """
 
 # API Dependencies
+import time
+# Startup is timed from here, so that the report includes our imports.
+_startup_began = time.perf_counter()
 import pickle
 import json
 import numpy as np
-from model import load_model, make_prediction
-from flask import Flask, request, jsonify
+import config
+from batching import MicroBatcher
+from prediction_cache import PredictionCache
+from monitoring import process_memory
+from profiling import ProfilingMiddleware, TOKEN_HEADER, is_admin, list_profiles, profile_path, \
+    profile_report
+from metrics import Counter, Gauge, Histogram, Registry, BATCH_SIZE_BUCKETS, CONTENT_TYPE
+from request_schema import RequestError, RequestSchema, loads
+from matrix_format import MEDIA_TYPE, decode_matrix, encode_matrix
+from model_registry import ModelRegistry, synthetic_record
+from feature_store import FeatureStore, TIME_SERIES_FEATURES
+from model import make_prediction, make_batch_prediction, make_stream_prediction, make_forecast, \
+    make_matrix_prediction
+from flask import Flask, Response, abort, g, request, jsonify, send_file, stream_with_context
 
 # Application definition
 app = Flask(__name__)
 
+# The seconds taken by each phase of starting up, reported once the API is
+# ready to serve.
+startup = {'imports': time.perf_counter() - _startup_began}
+ready = False
+# Set while the synthetic warm-up requests are being served.
+warming_up = False
+
 # Load our model into memory.
-# Please update this path to reflect your own trained model.
-static_model = load_model(
-    path_to_model='assets/trained-models/load_shortfall_simple_lm_regression.pkl')
+# Please update the path within `config.py` to reflect your own trained model.
+# Models are held within a registry, which may serve several named models,
+# and swap in new versions of them while the API is running. Single records
+# are validated against the request schema, compiled for each model.
+# The lag and rolling features of models trained with them are served from
+# the recent observations held in the feature store.
+schema = RequestSchema.load(config.REQUEST_SCHEMA_PATH) if config.REQUEST_SCHEMA_PATH else None
+feature_store = FeatureStore(TIME_SERIES_FEATURES, path=config.FEATURE_STORE_PATH or None)
+models = ModelRegistry(schema=schema, max_bytes=config.MODEL_REGISTRY_MAX_BYTES,
+                       check_interval=config.MODEL_RELOAD_CHECK_SECONDS, feature_store=feature_store)
+models.register(config.MODEL_NAME, config.MODEL_PATH, load=True)
+for name, path in config.MODELS.items():
+    models.register(name, path)
+# The version of our default model loaded at startup.
+static_model = models.get(config.MODEL_NAME).pipeline
+startup['model_load'] = models.get(config.MODEL_NAME).load_seconds
+startup['model_warm_up'] = models.get(config.MODEL_NAME).warm_up_seconds
 
 print ('-'*40)
 print ('Model successfully loaded')
@@ -40,26 +76,411 @@ print ('-'*40)
     any auxiliary functions required to process your model's artifacts.
 """
 
+# Optionally cache predictions for repeated feature vectors, and group
+# concurrent single-record requests into batches. Each model has its own.
+caches = {}
+batchers = {}
+
+def _cache(name):
+    """The prediction cache of a model, or None if caching is disabled.
+
+    The synthetic warm-up requests are never cached.
+    """
+    if config.PREDICTION_CACHE_SIZE <= 0 or warming_up:
+        return None
+    cache = caches.get(name)
+    if cache is None:
+        cache = caches.setdefault(name, PredictionCache(max_entries=config.PREDICTION_CACHE_SIZE,
+                                                        ttl_seconds=config.PREDICTION_CACHE_TTL_SECONDS))
+    return cache
+
+def _batcher(name):
+    """The micro-batcher of a model, or None if micro-batching is disabled.
+
+    The warm-up requests are never batched, so that no scheduling thread
+    is started within the master process of a forking server.
+    """
+    if not config.MICRO_BATCHING or warming_up:
+        return None
+    batcher = batchers.get(name)
+    if batcher is None:
+        batcher = batchers.setdefault(name, MicroBatcher(
+            max_batch_size=config.MICRO_BATCH_MAX_SIZE, max_wait_ms=config.MICRO_BATCH_MAX_WAIT_MS))
+    return batcher
+
+def _served_model(name):
+    """The served version of the named model, or of our default model."""
+    name = name or config.MODEL_NAME
+    try:
+        return models.get(name)
+    except KeyError:
+        raise RequestError(f'Unknown model: {name!r}', status=404) from None
+
+# Metrics describing how our API is serving predictions, exposed at /metrics.
+registry = Registry()
+requests_total = registry.register(Counter(
+    'load_shortfall_requests_total', 'Requests handled, by route and status code.', ['route', 'status']))
+requests_in_flight = registry.register(Gauge(
+    'load_shortfall_requests_in_flight', 'Requests currently being handled.'))
+request_seconds = registry.register(Histogram(
+    'load_shortfall_request_duration_seconds', 'Time taken to handle each request.', ['route']))
+stage_seconds = registry.register(Histogram(
+    'load_shortfall_stage_duration_seconds', 'Time spent in each stage of handling a prediction request.',
+    ['route', 'stage']))
+batch_rows = registry.register(Histogram(
+    'load_shortfall_batch_rows', 'Rows scored by each batch request.', ['route'], buckets=BATCH_SIZE_BUCKETS))
+model_info = registry.register(Gauge(
+    'load_shortfall_model_info', 'The version of each model being served.', ['model', 'model_version']))
+
+def _record_model_swap(name, old, new):
+    if old is not None:
+        model_info.remove(name, str(old.model_version))
+    model_info.set(name, str(new.model_version), value=1)
+
+models.add_listener(_record_model_swap)
+_record_model_swap(config.MODEL_NAME, None, models.get(config.MODEL_NAME))
+registry.register(Gauge(
+    'process_resident_memory_bytes', 'Resident memory size of this process in bytes.',
+    function=lambda: process_memory().get('rss', 0)))
+
+@app.before_request
+def _start_request():
+    g.started = time.perf_counter()
+    # The synthetic warm-up requests are not recorded.
+    g.recorded = config.METRICS and not warming_up
+    # Prediction routes add the time spent in each of their stages.
+    g.timings = {} if g.recorded else None
+    if g.recorded:
+        requests_in_flight.inc()
+
+@app.after_request
+def _record_request(response):
+    if g.recorded:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        requests_total.inc(route, str(response.status_code))
+        request_seconds.observe(route, value=time.perf_counter() - g.started)
+        for stage, seconds in g.timings.items():
+            stage_seconds.observe(route, stage, value=seconds)
+    return response
+
+@app.teardown_request
+def _finish_request(error=None):
+    if g.get('recorded'):
+        requests_in_flight.dec()
+
+def _timed(stage, started):
+    """Add the time since `started` to a stage of this request, returning
+    the current time."""
+    now = time.perf_counter()
+    if g.timings is not None:
+        g.timings[stage] = g.timings.get(stage, 0.0) + now - started
+    return now
+
+def _matrix_prediction(model):
+    """Answer a binary feature matrix request with a matrix of predictions.
+
+    The predictions of failed rows are NaN, and the reasons for these
+    failures are given in the `errors` list of the response header.
+    """
+    started = time.perf_counter()
+    try:
+        header, matrix = decode_matrix(request.get_data())
+        started = _timed('decode', started)
+        prediction, errors = make_matrix_prediction(header['columns'], matrix, model.pipeline)
+        started = _timed('predict', started)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    if g.timings is not None:
+        batch_rows.observe(request.url_rule.rule, value=len(matrix))
+    columns = ['load_shortfall_3h'] if prediction.shape[1] == 1 else \
+        [f'load_shortfall_3h_{output}' for output in range(prediction.shape[1])]
+    body = encode_matrix(columns, prediction, errors=errors,
+                         model_version=model.model_version)
+    _timed('serialize', started)
+    return Response(body, mimetype=MEDIA_TYPE)
+
 
 # Define the API's interface.
 # Here the 'model_prediction()' function will be called when a POST request
 # is sent to our interface located at:
 # http:{Host-machine-ip-address}:5000/api_v0.1
+# Each route may also be given the name of a registered model to use, e.g.
+# http:{Host-machine-ip-address}:5000/api_v0.1/models/{name}
 @app.route('/api_v0.1', methods=['POST'])
-def model_prediction():
+@app.route('/api_v0.1/models/<name>', methods=['POST'])
+def model_prediction(name=None):
+    model = _served_model(name)
+    # Binary feature matrices are answered in the same format.
+    if request.mimetype == MEDIA_TYPE:
+        return _matrix_prediction(model)
+    decoder = model.decoder
+    batcher = _batcher(model.name)
     # We retrieve the data payload of the POST request
-    data = request.get_json(force=True)
+    started = time.perf_counter()
+    data = request.get_data() if decoder is not None else request.get_json(force=True)
+    started = _timed('decode', started)
     # We then preprocess our data, and use our pretrained model to make a
-    # prediction.
-    output = make_prediction(data, static_model)
+    # prediction. With micro-batching, the preprocessed row is scored
+    # together with those of concurrent requests.
+    output = make_prediction(data, model.pipeline, _cache(model.name), decoder,
+                             timings=g.timings, batcher=batcher)
+    started = time.perf_counter()
     # We finally package this prediction as a JSON object to deliver a valid
     # response with our API.
-    return jsonify(output)
+    response = jsonify(output)
+    _timed('serialize', started)
+    return response
+
+# Batch predictions are served at:
+# http:{Host-machine-ip-address}:5000/api_v0.1/batch
+# The payload is either a list of feature records, or a mapping of feature
+# names to lists of values. All rows are scored with a single model call.
+@app.route('/api_v0.1/batch', methods=['POST'])
+@app.route('/api_v0.1/models/<name>/batch', methods=['POST'])
+def batch_model_prediction(name=None):
+    model = _served_model(name)
+    if request.mimetype == MEDIA_TYPE:
+        return _matrix_prediction(model)
+    # Accept a JSON-encoded string, as sent by `utils/request.py`.
+    started = time.perf_counter()
+    data = loads(request.get_data())
+    if not isinstance(data, (list, dict)):
+        raise RequestError('Expected a list of records or a mapping of columns.')
+    _timed('decode', started)
+    output = make_batch_prediction(data, model.pipeline, _cache(model.name), timings=g.timings)
+    started = time.perf_counter()
+    response = jsonify(output)
+    _timed('serialize', started)
+    if g.timings is not None:
+        batch_rows.observe(request.url_rule.rule, value=len(output['predictions']))
+    return response
+
+# Streamed predictions are served at:
+# http:{Host-machine-ip-address}:5000/api_v0.1/stream
+# The request body holds one JSON feature record per line, which are read and
+# scored in chunks. One JSON result is streamed back per line as soon as its
+# chunk has been scored, so that memory use does not grow with the input.
+@app.route('/api_v0.1/stream', methods=['POST'])
+@app.route('/api_v0.1/models/<name>/stream', methods=['POST'])
+def stream_model_prediction(name=None):
+    model = _served_model(name)
+
+    def generate():
+        for result in make_stream_prediction(request.stream, model.pipeline,
+                                             chunk_size=config.STREAM_CHUNK_SIZE,
+                                             cache=_cache(model.name)):
+            yield json.dumps(result) + '\n'
+    # The server only asks for more results as the client reads them, so
+    # reading of the request body is paced by the client.
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Forecasts for every three-hour slot of a time range are served at:
+# http:{Host-machine-ip-address}:5000/api_v0.1/forecast
+# The payload holds the `start` and `end` of the range, along with a table of
+# `weather` forecasts, either as a list of records or a mapping of columns.
+# Every slot is scored with a single model call.
+@app.route('/api_v0.1/forecast', methods=['POST'])
+@app.route('/api_v0.1/models/<name>/forecast', methods=['POST'])
+def forecast_prediction(name=None):
+    model = _served_model(name)
+    started = time.perf_counter()
+    data = loads(request.get_data())
+    if not isinstance(data, dict):
+        raise RequestError('Expected a JSON object holding `start`, `end` and `weather`.')
+    _timed('decode', started)
+    try:
+        output = make_forecast(data.get('start'), data.get('end'), data.get('weather'), model.pipeline,
+                               max_slots=config.FORECAST_MAX_SLOTS,
+                               max_weather_age_hours=config.FORECAST_MAX_WEATHER_AGE_HOURS, timings=g.timings)
+    except ValueError as error:
+        raise RequestError(str(error), status=422) from None
+    started = time.perf_counter()
+    response = jsonify(output)
+    _timed('serialize', started)
+    if g.timings is not None:
+        batch_rows.observe(request.url_rule.rule, value=len(output['predictions']))
+    return response
+
+# Invalid payloads are answered with a description of what is wrong with them.
+@app.errorhandler(RequestError)
+def invalid_request(error):
+    return jsonify(error.to_dict()), error.status
+
+# Counters describing how our API is serving predictions.
+@app.route('/api_v0.1/stats', methods=['GET'])
+def serving_stats():
+    stats = {'model_version': models.get(config.MODEL_NAME).model_version,
+             'models': models.describe(), 'memory': process_memory()}
+    if batchers:
+        stats['batching'] = {name: batcher.stats() for name, batcher in batchers.items()}
+    if caches:
+        stats['cache'] = {name: cache.stats() for name, cache in caches.items()}
+    return jsonify(stats)
+
+# Metrics in the Prometheus text format, describing the worker process
+# handling the request.
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+# Optionally profile selected prediction requests. The middleware is only
+# installed when profiling is enabled, leaving other requests untouched.
+if config.PROFILING_TOKEN or config.PROFILING_SAMPLE_EVERY > 0:
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, config.PROFILING_DIR,
+                                       token=config.PROFILING_TOKEN,
+                                       sample_every=config.PROFILING_SAMPLE_EVERY,
+                                       max_profiles=config.PROFILING_MAX_PROFILES)
+
+def _require_admin():
+    """Abort unless the request carries the profiling token, or the model
+    admin token, e.g. when profiles are only sampled."""
+    if not config.PROFILING_TOKEN and not config.ADMIN_TOKEN:
+        abort(404)
+    if not (is_admin(config.PROFILING_TOKEN, request.headers.get(TOKEN_HEADER))
+            or is_admin(config.ADMIN_TOKEN, request.headers.get('X-Admin-Token'))):
+        abort(403)
+
+# Saved request profiles are listed at:
+# http:{Host-machine-ip-address}:5000/admin/profiles
+# and each may be fetched as a pstats file, or as a text report with
+# `?format=text`, ordered by any `pstats.SortKey` given as `?sort=`. Both
+# require the profiling token in the `X-Profile-Token` header, or the model
+# admin token in the `X-Admin-Token` header.
+@app.route('/admin/profiles', methods=['GET'])
+def request_profiles():
+    _require_admin()
+    return jsonify(list_profiles(config.PROFILING_DIR))
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def request_profile(profile_id):
+    _require_admin()
+    path = profile_path(config.PROFILING_DIR, profile_id)
+    if path is None:
+        abort(404)
+    if request.args.get('format') == 'text':
+        try:
+            report = profile_report(path, sort=request.args.get('sort', 'cumulative'))
+        except ValueError as error:
+            raise RequestError(str(error)) from None
+        return Response(report, mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.pstats')
+
+def _require_model_admin():
+    """Abort unless the request carries the model admin token."""
+    if not config.ADMIN_TOKEN:
+        abort(404)
+    if not is_admin(config.ADMIN_TOKEN, request.headers.get('X-Admin-Token')):
+        abort(403)
+
+# The registered models are listed at:
+# http:{Host-machine-ip-address}:5000/admin/models
+# A model is reloaded, optionally from a new artifact given as `{"path": ...}`,
+# by a POST to /admin/models/{name}/reload, and its previous version restored
+# by a POST to /admin/models/{name}/rollback. These require the admin token in
+# the `X-Admin-Token` header, and only affect the worker process handling them.
+@app.route('/admin/models', methods=['GET'])
+def registered_models():
+    _require_model_admin()
+    return jsonify(models.describe())
+
+@app.route('/admin/models/<name>/reload', methods=['POST'])
+def reload_model(name):
+    _require_model_admin()
+    if name not in models.names():
+        raise RequestError(f'Unknown model: {name!r}', status=404)
+    data = loads(request.get_data()) if request.get_data() else {}
+    if not isinstance(data, dict) or not isinstance(data.get('path', ''), str):
+        raise RequestError('Expected a JSON object, optionally holding the `path` of a new artifact.')
+    try:
+        loaded = models.load(name, data.get('path'))
+    except Exception as error:
+        # The served version is left in place.
+        raise RequestError(f'Could not load {name!r}: {error}', status=422) from None
+    return jsonify({'model': name, 'model_version': loaded.model_version, 'path': loaded.path})
+
+@app.route('/admin/models/<name>/rollback', methods=['POST'])
+def rollback_model(name):
+    _require_model_admin()
+    try:
+        loaded = models.rollback(name)
+    except KeyError:
+        raise RequestError(f'{name!r} has no previous version to roll back to.', status=409) from None
+    except ValueError as error:
+        # The served version is left in place.
+        raise RequestError(f'Could not roll {name!r} back: {error}', status=409) from None
+    return jsonify({'model': name, 'model_version': loaded.model_version, 'path': loaded.path})
+
+# Observations, such as the weather of each city and the actual shortfall of
+# a period once known, are added to the feature store by a POST to:
+# http:{Host-machine-ip-address}:5000/admin/observations
+# holding a feature record, or a list of them, with its `time`. This requires
+# the admin token in the `X-Admin-Token` header.
+@app.route('/admin/observations', methods=['POST'])
+def add_observations():
+    _require_model_admin()
+    data = loads(request.get_data())
+    records = [data] if isinstance(data, dict) else data
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise RequestError('Expected a JSON object, or a list of objects, holding observations.')
+    missing = [row for row, record in enumerate(records) if record.get('time') is None]
+    if missing:
+        raise RequestError(f'Every observation must hold its `time`, unlike rows {missing}.',
+                           fields=[{'field': 'time', 'error': 'This field is required.'}])
+    observations = {column: [record.get(column) for record in records]
+                    for column in ['time'] + feature_store.columns}
+    added = feature_store.ingest(observations)
+    return jsonify({'records': len(records), 'values': added})
+
+# Liveness: the process is up and answering requests.
+@app.route('/live', methods=['GET'])
+def live():
+    return jsonify({'status': 'live'})
+
+# Readiness: the model is loaded and every route has been warmed up, so the
+# first requests are served as quickly as any other.
+@app.route('/ready', methods=['GET'])
+def ready_check():
+    if not ready:
+        return jsonify({'status': 'starting'}), 503
+    return jsonify({'status': 'ready', 'startup_seconds': startup})
+
+def _warm_up():
+    """Send a synthetic record through the prediction routes, so that the
+    lazy initialisation of Flask, and of pandas for batches, is done before
+    the API reports itself ready."""
+    global warming_up
+    client = app.test_client()
+    payload = json.dumps(synthetic_record(static_model))
+    routes = [('/api_v0.1', payload)]
+    if config.WARM_UP_BATCH:
+        routes.append(('/api_v0.1/batch', f'[{payload}]'))
+    warming_up = True
+    try:
+        for route, body in routes:
+            response = client.post(route, data=body, content_type='application/json')
+            if response.status_code != 200:
+                raise RuntimeError(f'Warm-up request to {route} failed: {response.get_data(as_text=True)}')
+    finally:
+        warming_up = False
+
+started = time.perf_counter()
+try:
+    _warm_up()
+    ready = True
+except Exception as error:
+    # Keep answering liveness checks, but never report ready.
+    app.logger.exception('Warm-up failed: %s', error)
+startup['route_warm_up'] = time.perf_counter() - started
+startup['total'] = time.perf_counter() - _startup_began
+print('Startup: ' + ', '.join(f"{phase.replace('_', ' ')} {seconds:.3f}s"
+                              for phase, seconds in startup.items()))
 
 # Configure Server Startup properties.
 # Note:
 # When developing your API, set `debug=True`
 # This will allow Flask to automatically restart itself everytime you
 # update your API code.
+# In production, launch the API with `python serve.py` instead.
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
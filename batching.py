@@ -0,0 +1,192 @@
+"""
+
+    Micro-batching of single-record prediction requests.
+
+    Description: This file contains a scheduler which places concurrent
+    single-record requests on a queue, and scores them together in batches
+    with a single prediction call. Each record is preprocessed by the fast
+    path on its own request thread, and its feature row is copied into a
+    preallocated matrix holding the batch. Results are handed back to each
+    waiting request.
+
+"""
+
+# Batching Dependencies
+import bisect
+import collections
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+import numpy as np
+
+# Upper bounds, in milliseconds, of the queue wait time histogram buckets.
+QUEUE_WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+
+_Request = collections.namedtuple('_Request', ['model', 'row', 'future', 'enqueued'])
+
+
+class MicroBatcher:
+    """Groups preprocessed feature rows into batches for prediction.
+
+    A batch is scored once it holds `max_batch_size` rows, or once its
+    first row has waited `max_wait_ms` milliseconds. The scheduling
+    thread is started on first use. A forked child process never inherits
+    it: the queue, lock and thread are rebuilt in the child, so that each
+    worker of a forking server starts its own.
+
+    Parameters
+    ----------
+    max_batch_size : int
+        The largest number of rows scored together.
+    max_wait_ms : float
+        The longest time a row waits for others to join its batch.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait_ms=2.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._reset()
+        # The matrix into which each batch is stacked, reused between batches.
+        self._matrix = None
+        self._batch_sizes = collections.Counter()
+        self._wait_counts = [0] * (len(QUEUE_WAIT_BUCKETS_MS) + 1)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        # A thread does not survive a fork, while the waiters registered on
+        # the condition of its queue do, and would swallow notifications.
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_after_fork(weakref.ref(self)))
+
+    def _reset(self):
+        """Private helper function creating the queue and lock of a process,
+        whose scheduling thread is yet to be started."""
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, model, row):
+        """Queue a preprocessed feature row for prediction.
+
+        Parameters
+        ----------
+        model : FittedPipeline
+            The model with which to score the row.
+        row : Numpy ndarray
+            The float64 features of a single record, in the order of the
+            model's columns. It is read when the batch is scored, so must
+            not be changed until the prediction is returned.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to a 1-D list containing the model prediction.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put(_Request(model, row, future, time.monotonic()))
+        return future
+
+    def predict(self, model, row, timeout=None):
+        """Predict for a single feature row, waiting for its batch."""
+        return self.submit(model, row).result(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the deadline, only take records which are already queued.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self._record(batch)
+            # Rows preprocessed for different versions of a model are scored apart.
+            groups = {}
+            for request in batch:
+                groups.setdefault(id(request.model), []).append(request)
+            for requests in groups.values():
+                self._score(requests)
+
+    def _score(self, requests):
+        """Private helper function scoring rows with a single prediction call."""
+        try:
+            width = len(requests[0].row)
+            if self._matrix is None or self._matrix.shape[1] != width:
+                self._matrix = np.empty((self.max_batch_size, width))
+            X = self._matrix[:len(requests)]
+            for position, request in enumerate(requests):
+                X[position] = request.row
+            # The matrix is owned by the batcher, so is standardised in place.
+            prediction = np.reshape(requests[0].model.predict(X, overwrite=True), (len(requests), -1))
+        except Exception as error:
+            for request in requests:
+                request.future.set_exception(error)
+            return
+        for request, output in zip(requests, prediction.tolist()):
+            request.future.set_result(output)
+
+    def _record(self, batch):
+        started = time.monotonic()
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+            for request in batch:
+                wait = started - request.enqueued
+                self._wait_counts[bisect.bisect_left(QUEUE_WAIT_BUCKETS_MS, wait * 1000)] += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+    def stats(self):
+        """Counters describing the batches scored so far.
+
+        Returns
+        -------
+        dict
+            The number of batches scored for each batch size, along with a
+            histogram and summary of the time rows waited in the queue.
+        """
+        with self._lock:
+            records = sum(self._wait_counts)
+            buckets = [str(bound) for bound in QUEUE_WAIT_BUCKETS_MS] + ['+Inf']
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queued': self._queue.qsize(),
+                'batches': sum(self._batch_sizes.values()),
+                'records': records,
+                'batch_sizes': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'queue_wait_ms': {
+                    'buckets': dict(zip(buckets, self._wait_counts)),
+                    'mean': self._wait_total / records * 1000 if records else 0.0,
+                    'max': self._wait_max * 1000,
+                },
+            }
+
+
+def _after_fork(reference):
+    """Private helper function giving the fork hook of a batcher, which
+    does not keep the batcher alive."""
+    def reset():
+        batcher = reference()
+        if batcher is not None:
+            batcher._reset()
+    return reset
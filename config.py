@@ -0,0 +1,109 @@
+"""
+
+    Configuration settings for our API.
+
+    Description: This file gathers the settings used to serve our model.
+    Each setting may be overridden with an environment variable of the same
+    name, prefixed with `LOAD_SHORTFALL_`.
+
+"""
+
+# Configuration Dependencies
+import os
+import tempfile
+
+
+def _setting(name, default):
+    """Private helper function to read a setting from the environment."""
+    value = os.environ.get(f'LOAD_SHORTFALL_{name}')
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return type(default)(value) if default is not None else value
+
+
+# The engine used to serve our model:
+# - 'sklearn' loads the pickled sklearn pipeline.
+# - 'native' loads the exported linear model, without importing sklearn.
+MODEL_ENGINE = _setting('MODEL_ENGINE', 'sklearn')
+
+MODEL_PATHS = {
+    'sklearn': 'assets/trained-models/load_shortfall_simple_lm_regression.pkl',
+    'native': 'assets/trained-models/load_shortfall_simple_lm_regression.linear',
+}
+
+# The model artifact to serve. Defaults to the artifact of `MODEL_ENGINE`.
+MODEL_PATH = _setting('MODEL_PATH', MODEL_PATHS.get(MODEL_ENGINE))
+
+# The name under which the model above is served by default. Further models
+# may be served by name, given as `name=path` pairs separated by commas, and
+# are loaded on first use.
+MODEL_NAME = _setting('MODEL_NAME', 'load_shortfall')
+MODELS = dict(item.split('=', 1) for item in _setting('MODELS', '').split(',') if item.strip())
+
+# The memory limit of the loaded models in bytes, estimated by the size of
+# their artifacts, beyond which the least recently used are unloaded (0 for
+# no limit). Also how often, in seconds, to check the served artifacts for
+# changes, reloading any which were retrained (0 to never check).
+MODEL_REGISTRY_MAX_BYTES = _setting('MODEL_REGISTRY_MAX_BYTES', 0)
+MODEL_RELOAD_CHECK_SECONDS = _setting('MODEL_RELOAD_CHECK_SECONDS', 0.0)
+
+# The token which grants access to the model admin routes. They are disabled
+# while it is empty.
+ADMIN_TOKEN = _setting('ADMIN_TOKEN', '')
+
+# The directory holding the recent observations from which time-series
+# features are served, memory-mapped and shared by every worker process. When
+# empty, each process keeps its own observations in memory.
+FEATURE_STORE_PATH = _setting('FEATURE_STORE_PATH', '')
+
+# Whether warming up the API before it reports ready includes a batch
+# request. This imports pandas, which is otherwise only loaded by the first
+# batch request, so disable it to start faster when only single records or
+# feature matrices are served.
+WARM_UP_BATCH = _setting('WARM_UP_BATCH', True)
+
+# Whether concurrent single-record requests are grouped into batches, and
+# how large and how long-lived those batches may be.
+MICRO_BATCHING = _setting('MICRO_BATCHING', False)
+MICRO_BATCH_MAX_SIZE = _setting('MICRO_BATCH_MAX_SIZE', 32)
+MICRO_BATCH_MAX_WAIT_MS = _setting('MICRO_BATCH_MAX_WAIT_MS', 2.0)
+
+# The number of predictions cached for repeated feature vectors, where 0
+# disables the cache, and how long each may be served for (0 for no limit).
+PREDICTION_CACHE_SIZE = _setting('PREDICTION_CACHE_SIZE', 10000)
+PREDICTION_CACHE_TTL_SECONDS = _setting('PREDICTION_CACHE_TTL_SECONDS', 0.0)
+
+# Settings of the production server launched by `serve.py`.
+SERVER_BIND = _setting('SERVER_BIND', '0.0.0.0:5000')
+SERVER_WORKERS = _setting('SERVER_WORKERS', os.cpu_count() or 1)
+SERVER_THREADS = _setting('SERVER_THREADS', 4)
+SERVER_KEEPALIVE_SECONDS = _setting('SERVER_KEEPALIVE_SECONDS', 5)
+SERVER_TIMEOUT_SECONDS = _setting('SERVER_TIMEOUT_SECONDS', 30)
+
+# The number of records scored together by the streaming endpoint.
+STREAM_CHUNK_SIZE = _setting('STREAM_CHUNK_SIZE', 512)
+
+# The most three-hour slots a forecast may span, one year by default.
+FORECAST_MAX_SLOTS = _setting('FORECAST_MAX_SLOTS', 2920)
+
+# The oldest a weather forecast may be at the start of a slot scored with it,
+# one period by default. Older forecasts leave the slot unscored.
+FORECAST_MAX_WEATHER_AGE_HOURS = _setting('FORECAST_MAX_WEATHER_AGE_HOURS', 3.0)
+
+# The schema against which single-record requests are validated, written by
+# `utils/train_model.py`. Set this to an empty string to disable validation.
+REQUEST_SCHEMA_PATH = _setting('REQUEST_SCHEMA_PATH', 'assets/trained-models/load_shortfall_request_schema.json')
+
+# Whether request counts and stage timings are recorded and exposed at /metrics.
+METRICS = _setting('METRICS', True)
+
+# On-demand profiling of prediction requests. Requests sending the admin
+# token in the `X-Profile-Token` header or `profile` query parameter are
+# profiled, as is one in every `PROFILING_SAMPLE_EVERY` requests when it is
+# above 0. Profiling is disabled while neither is set.
+PROFILING_TOKEN = _setting('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_EVERY = _setting('PROFILING_SAMPLE_EVERY', 0)
+PROFILING_DIR = _setting('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'load-shortfall-profiles'))
+PROFILING_MAX_PROFILES = _setting('PROFILING_MAX_PROFILES', 100)
@@ -0,0 +1,164 @@
+"""
+
+    Memory-mapped columnar cache of our datasets.
+
+    Description: This file converts a CSV dataset, once, into a directory
+    holding one NumPy `.npy` file per column along with an explicit schema.
+    Later reads memory-map only the columns requested, rather than parsing
+    the whole file as text again. Numbers are stored as float64 or int64,
+    categorical codes as indices into their sorted categories, and
+    timestamps as datetime64. The cache of a file is rebuilt whenever the
+    hash of that file changes.
+
+"""
+
+# Cache Dependencies
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# The types of the non-numeric columns of our datasets. Any other column
+# holding text is stored as a category.
+COLUMN_TYPES = {
+    'time': 'time',
+    'Valencia_wind_deg': 'category',
+    'Seville_pressure': 'category',
+}
+
+# The directory, beside each dataset, holding its cache.
+CACHE_DIRECTORY = '.column-cache'
+
+
+def source_hash(path):
+    """A hash of the contents of a dataset file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(2**20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _cache_path(path, cache_dir, digest):
+    """Private helper function giving the cache directory of a dataset version."""
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRECTORY)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return cache_dir, stem, os.path.join(cache_dir, f'{stem}-{digest}')
+
+
+def build_cache(path, cache_dir=None):
+    """Convert a CSV dataset into its columnar cache.
+
+    Parameters
+    ----------
+    path : str
+        The CSV file, e.g. `df_train.csv`.
+    cache_dir : str, optional
+        Where caches are kept. Defaults to a directory beside `path`.
+
+    Returns
+    -------
+    str
+        The directory holding the cache.
+    """
+    digest = source_hash(path)
+    cache_dir, stem, cache_path = _cache_path(path, cache_dir, digest)
+    data = pd.read_csv(path)
+    # Written to a temporary directory first, so that concurrent or
+    # interrupted runs never see a partial cache.
+    partial = f'{cache_path}.{os.getpid()}.partial'
+    os.makedirs(partial, exist_ok=True)
+    columns = []
+    for position, (column, values) in enumerate(data.items()):
+        kind = COLUMN_TYPES.get(column)
+        if kind is None:
+            if pd.api.types.is_integer_dtype(values.dtype):
+                kind = 'int64'
+            elif pd.api.types.is_numeric_dtype(values.dtype):
+                kind = 'float64'
+            else:
+                kind = 'category'
+        entry = {'name': column, 'type': kind, 'file': f'{position:03d}.npy'}
+        if kind == 'time':
+            array = pd.to_datetime(values, format='%Y-%m-%d %H:%M:%S', errors='coerce') \
+                .to_numpy(dtype='datetime64[s]')
+        elif kind == 'category':
+            # Missing values are coded as -1.
+            codes, categories = pd.factorize(values.astype('string'), sort=True)
+            array = codes.astype(np.int32)
+            entry['categories'] = [str(category) for category in categories]
+        else:
+            array = values.to_numpy(dtype=kind)
+        np.save(os.path.join(partial, entry['file']), array)
+        columns.append(entry)
+    schema = {'source': os.path.basename(path), 'source_hash': digest, 'rows': len(data),
+              'columns': columns}
+    with open(os.path.join(partial, 'schema.json'), 'w') as schema_file:
+        json.dump(schema, schema_file, indent=2)
+    try:
+        os.rename(partial, cache_path)
+    except OSError:
+        # Another run cached the same version first.
+        shutil.rmtree(partial)
+    # Caches of previous versions of the dataset are stale.
+    for name in os.listdir(cache_dir):
+        if name.startswith(f'{stem}-') and os.path.join(cache_dir, name) != cache_path \
+                and not name.endswith('.partial'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    return cache_path
+
+
+def read_schema(path, cache_dir=None):
+    """The schema of a dataset's cache, building the cache if needed.
+
+    Returns
+    -------
+    tuple
+        The directory holding the cache, and its schema.
+    """
+    _, _, cache_path = _cache_path(path, cache_dir, source_hash(path))
+    if not os.path.isdir(cache_path):
+        cache_path = build_cache(path, cache_dir)
+    with open(os.path.join(cache_path, 'schema.json')) as schema_file:
+        return cache_path, json.load(schema_file)
+
+
+def read_dataset(path, columns=None, cache_dir=None):
+    """Read a CSV dataset through its columnar cache.
+
+    Only the requested columns are read, each memory-mapped from its own
+    file. Categorical columns are returned as pandas categoricals, and
+    timestamps as datetime64 values.
+
+    Parameters
+    ----------
+    path : str
+        The CSV file, e.g. `df_train.csv`.
+    columns : list, optional
+        The columns to read, in the order to return them. Defaults to all.
+    cache_dir : str, optional
+        Where caches are kept. Defaults to a directory beside `path`.
+
+    Returns
+    -------
+    Pandas DataFrame : <class 'pandas.core.frame.DataFrame'>
+        The requested columns of the dataset.
+    """
+    cache_path, schema = read_schema(path, cache_dir)
+    entries = {entry['name']: entry for entry in schema['columns']}
+    if columns is None:
+        columns = list(entries)
+    missing = [column for column in columns if column not in entries]
+    if missing:
+        raise KeyError(f"{path} has no columns: {', '.join(missing)}")
+    data = {}
+    for column in columns:
+        entry = entries[column]
+        array = np.load(os.path.join(cache_path, entry['file']), mmap_mode='r')
+        if entry['type'] == 'category':
+            data[column] = pd.Categorical.from_codes(array, entry['categories'])
+        else:
+            data[column] = array
+    return pd.DataFrame(data, columns=columns, copy=False)
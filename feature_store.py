@@ -0,0 +1,356 @@
+"""
+
+    Store of recent observations for time-series features.
+
+    Description: This file contains the definitions of the lag and rolling
+    window features of our model, along with a store which serves them
+    while predicting. The store keeps fixed-size ring buffers of recent
+    weather observations and shortfall actuals, indexed by the three-hour
+    period of their `time`. Observations are added as they arrive, which
+    also updates the rolling statistics of every window holding them, so
+    that each feature of a prediction is then looked up in O(1). Training
+    derives its features with the same window statistics, so that a feature
+    has the same value offline as it would have had when served.
+
+    The buffers may be kept in files, which are memory-mapped, and
+    therefore shared by every worker process of the API.
+
+"""
+
+# Feature Store Dependencies
+import collections
+import contextlib
+import fcntl
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from features import epoch_hours
+
+# The length, in hours, of the periods of our datasets.
+PERIOD_HOURS = 3
+
+_EPOCH = datetime(1970, 1, 1)
+_STATISTICS = ('lag', 'mean', 'min', 'max')
+
+
+class TimeSeriesFeature(collections.namedtuple('TimeSeriesFeature', ['column', 'statistic', 'periods'])):
+    """A feature derived from the values of a column in preceding periods.
+
+    A `lag` is the value of the column `periods` periods earlier. A `mean`,
+    `min` or `max` summarises its values over the `periods` periods before,
+    ignoring those which are missing. Features are missing when none of the
+    values they need are known.
+    """
+
+    __slots__ = ()
+
+    @property
+    def name(self):
+        """The name of the feature, as a column of our model."""
+        if self.statistic == 'lag':
+            return f'{self.column}_lag_{self.periods}'
+        return f'{self.column}_rolling_{self.statistic}_{self.periods}'
+
+
+# The time-series features which may be served, shared between training and
+# the API: recent shortfall actuals, and the recent temperature of each city.
+TIME_SERIES_FEATURES = [
+    TimeSeriesFeature('load_shortfall_3h', 'lag', 1),
+    TimeSeriesFeature('load_shortfall_3h', 'lag', 2),
+    TimeSeriesFeature('load_shortfall_3h', 'lag', 8),
+    TimeSeriesFeature('load_shortfall_3h', 'mean', 8),
+    TimeSeriesFeature('load_shortfall_3h', 'min', 8),
+    TimeSeriesFeature('load_shortfall_3h', 'max', 8),
+] + [TimeSeriesFeature(f'{city}_temp', 'mean', 8)
+     for city in ['Madrid', 'Barcelona', 'Valencia', 'Seville', 'Bilbao']]
+
+
+def periods_of(times):
+    """The period of each timestamp, counted from 1970-01-01.
+
+    Returns
+    -------
+    tuple
+        An int64 array of the periods, along with a boolean array marking
+        which timestamps were valid.
+    """
+    hours, valid = epoch_hours(times)
+    return hours // PERIOD_HOURS, valid
+
+
+def period_of(time):
+    """The period of a single naive `datetime`."""
+    return (time - _EPOCH) // timedelta(hours=PERIOD_HOURS)
+
+
+def _window_statistic(statistic, windows, present):
+    """Private helper function summarising each row of a (n_windows, periods)
+    array over its present values, or NaN where none are present."""
+    counts = present.sum(axis=1)
+    if statistic == 'mean':
+        statistics = np.where(present, windows, 0.0).sum(axis=1) / np.maximum(counts, 1)
+    elif statistic == 'min':
+        statistics = np.where(present, windows, np.inf).min(axis=1)
+    else:
+        statistics = np.where(present, windows, -np.inf).max(axis=1)
+    return np.where(counts > 0, statistics, np.nan)
+
+
+def _as_floats(values):
+    """Private helper function converting values to floats, with NaN for
+    any which are missing or not numbers."""
+    floats = np.full(len(values), np.nan)
+    for row, value in enumerate(values):
+        try:
+            floats[row] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return floats
+
+
+class FeatureStore:
+    """Ring buffers of recent observations, serving time-series features.
+
+    Aggregates are written for every period whose window holds a new value,
+    including periods yet to be observed, so the buffers span two of the
+    longest windows. Features are served for times up to a window after
+    the most recent observations, and values older than that are dropped.
+
+    Parameters
+    ----------
+    definitions : list, optional
+        The `TimeSeriesFeature` definitions to serve.
+    path : str, optional
+        A directory in which to keep the buffers, memory-mapped and shared
+        between processes. They are rebuilt if the definitions change. By
+        default the buffers are held in this process only.
+    """
+
+    def __init__(self, definitions=TIME_SERIES_FEATURES, path=None):
+        self.definitions = [TimeSeriesFeature(*definition) for definition in definitions]
+        unknown = [definition for definition in self.definitions
+                   if definition.statistic not in _STATISTICS or definition.periods < 1]
+        if unknown:
+            raise ValueError(f'Invalid time-series features: {unknown}')
+        self.names = [definition.name for definition in self.definitions]
+        self.columns = list(dict.fromkeys(definition.column for definition in self.definitions))
+        self.capacity = 2 * max(definition.periods for definition in self.definitions) + 1
+        self.path = path
+        self._column_index = {column: index for index, column in enumerate(self.columns)}
+        self._rolling = [definition for definition in self.definitions if definition.statistic != 'lag']
+        self._aggregate_index = {definition: index for index, definition in enumerate(self._rolling)}
+        shapes = {
+            'values': ((len(self.columns), self.capacity), np.float64, np.nan),
+            'value_periods': ((len(self.columns), self.capacity), np.int64, -1),
+            'aggregates': ((max(len(self._rolling), 1), self.capacity), np.float64, np.nan),
+            'aggregate_periods': ((max(len(self._rolling), 1), self.capacity), np.int64, -1),
+        }
+        arrays = self._open(shapes) if path else \
+            {name: np.full(shape, fill, dtype) for name, (shape, dtype, fill) in shapes.items()}
+        self._values = arrays['values']
+        self._value_periods = arrays['value_periods']
+        self._aggregates = arrays['aggregates']
+        self._aggregate_periods = arrays['aggregate_periods']
+        self._lock = threading.Lock()
+
+    def _open(self, shapes):
+        """Private helper function memory-mapping the buffers kept in `path`."""
+        os.makedirs(self.path, exist_ok=True)
+        layout = {'definitions': [list(definition) for definition in self.definitions],
+                  'capacity': self.capacity}
+        layout_path = os.path.join(self.path, 'layout.json')
+        with self._file_lock():
+            try:
+                with open(layout_path) as layout_file:
+                    current = json.load(layout_file)
+            except (OSError, ValueError):
+                current = None
+            arrays = {}
+            for name, (shape, dtype, fill) in shapes.items():
+                array_path = os.path.join(self.path, f'{name}.npy')
+                if current == layout and os.path.exists(array_path):
+                    arrays[name] = np.load(array_path, mmap_mode='r+')
+                else:
+                    arrays[name] = np.lib.format.open_memmap(array_path, mode='w+', dtype=dtype, shape=shape)
+                    arrays[name][...] = fill
+            if current != layout:
+                with open(layout_path, 'w') as layout_file:
+                    json.dump(layout, layout_file, indent=2)
+        return arrays
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        # Serialises writes from every process sharing the buffers.
+        if not self.path:
+            yield
+            return
+        with open(os.path.join(self.path, 'lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def ingest(self, data):
+        """Add observations to the store.
+
+        Parameters
+        ----------
+        data : dict or Pandas DataFrame
+            A `time` column along with any of the observed columns, e.g. a
+            batch of feature records holding their actual `load_shortfall_3h`.
+            Missing and invalid values are ignored.
+
+        Returns
+        -------
+        int
+            The number of values added.
+        """
+        periods, valid = periods_of(data['time'])
+        columns = {column: _as_floats(data[column]) for column in self.columns if column in data}
+        with self._lock, self._file_lock():
+            return self._ingest_periods(periods, valid, columns)
+
+    def _ingest_periods(self, periods, valid, columns):
+        added = 0
+        touched = collections.defaultdict(set)
+        for column, values in columns.items():
+            index = self._column_index[column]
+            for period, value, ok in zip(periods.tolist(), values.tolist(), valid.tolist()):
+                if not ok or math.isnan(value):
+                    continue
+                slot = period % self.capacity
+                # A slot holding a later period is not overwritten by a stale backfill.
+                if period < self._value_periods[index, slot]:
+                    continue
+                self._values[index, slot] = value
+                self._value_periods[index, slot] = period
+                touched[column].add(period)
+                added += 1
+        # Refresh the statistics of every window holding a new value.
+        for definition in self._rolling:
+            new = touched.get(definition.column)
+            if not new:
+                continue
+            ends = np.unique(np.add.outer(np.fromiter(new, np.int64), np.arange(definition.periods)))
+            index = self._column_index[definition.column]
+            periods = ends[:, None] - np.arange(definition.periods)[::-1]
+            slots = periods % self.capacity
+            statistics = _window_statistic(definition.statistic, self._values[index, slots],
+                                           self._value_periods[index, slots] == periods)
+            aggregate = self._aggregate_index[definition]
+            current = ends >= self._aggregate_periods[aggregate, ends % self.capacity]
+            ends, statistics = ends[current], statistics[current]
+            self._aggregates[aggregate, ends % self.capacity] = statistics
+            self._aggregate_periods[aggregate, ends % self.capacity] = ends
+        return added
+
+    def _feature(self, definition, periods):
+        """Private helper function looking up a feature for an array of periods."""
+        if definition.statistic == 'lag':
+            wanted = periods - definition.periods
+            slots = wanted % self.capacity
+            index = self._column_index[definition.column]
+            values, held = self._values[index, slots], self._value_periods[index, slots]
+        else:
+            # A window covers the periods before the one being predicted.
+            wanted = periods - 1
+            slots = wanted % self.capacity
+            index = self._aggregate_index[definition]
+            values, held = self._aggregates[index, slots], self._aggregate_periods[index, slots]
+        return np.where(held == wanted, values, np.nan)
+
+    def lookup(self, times, names=None):
+        """The time-series features of a batch of timestamps.
+
+        Parameters
+        ----------
+        times : array-like
+            The `time` values of the records being predicted.
+        names : list, optional
+            The features to look up. Defaults to all of them.
+
+        Returns
+        -------
+        Numpy ndarray
+            A (n_times, n_features) float64 array, holding NaN for features
+            which are unknown and for invalid timestamps.
+        """
+        periods, valid = periods_of(times)
+        return self._lookup_periods(periods, valid, names)
+
+    def _lookup_periods(self, periods, valid, names=None):
+        definitions = self.definitions if names is None else \
+            [self.definitions[self.names.index(name)] for name in names]
+        features = np.empty((len(periods), len(definitions)))
+        for column, definition in enumerate(definitions):
+            features[:, column] = np.where(valid, self._feature(definition, periods), np.nan)
+        return features
+
+    def lookup_record(self, time, names=None):
+        """The time-series features of a single naive `datetime`, as a list."""
+        period = period_of(time)
+        definitions = self.definitions if names is None else \
+            [self.definitions[self.names.index(name)] for name in names]
+        features = []
+        for definition in definitions:
+            if definition.statistic == 'lag':
+                values, held = self._values, self._value_periods
+                index, wanted = self._column_index[definition.column], period - definition.periods
+            else:
+                values, held = self._aggregates, self._aggregate_periods
+                index, wanted = self._aggregate_index[definition], period - 1
+            slot = wanted % self.capacity
+            features.append(float(values[index, slot]) if held[index, slot] == wanted else math.nan)
+        return features
+
+
+def time_series_features(data, definitions=TIME_SERIES_FEATURES):
+    """The time-series features of each row of a dataset, e.g. for training.
+
+    Each row is given the features which a `FeatureStore` holding every
+    earlier row would serve, computed with the same window statistics, so
+    that no row sees its own or later values. Where rows share a period,
+    the store would hold the last of them.
+
+    Parameters
+    ----------
+    data : Pandas DataFrame
+        The rows, with their `time` and observed columns.
+    definitions : list, optional
+        The `TimeSeriesFeature` definitions to derive.
+
+    Returns
+    -------
+    Pandas DataFrame : <class 'pandas.core.frame.DataFrame'>
+        A column per feature, aligned with the rows of `data`.
+    """
+    import pandas as pd
+    definitions = [TimeSeriesFeature(*definition) for definition in definitions]
+    periods, valid = periods_of(data['time'])
+    features = np.full((len(periods), len(definitions)), np.nan)
+    if not valid.any():
+        return pd.DataFrame(features, index=data.index, columns=[d.name for d in definitions])
+    longest = max(definition.periods for definition in definitions)
+    # The values of each column on a dense timeline, padded by the longest
+    # window before the first period.
+    first = periods[valid].min() - longest
+    timeline = periods - first
+    length = periods[valid].max() - first + 1
+    dense = {}
+    for column in dict.fromkeys(definition.column for definition in definitions):
+        dense[column] = np.full(length, np.nan)
+        if column in data:
+            values = _as_floats(data[column])
+            observed = valid & ~np.isnan(values)
+            dense[column][timeline[observed]] = values[observed]
+    rows = np.flatnonzero(valid)
+    for position, definition in enumerate(definitions):
+        if definition.statistic == 'lag':
+            features[rows, position] = dense[definition.column][timeline[rows] - definition.periods]
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(dense[definition.column], definition.periods)
+        # The window before a period starts `periods` periods earlier.
+        windows = windows[timeline[rows] - definition.periods]
+        features[rows, position] = _window_statistic(definition.statistic, windows, ~np.isnan(windows))
+    return pd.DataFrame(features, index=data.index, columns=[d.name for d in definitions])
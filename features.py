@@ -0,0 +1,288 @@
+"""
+
+    Reusable feature engineering components for our model.
+
+    Description: This file contains the feature extraction steps which are
+    shared between model training, batch scoring and the API. Each step is
+    vectorised over NumPy arrays so that a whole batch of records is
+    processed in a single pass. pandas is only imported by the steps which
+    fall back to it, so that it is not loaded to score single records.
+
+"""
+
+# Feature Dependencies
+import numpy as np
+
+# Calendar features which may be derived from the `time` column.
+CALENDAR_FIELDS = ['Year', 'Month_of_year', 'Week_of_year', 'Day_of_year',
+                   'Day_of_month', 'Day_of_week', 'Hour_of_week', 'Hour_of_day']
+
+# Character positions of the digits and separators within the fixed
+# `YYYY-MM-DD HH:MM:SS` timestamp format used by our datasets.
+_TIME_FORMAT_WIDTH = 19
+_TIME_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_TIME_SEPARATORS = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':'}
+
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _days_from_civil(year, month, day):
+    """Private helper function counting days since 1970-01-01.
+
+    This is the proleptic Gregorian calendar conversion described by
+    Howard Hinnant, written with integer array arithmetic.
+    """
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _parse_fixed_format(times):
+    """Private helper function to parse `YYYY-MM-DD HH:MM:SS` timestamps.
+
+    Parameters
+    ----------
+    times : Numpy ndarray
+        Timestamps of any dtype. Values not in the fixed format are left to
+        the caller.
+
+    Returns
+    -------
+    tuple
+        Integer arrays of the year, month, day and hour of each timestamp,
+        along with a boolean array marking which of them were parsed.
+    """
+    text = np.asarray(times).astype(f'U{_TIME_FORMAT_WIDTH + 1}')
+    chars = text.reshape(-1, 1).view(np.uint32).reshape(len(text), _TIME_FORMAT_WIDTH + 1)
+    digits = chars[:, _TIME_DIGITS].astype(np.int64) - ord('0')
+
+    parsed = (digits >= 0).all(axis=1) & (digits <= 9).all(axis=1)
+    parsed &= chars[:, _TIME_FORMAT_WIDTH] == 0
+    for position, separator in _TIME_SEPARATORS.items():
+        parsed &= chars[:, position] == ord(separator)
+
+    digits = np.where(parsed[:, None], digits, 0)
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 8] * 10 + digits[:, 9]
+    minute = digits[:, 10] * 10 + digits[:, 11]
+    second = digits[:, 12] * 10 + digits[:, 13]
+
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_length = _DAYS_IN_MONTH[np.clip(month, 0, 12)] + (leap & (month == 2))
+    parsed &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_length)
+    parsed &= (hour < 24) & (minute < 60) & (second < 60)
+    return year, month, day, hour, parsed
+
+
+def _split_datetimes(times):
+    """Private helper function splitting datetime64 timestamps into the
+    year, month, day and hour of each, along with a boolean array marking
+    which of them were not NaT."""
+    valid = ~np.isnat(times)
+    times = np.where(valid, times, np.datetime64(0, 's')).astype('datetime64[s]')
+    days = times.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    year = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (days - months).astype(np.int64) + 1
+    hour = (times - days).astype('timedelta64[h]').astype(np.int64)
+    return year, month, day, hour, valid
+
+
+def _parse_times(times):
+    """Private helper function parsing timestamps of any supported form.
+
+    Returns
+    -------
+    tuple
+        Integer arrays of the year, month, day and hour of each timestamp,
+        along with a boolean array marking which of them were valid.
+    """
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return _split_datetimes(times)
+    times = times.astype(object)
+    year, month, day, hour, valid = _parse_fixed_format(times)
+
+    # Fall back to pandas for timestamps in any other format.
+    fallback = np.flatnonzero(~valid)
+    if len(fallback):
+        import pandas as pd
+        # Each timestamp is parsed by its own format, which also stops pandas
+        # warning that it could not infer a single format for all of them.
+        parsed = pd.to_datetime(pd.Series(times[fallback]), errors='coerce', format='mixed')
+        found = parsed.notna().to_numpy()
+        rows = fallback[found]
+        parsed = parsed[found]
+        year[rows] = parsed.dt.year
+        month[rows] = parsed.dt.month
+        day[rows] = parsed.dt.day
+        hour[rows] = parsed.dt.hour
+        valid[rows] = True
+    return year, month, day, hour, valid
+
+
+def epoch_hours(times):
+    """The whole hours since 1970-01-01 of each timestamp.
+
+    Returns
+    -------
+    tuple
+        An int64 array of the hours, along with a boolean array marking
+        which timestamps were valid. Invalid timestamps are given as zero.
+    """
+    year, month, day, hour, valid = _parse_times(times)
+    hours = _days_from_civil(year, np.where(valid, month, 1), np.where(valid, day, 1)) * 24 + hour
+    return np.where(valid, hours, 0).astype(np.int64), valid
+
+
+def extract_calendar_features(times, fields=CALENDAR_FIELDS):
+    """Derive calendar features from timestamps in a single pass.
+
+    Timestamps in the fixed `YYYY-MM-DD HH:MM:SS` format are parsed
+    directly from their characters, and datetime64 values are split
+    arithmetically. Any others are parsed by pandas.
+
+    Parameters
+    ----------
+    times : array-like
+        The `time` values of a batch of feature records.
+    fields : list
+        The calendar features to derive, taken from `CALENDAR_FIELDS`.
+
+    Returns
+    -------
+    tuple
+        A dictionary mapping each requested field to an int64 array, along
+        with a boolean array marking which timestamps were valid. Fields of
+        invalid timestamps are set to zero.
+    """
+    unknown = set(fields).difference(CALENDAR_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown calendar features: {sorted(unknown)}')
+    year, month, day, hour, valid = _parse_times(times)
+    month = np.where(valid, month, 1)
+    day = np.where(valid, day, 1)
+
+    days = _days_from_civil(year, month, day)
+    # 1970-01-01 was a Thursday, and Monday is counted as day 0.
+    day_of_week = (days + 3) % 7
+    features = {}
+    for field in fields:
+        if field == 'Year':
+            values = year
+        elif field == 'Month_of_year':
+            values = month
+        elif field == 'Week_of_year':
+            # ISO weeks are numbered by the year holding their Thursday.
+            thursday = days - day_of_week + 3
+            week_year = year.copy()
+            week_year[thursday < _days_from_civil(year, 1, 1)] -= 1
+            week_year[thursday >= _days_from_civil(year + 1, 1, 1)] += 1
+            values = (thursday - _days_from_civil(week_year, 1, 1)) // 7 + 1
+        elif field == 'Day_of_year':
+            values = days - _days_from_civil(year, 1, 1) + 1
+        elif field == 'Day_of_month':
+            values = day
+        elif field == 'Day_of_week':
+            values = day_of_week
+        elif field == 'Hour_of_week':
+            values = day_of_week * 24 + hour
+        else:
+            values = hour
+        features[field] = np.where(valid, values, 0).astype(np.int64)
+    return features, valid
+
+
+class CategoricalEncoder:
+    """Lookup table mapping the codes of a categorical feature to numbers.
+
+    Codes such as 'level_5' or 'sp25' are mapped to the number they hold,
+    matching the regex conversion used within our notebook. The table is
+    built once from the training data, so that inference only performs
+    lookups.
+
+    Parameters
+    ----------
+    column : str
+        The name of the categorical feature.
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.categories_ = np.array([], dtype=str)
+        self.values_ = np.array([], dtype=np.float64)
+        self.lookup_ = {}
+
+    def fit(self, values):
+        """Build the lookup table from the codes seen in training.
+
+        Parameters
+        ----------
+        values : array-like
+            The raw codes of the categorical feature.
+
+        Returns
+        -------
+        CategoricalEncoder
+            The fitted encoder.
+        """
+        import pandas as pd
+        categories = pd.Series(pd.unique(pd.Series(values).dropna().astype(str)))
+        numbers = pd.to_numeric(categories.str.extract(r'(\d+)', expand=False), errors='coerce')
+        categories = categories[numbers.notna()].to_numpy(dtype=str)
+        numbers = numbers[numbers.notna()].to_numpy(dtype=np.float64)
+        order = np.argsort(categories)
+        self.categories_ = categories[order]
+        self.values_ = numbers[order]
+        self.lookup_ = dict(zip(self.categories_.tolist(), self.values_.tolist()))
+        return self
+
+    def to_dict(self):
+        """The lookup table as plain python lists, e.g. for JSON."""
+        return {'categories': self.categories_.tolist(), 'values': self.values_.tolist()}
+
+    @classmethod
+    def from_dict(cls, column, table):
+        """Rebuild an encoder from the lookup table given by `to_dict()`."""
+        encoder = cls(column)
+        encoder.categories_ = np.asarray(table['categories'], dtype=str)
+        encoder.values_ = np.asarray(table['values'], dtype=np.float64)
+        encoder.lookup_ = dict(zip(encoder.categories_.tolist(), encoder.values_.tolist()))
+        return encoder
+
+    def encode(self, value):
+        """Map a single code to its number, or NaN if it is unknown."""
+        if value is None:
+            return np.nan
+        return self.lookup_.get(value if isinstance(value, str) else str(value), np.nan)
+
+    def transform(self, values):
+        """Map a batch of codes to their numbers.
+
+        Parameters
+        ----------
+        values : array-like
+            The raw codes of the categorical feature.
+
+        Returns
+        -------
+        tuple
+            A float64 array of the mapped numbers, with NaN for missing or
+            unknown codes, along with a boolean array flagging the codes
+            which were present but unseen in training.
+        """
+        import pandas as pd
+        values = np.asarray(values, dtype=object)
+        present = pd.notna(values)
+        if not len(self.categories_):
+            return np.full(len(values), np.nan), present
+        keys = values.astype(str)
+        index = np.minimum(np.searchsorted(self.categories_, keys), len(self.categories_) - 1)
+        known = present & (self.categories_[index] == keys)
+        return np.where(known, self.values_[index], np.nan), present & ~known
@@ -0,0 +1,101 @@
+"""
+
+    Binary feature matrix format for batch requests.
+
+    Description: This file contains the encoding of the binary payloads
+    which may be exchanged with our API in place of JSON. A payload holds a
+    short JSON header naming its columns, followed by the raw little-endian
+    float32 or float64 values of a row-major matrix. The matrix is read from
+    the request body without parsing or copying any values.
+
+"""
+
+# Format Dependencies
+import json
+import struct
+import numpy as np
+
+# The media type of binary feature matrix payloads.
+MEDIA_TYPE = 'application/x-feature-matrix'
+
+# Payloads start with these bytes, followed by the header length.
+MAGIC = b'LSFM'
+FORMAT_VERSION = 1
+
+_PREFIX = struct.Struct('<4sI')
+# The matrix values start at a multiple of this many bytes.
+_ALIGNMENT = 8
+_DTYPES = {'<f4': np.float32, '<f8': np.float64}
+
+
+def encode_matrix(columns, matrix, **header):
+    """Encode a matrix as a binary feature matrix payload.
+
+    Parameters
+    ----------
+    columns : list
+        The name of each column of the matrix.
+    matrix : Numpy ndarray
+        A 2-D float32 or float64 array, with one column per name.
+    **header
+        Any further values to place in the JSON header.
+
+    Returns
+    -------
+    bytes
+        The encoded payload.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.dtype not in (np.float32, np.float64):
+        matrix = matrix.astype(np.float64)
+    matrix = np.ascontiguousarray(matrix, dtype=matrix.dtype.newbyteorder('<'))
+    if matrix.ndim != 2 or matrix.shape[1] != len(columns):
+        raise ValueError(f'Expected a matrix with {len(columns)} columns, got shape {matrix.shape}.')
+    header = dict(header, version=FORMAT_VERSION, columns=list(columns),
+                  dtype=matrix.dtype.str, shape=list(matrix.shape))
+    text = json.dumps(header).encode()
+    # Pad the header with spaces so that the values which follow are aligned.
+    text += b' ' * (-(_PREFIX.size + len(text)) % _ALIGNMENT)
+    return _PREFIX.pack(MAGIC, len(text)) + text + matrix.tobytes()
+
+
+def decode_matrix(payload):
+    """Decode a binary feature matrix payload.
+
+    Parameters
+    ----------
+    payload : bytes
+        The encoded payload, e.g. the body of a request.
+
+    Returns
+    -------
+    tuple
+        The JSON header, holding the `columns` of the matrix, along with the
+        matrix itself as a read-only view of `payload`.
+
+    Raises
+    ------
+    ValueError
+        If the payload is not a valid binary feature matrix.
+    """
+    if len(payload) < _PREFIX.size:
+        raise ValueError('The payload is too short to hold a feature matrix.')
+    magic, length = _PREFIX.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError(f'The payload is not a feature matrix: it should start with {MAGIC!r}.')
+    try:
+        header = json.loads(payload[_PREFIX.size:_PREFIX.size + length])
+        columns = list(header['columns'])
+        dtype = _DTYPES[header['dtype']]
+        rows, width = header['shape']
+    except (ValueError, KeyError, TypeError) as error:
+        raise ValueError(f'The feature matrix header is invalid: {error!r}') from None
+    if header.get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Feature matrix version {header['version']} is not supported.")
+    if width != len(columns):
+        raise ValueError(f'The feature matrix has {width} columns, but names {len(columns)}.')
+    offset = _PREFIX.size + length
+    if len(payload) - offset != rows * width * np.dtype(dtype).itemsize:
+        raise ValueError(f'The feature matrix does not hold {rows} rows of {width} values.')
+    matrix = np.frombuffer(payload, dtype=dtype, count=rows * width, offset=offset)
+    return header, matrix.reshape(rows, width)
@@ -0,0 +1,184 @@
+"""
+
+    Lightweight metrics for monitoring our API.
+
+    Description: This file contains thread-safe counters, gauges and
+    histograms, which are rendered in the Prometheus text exposition format.
+    Recording a value takes a lock and a few list operations, so that the
+    hot path of a prediction may be instrumented at negligible cost. Each
+    process keeps its own metrics.
+
+"""
+
+# Metrics Dependencies
+import bisect
+import threading
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5]
+
+# Upper bounds of the batch size histogram buckets.
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384]
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Private base class of a metric with an optional set of labels."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        """The metric in the Prometheus text exposition format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """A count which only increases, such as the number of requests."""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        """Increase the count of the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, labels), value)
+                for labels, value in values]
+
+
+class Gauge(_Metric):
+    """A value which may go up and down, such as the requests in flight.
+
+    Parameters
+    ----------
+    function : callable, optional
+        Called at render time to give the value of an unlabelled gauge.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def inc(self, *labels, amount=1):
+        """Increase the value of the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        """Decrease the value of the given label values."""
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        """Set the value of the given label values."""
+        with self._lock:
+            self._values[labels] = value
+
+    def remove(self, *labels):
+        """Stop reporting the given label values."""
+        with self._lock:
+            self._values.pop(labels, None)
+
+    def _samples(self):
+        if self.function is not None:
+            return [(self.name, '', self.function())]
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, labels), value)
+                for labels, value in values]
+
+
+class Histogram(_Metric):
+    """Counts of observed values within cumulative buckets.
+
+    Parameters
+    ----------
+    buckets : list
+        The increasing upper bounds of the buckets. A `+Inf` bucket is added.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = list(buckets)
+
+    def observe(self, *labels, value):
+        """Record an observation for the given label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Counts per bucket, followed by the sum of observed values.
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((labels, list(entry)) for labels, entry in self._values.items())
+        bounds = self.buckets + [float('inf')]
+        samples = []
+        for labels, entry in values:
+            cumulative = 0
+            for bound, count in zip(bounds, entry):
+                cumulative += count
+                samples.append((f'{self.name}_bucket',
+                                _format_labels(self.labelnames, labels, ('le', _format_value(float(bound)))),
+                                cumulative))
+            samples.append((f'{self.name}_sum', _format_labels(self.labelnames, labels), entry[-1]))
+            samples.append((f'{self.name}_count', _format_labels(self.labelnames, labels), cumulative))
+        return samples
+
+
+class Registry:
+    """A collection of metrics, rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Add a metric to the registry, returning it."""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+# The media type of the Prometheus text exposition format.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
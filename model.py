@@ -22,12 +22,102 @@
 """
 
 # Helper Dependencies
+import collections
 import numpy as np
-import pandas as pd
 import pickle
 import json
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from features import extract_calendar_features, CategoricalEncoder, CALENDAR_FIELDS
+from feature_store import TimeSeriesFeature, PERIOD_HOURS, periods_of
+from predictors import is_native_artifact, load_native_model
+from request_schema import RequestError
+
+# pandas is only imported by the functions which need it. Single records and
+# feature matrices are scored without it, so that processes serving only
+# those start faster.
+
+# The features used by our model, in the order in which it was trained.
+FEATURE_COLUMNS = ['Madrid_wind_speed', 'Valencia_wind_deg', 'Bilbao_rain_1h',
+       'Valencia_wind_speed', 'Seville_humidity', 'Madrid_humidity',
+       'Bilbao_clouds_all', 'Bilbao_wind_speed', 'Seville_clouds_all',
+       'Bilbao_wind_deg', 'Barcelona_wind_speed', 'Barcelona_wind_deg',
+       'Madrid_clouds_all', 'Seville_wind_speed', 'Barcelona_rain_1h',
+       'Seville_pressure', 'Seville_rain_1h', 'Bilbao_snow_3h',
+       'Barcelona_pressure', 'Seville_rain_3h', 'Madrid_rain_1h',
+       'Barcelona_rain_3h', 'Valencia_snow_3h', 'Madrid_weather_id',
+       'Barcelona_weather_id', 'Bilbao_pressure', 'Seville_weather_id',
+       'Valencia_pressure', 'Seville_temp_max', 'Bilbao_weather_id',
+        'Valencia_humidity', 'Year', 'Month_of_year', 'Day_of_month', 'Day_of_week', 'Hour_of_day']
+
+# Non-numeric features holding coded values, e.g. 'level_5' and 'sp25'.
+_CATEGORICAL_COLUMNS = ['Valencia_wind_deg', 'Seville_pressure']
+
+# Features derived from the `time` column.
+_TIME_FEATURES = ['Year', 'Month_of_year', 'Day_of_month', 'Day_of_week', 'Hour_of_day']
+
+def _load_feature_frame(data):
+    """Private helper function to load a data payload as a DataFrame.
+
+    Parameters
+    ----------
+    data : str, dict, list or Pandas DataFrame
+        A single feature record, a list of records, or a columnar mapping
+        of feature names to lists of values. Strings are decoded as JSON.
+
+    Returns
+    -------
+    Pandas DataFrame : <class 'pandas.core.frame.DataFrame'>
+        One row per feature record, in input order. A DataFrame is returned
+        as a shallow copy, so that columns may be replaced without copying
+        its values or altering the original.
+
+    Raises
+    ------
+    RequestError
+        If a list holds anything other than feature records, or the columns
+        of a columnar mapping differ in length.
+    """
+    import pandas as pd
+    if isinstance(data, pd.DataFrame):
+        return data.copy(deep=False)
+    # Convert the json string to a python object
+    if isinstance(data, (str, bytes)):
+        data = json.loads(data)
+    if isinstance(data, dict):
+        # A columnar payload maps every feature name to a list of values.
+        if data and all(isinstance(values, list) for values in data.values()):
+            if len({len(values) for values in data.values()}) > 1:
+                raise RequestError('Every column of a columnar payload must hold the same number of values.')
+            return pd.DataFrame(data)
+        return pd.DataFrame.from_dict([data])
+    records = list(data) if isinstance(data, (list, tuple)) else None
+    if records is None or not all(isinstance(record, dict) for record in records):
+        raise RequestError('Expected a list of feature records, each a JSON object.')
+    # An explicit index keeps a row for every record, even when all are empty.
+    return pd.DataFrame.from_records(records, index=range(len(records)))
+
+def fit_categorical_encoders(data):
+    """Fit lookup tables for the categorical features of our training data.
+
+    Parameters
+    ----------
+    data : Pandas DataFrame
+        The raw training data.
 
-def _preprocess_data(data):
+    Returns
+    -------
+    dict
+        A `CategoricalEncoder` for each categorical feature, to be stored
+        alongside the trained model.
+    """
+    return {column: CategoricalEncoder(column).fit(data[column])
+            for column in _CATEGORICAL_COLUMNS}
+
+def _preprocess_data(data, encoders=None, fill_values=None, columns=FEATURE_COLUMNS, feature_store=None):
     """Private helper function to preprocess data for model prediction.
 
     NB: If you have utilised feature engineering/selection in order to create
@@ -36,29 +126,306 @@ def _preprocess_data(data):
 
     Parameters
     ----------
-    data : str
+    data : str, dict, list or Pandas DataFrame
         The data payload received within POST requests sent to our API.
+        This may hold a single feature record or a batch of records.
+    encoders : dict, optional
+        Fitted `CategoricalEncoder` objects for the categorical features.
+        When omitted, codes are converted using a regex.
+    fill_values : dict, optional
+        Constants fitted in training with which to replace missing values.
+        When omitted, missing pressures are replaced by the mean of `data`.
+    columns : list, optional
+        The features to return, in the order used by our model.
+    feature_store : FeatureStore, optional
+        Serves the time-series features among `columns` for the period of
+        each record. When omitted, they are taken from `data`.
 
     Returns
     -------
     Pandas DataFrame : <class 'pandas.core.frame.DataFrame'>
         The preprocessed data, ready to be used our model for prediction.
+        Values which could not be parsed are left as NaN.
+    """
+    import pandas as pd
+    # Load the payload as a Pandas DataFrame.
+    feature_vector_df = _load_feature_frame(data)
+    for column in ['time', 'Valencia_pressure'] + _CATEGORICAL_COLUMNS + list(fill_values or []):
+        if column not in feature_vector_df:
+            feature_vector_df[column] = np.nan
+
+    # Look up the time-series features of each record's period.
+    if feature_store is not None:
+        names = [name for name in feature_store.names if name in columns]
+        if names:
+            series = feature_store.lookup(feature_vector_df['time'], names)
+            for position, name in enumerate(names):
+                feature_vector_df[name] = series[:, position]
+
+    # Replace missing values
+    if fill_values is None:
+        valencia_pressure = pd.to_numeric(feature_vector_df['Valencia_pressure'], errors='coerce')
+        fill_values = {'Valencia_pressure': valencia_pressure.mean()}
+    for column, value in fill_values.items():
+        feature_vector_df[column] = pd.to_numeric(feature_vector_df[column], errors='coerce').fillna(value)
+
+    # Convert the non-numeric categorical codes, e.g. 'level_5' and 'sp25'
+    for column in _CATEGORICAL_COLUMNS:
+        if encoders is not None and column in encoders:
+            feature_vector_df[column] = encoders[column].transform(feature_vector_df[column])[0]
+            continue
+        codes = feature_vector_df[column].astype('string').str.extract(r'(\d+)', expand=False)
+        feature_vector_df[column] = pd.to_numeric(codes, errors='coerce')
+
+    # Create new features from time
+    calendar, valid_time = extract_calendar_features(feature_vector_df['time'], _TIME_FEATURES)
+    for column, values in calendar.items():
+        feature_vector_df[column] = np.where(valid_time, values, np.nan)
+
+    predict_vector = feature_vector_df.reindex(columns=columns)
+    return predict_vector.apply(pd.to_numeric, errors='coerce').astype('float64')
+
+class _FeaturePlan:
+    """Preprocessing steps compiled into fixed fills of a NumPy feature row.
+
+    This is a fast path for single feature records which gives the same
+    result as `_preprocess_data()`, without building a DataFrame. Each
+    thread fills its own preallocated row.
+
+    Parameters
+    ----------
+    columns : list
+        The features used by our model, in the order in which it was trained.
+    encoders : dict, optional
+        Fitted `CategoricalEncoder` objects for the categorical features.
+    fill_values : dict, optional
+        Constants fitted in training with which to replace missing values.
+    time_series : list, optional
+        The names of the time-series features among `columns`.
+    """
+
+    _CODE_PATTERN = re.compile(r'\d+')
+
+    def __init__(self, columns, encoders=None, fill_values=None, time_series=None):
+        self.columns = list(columns)
+        self.encoders = encoders or {}
+        index = {column: i for i, column in enumerate(self.columns)}
+        self._categorical = [(index[c], c) for c in _CATEGORICAL_COLUMNS if c in index]
+        self._time = [(index[c], c) for c in _TIME_FEATURES if c in index]
+        self._series = [(index[c], c) for c in (time_series or []) if c in index]
+        self._numeric = [(i, c) for c, i in index.items()
+                         if c not in _CATEGORICAL_COLUMNS and c not in _TIME_FEATURES
+                         and c not in (time_series or [])]
+        self._fill = [(index[c], value) for c, value in (fill_values or {}).items() if c in index]
+        self._local = threading.local()
+
+    def _row(self):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(self.columns)))
+        return row
+
+    @staticmethod
+    def _to_float(value):
+        if value is None or isinstance(value, str) and not value.strip():
+            return np.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    @staticmethod
+    def _is_missing(value):
+        return value is None or isinstance(value, float) and np.isnan(value)
+
+    @classmethod
+    def _to_code(cls, value):
+        if cls._is_missing(value):
+            return np.nan
+        match = cls._CODE_PATTERN.search(str(value))
+        return float(match.group()) if match else np.nan
+
+    def fill(self, data, feature_store=None):
+        """Fill this thread's feature row from a single feature record.
+
+        Parameters
+        ----------
+        data : str or dict
+            A single feature record, as received within POST requests.
+        feature_store : FeatureStore, optional
+            Serves the time-series features. When omitted, they are taken
+            from `data`.
+
+        Returns
+        -------
+        Numpy ndarray or None
+            A (1, n_features) row ready for prediction, or None when the
+            record can only be handled by `_preprocess_data()`.
+        """
+        if isinstance(data, (str, bytes)):
+            data = json.loads(data)
+        if not isinstance(data, dict):
+            return None
+        time = data.get('time')
+        if self._time or self._series and feature_store is not None:
+            try:
+                time = datetime.fromisoformat(time)
+            except (TypeError, ValueError):
+                return None
+            if time.tzinfo is not None:
+                return None
+        row = self._row()
+        values = row[0]
+        for i, column in self._numeric:
+            values[i] = self._to_float(data.get(column))
+        for i, column in self._categorical:
+            value = data.get(column)
+            if column not in self.encoders:
+                values[i] = self._to_code(value)
+                continue
+            # Unknown codes are left as NaN, and reported by `make_prediction()`.
+            values[i] = self.encoders[column].encode(value)
+        for i, column in self._time:
+            if column == 'Year':
+                values[i] = time.year
+            elif column == 'Month_of_year':
+                values[i] = time.month
+            elif column == 'Day_of_month':
+                values[i] = time.day
+            elif column == 'Day_of_week':
+                values[i] = time.weekday()
+            else:
+                values[i] = time.hour
+        if self._series and feature_store is not None:
+            series = feature_store.lookup_record(time, [column for _, column in self._series])
+            for (i, _), value in zip(self._series, series):
+                values[i] = value
+        else:
+            for i, column in self._series:
+                values[i] = self._to_float(data.get(column))
+        for i, value in self._fill:
+            if np.isnan(values[i]):
+                values[i] = value
+        return row
+
+# The version of the `FittedPipeline` artifact format written by training.
+# Version 2 added time-series features.
+PIPELINE_VERSION = 2
+
+class FittedPipeline:
+    """Everything fitted in training which is needed to make predictions.
+
+    This is the artifact written by `utils/train_model.py`, holding our
+    estimator together with the constants used to preprocess its inputs.
+    Preprocessing therefore never recomputes statistics over the data being
+    scored.
+
+    Parameters
+    ----------
+    estimator : <class: sklearn.estimator>
+        The trained sklearn model.
+    columns : list, optional
+        The features used by the estimator, in the order in which it was trained.
+    fill_values : dict, optional
+        Training constants with which to replace missing values.
+    categorical_encoders : dict, optional
+        Fitted `CategoricalEncoder` objects for the categorical features.
+    scaler_mean, scaler_scale : Numpy ndarray, optional
+        Standardisation statistics applied to the features before prediction.
+    model_version : str, optional
+        An identifier for this trained model.
+    time_series_features : list, optional
+        The `TimeSeriesFeature` definitions of any lag and rolling features
+        among `columns`, which are served by an attached `FeatureStore`.
     """
-    # Convert the json string to a python dictionary object
-    feature_vector_dict = json.loads(data)
-    # Load the dictionary as a Pandas DataFrame.
-    feature_vector_df = pd.DataFrame.from_dict([feature_vector_dict])
-
-    # ---------------------------------------------------------------
-    # NOTE: You will need to swap the lines below for your own data
-    # preprocessing methods.
-    #
-    # The code below is for demonstration purposes only. You will not
-    # receive marks for submitting this code in an unchanged state.
-    # ---------------------------------------------------------------
-
-    # ----------- Replace this code with your own preprocessing steps --------
-    # Regression Predict Student Solution
+
+    def __init__(self, estimator, columns=FEATURE_COLUMNS, fill_values=None,
+                 categorical_encoders=None, scaler_mean=None, scaler_scale=None,
+                 model_version=None, time_series_features=None):
+        self.version = PIPELINE_VERSION
+        self.estimator = estimator
+        self.columns = list(columns)
+        self.fill_values = fill_values
+        self.categorical_encoders = categorical_encoders or {}
+        self.scaler_mean = None if scaler_mean is None else np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = None if scaler_scale is None else np.asarray(scaler_scale, dtype=np.float64)
+        self.model_version = model_version
+        self.time_series_features = [TimeSeriesFeature(*definition)
+                                     for definition in time_series_features or []]
+        self.feature_store = None
+        self._compile()
+
+    def _compile(self):
+        # Compiled once, for use by `make_prediction()`.
+        self._plan = _FeaturePlan(self.columns, self.categorical_encoders, self.fill_values,
+                                  [definition.name for definition in self.time_series_features])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_plan']
+        # The store is attached again wherever the pipeline is served.
+        state['feature_store'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Pipelines saved before version 2 have no time-series features.
+        state.setdefault('time_series_features', [])
+        state.setdefault('feature_store', None)
+        self.__dict__.update(state)
+        self._compile()
+
+    def attach_feature_store(self, feature_store):
+        """Serve the time-series features of this pipeline from `feature_store`.
+
+        Raises
+        ------
+        ValueError
+            If the store does not serve every time-series feature of the pipeline.
+        """
+        missing = [definition.name for definition in self.time_series_features
+                   if definition not in feature_store.definitions]
+        if missing:
+            raise ValueError('The feature store does not serve: ' + ', '.join(missing))
+        self.feature_store = feature_store
+
+    def preprocess(self, data):
+        """Preprocess a payload of one or more feature records."""
+        return _preprocess_data(data, self.categorical_encoders, self.fill_values, self.columns,
+                                self.feature_store)
+
+    def preprocess_record(self, data):
+        """Preprocess a single feature record without pandas, if possible."""
+        return self._plan.fill(data, self.feature_store)
+
+    def predict(self, X, overwrite=False):
+        """Standardise a feature matrix and predict with our estimator.
+
+        Parameters
+        ----------
+        X : Numpy ndarray
+            Preprocessed float64 features, in the order of `columns`.
+        overwrite : bool
+            Whether `X` may be standardised in place, as for the buffers
+            filled by `preprocess_record()`. Read-only arrays are never
+            overwritten.
+
+        Returns
+        -------
+        Numpy ndarray
+            The estimator's predictions.
+        """
+        if self.scaler_mean is not None:
+            if overwrite and X.flags.writeable:
+                X -= self.scaler_mean
+                X /= self.scaler_scale
+            else:
+                X = (X - self.scaler_mean) / self.scaler_scale
+        return self.estimator.predict(X)
+
+# The notebook used to develop the preprocessing steps above is kept below for
+# reference. It is not executed by the API.
+r"""
+# Regression Predict Student Solution
 
 © Explore Data Science Academy
 
@@ -591,11 +958,7 @@ test_data['time'] = time
 load = test_data[['time','load_shortfall_3h']]
 load.to_csv('Kaggle_submission_shortfall.csv', index = False)
 load
-
-
-    # ------------------------------------------------------------------------
-
-    return predict_vector
+"""
 
 def load_model(path_to_model:str):
     """Adapter function to load our pretrained model into memory.
@@ -604,41 +967,567 @@ def load_model(path_to_model:str):
     ----------
     path_to_model : str
         The relative path to the model weights/schema to load.
-        Note that unless another file format is used, this needs to be a
-        .pkl file.
+        This is either a .pkl file, or a native model directory written
+        by `utils/export_model.py`.
 
     Returns
     -------
-    <class: sklearn.estimator>
-        The pretrained model loaded into memory.
+    FittedPipeline
+        The pretrained model loaded into memory. Plain sklearn models are
+        wrapped in a `FittedPipeline` without any fitted preprocessing.
 
     """
-    return pickle.load(open(path_to_model, 'rb'))
+    if is_native_artifact(path_to_model):
+        # Native models are served without importing sklearn.
+        predictor, meta = load_native_model(path_to_model)
+        encoders = {column: CategoricalEncoder.from_dict(column, table)
+                    for column, table in meta['categorical_encoders'].items()}
+        return FittedPipeline(predictor, columns=meta['columns'], fill_values=meta['fill_values'],
+                              categorical_encoders=encoders, model_version=meta['model_version'],
+                              time_series_features=meta.get('time_series_features'))
+    with open(path_to_model, 'rb') as model_file:
+        artifact = model_file.read()
+    model = pickle.loads(artifact)
+    if isinstance(model, FittedPipeline):
+        if model.version > PIPELINE_VERSION:
+            raise ValueError(f'{path_to_model} holds a version {model.version} pipeline, '
+                             f'but at most version {PIPELINE_VERSION} is supported.')
+        return model
+    return FittedPipeline(model, categorical_encoders=getattr(model, 'categorical_encoders_', None),
+                          model_version=hashlib.sha1(artifact).hexdigest()[:12])
 
 
 """ You may use this section (above the make_prediction function) of the python script to implement 
     any auxiliary functions required to process your model's artifacts.
 """
 
-def make_prediction(data, model):
+def _record_stage(timings, stage, started):
+    """Private helper function adding the time since `started` to a stage.
+
+    Returns the current time, from which to measure the next stage.
+    """
+    if timings is None:
+        return started
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
+def _as_pipeline(model):
+    """Private helper function wrapping plain sklearn models for prediction."""
+    if isinstance(model, FittedPipeline):
+        return model
+    return FittedPipeline(model, categorical_encoders=getattr(model, 'categorical_encoders_', None))
+
+def _invalid_record_error(data, model, invalid):
+    """Private helper function describing the invalid fields of a record.
+
+    Parameters
+    ----------
+    data : str or dict
+        The single feature record which was preprocessed.
+    model : FittedPipeline
+        The model for which it was preprocessed.
+    invalid : Numpy ndarray
+        Whether each of the model's features is missing or invalid.
+
+    Returns
+    -------
+    RequestError
+        An error with status 422, naming each invalid field as the request
+        schema does.
+    """
+    record = data
+    if isinstance(record, (str, bytes)):
+        try:
+            record = json.loads(record)
+        except ValueError:
+            record = {}
+    if not isinstance(record, dict):
+        record = {}
+    fields = {}
+    for column, bad in zip(model.columns, invalid):
+        if not bad:
+            continue
+        if column in CALENDAR_FIELDS and column not in record:
+            fields['time'] = f"Expected a timestamp such as '2018-01-01 03:00:00', got {record.get('time')!r}."
+            continue
+        value = record.get(column)
+        if column not in record:
+            fields[column] = 'This field is required.'
+        elif value is None:
+            fields[column] = 'This field may not be null.'
+        elif column in model.categorical_encoders:
+            fields[column] = f'Unknown code {value!r}.'
+        else:
+            fields[column] = f'Expected a number, got {value!r}.'
+    return RequestError('The feature record is invalid.', status=422,
+                        fields=[{'field': field, 'error': error} for field, error in fields.items()])
+
+def make_prediction(data, model, cache=None, decoder=None, timings=None, batcher=None):
     """Prepare request data for model prediction.
 
     Parameters
     ----------
     data : str
         The data payload received within POST requests sent to our API.
-    model : <class: sklearn.estimator>
-        An sklearn model object.
+    model : FittedPipeline or <class: sklearn.estimator>
+        The model returned by `load_model()`, or an sklearn model object.
+    cache : PredictionCache, optional
+        A cache of predictions, consulted before using the model.
+    decoder : RecordDecoder, optional
+        A request schema compiled for `model`. When given, the payload is
+        validated while it is decoded.
+    timings : dict, optional
+        Receives the seconds spent in the `preprocess`, `cache` and
+        `predict` stages, or `batch_wait` rather than `predict` when
+        micro-batching.
+    batcher : MicroBatcher, optional
+        Scores the preprocessed row together with those of concurrent
+        requests, rather than with a model call of its own.
 
     Returns
     -------
     list
         A 1-D python list containing the model prediction.
 
+    Raises
+    ------
+    RequestError
+        With status 422 if any field of the record is missing or invalid,
+        e.g. an unknown categorical code.
+
     """
-    # Data preprocessing.
-    prep_data = _preprocess_data(data)
+    model = _as_pipeline(model)
+    started = time.perf_counter()
+    # Data preprocessing, using the compiled fast path for single records.
+    # Only the buffers filled by the fast path are standardised in place.
+    if decoder is not None:
+        prep_data = decoder.decode(data)
+    else:
+        prep_data = model.preprocess_record(data)
+    owned = prep_data is not None
+    if prep_data is None:
+        prep_data = model.preprocess(data).to_numpy()
+    if decoder is None:
+        invalid = np.isnan(prep_data).any(axis=0)
+        if invalid.any():
+            raise _invalid_record_error(data, model, invalid)
+    started = _record_stage(timings, 'preprocess', started)
+    if cache is not None:
+        key = cache.key(prep_data)
+        output = cache.get(key, model.model_version)
+        started = _record_stage(timings, 'cache', started)
+        if output is not None:
+            return list(output)
     # Perform prediction with model and preprocessed data.
-    prediction = model.predict(prep_data)
-    # Format as list for output standardisation.
-    return prediction[0].tolist()
+    if batcher is not None:
+        output = batcher.predict(model, prep_data[0])
+        _record_stage(timings, 'batch_wait', started)
+    else:
+        prediction = model.predict(prep_data, overwrite=owned)
+        # Format as list for output standardisation.
+        output = np.reshape(prediction, (1, -1))[0].tolist()
+        _record_stage(timings, 'predict', started)
+    if cache is not None:
+        cache.put(key, model.model_version, output)
+    return list(output)
+
+def make_batch_prediction(data, model, cache=None, timings=None):
+    """Prepare a batch of request data for a single model prediction.
+
+    All valid rows are preprocessed and predicted together in one call to
+    the model. Rows holding missing or unparseable features are reported
+    individually rather than failing the whole batch.
+
+    Parameters
+    ----------
+    data : str, dict or list
+        The data payload received within POST requests sent to our API.
+        Either a list of feature records, or a columnar mapping of feature
+        names to lists of values.
+    model : FittedPipeline or <class: sklearn.estimator>
+        The model returned by `load_model()`, or an sklearn model object.
+    cache : PredictionCache, optional
+        A cache of predictions. Only rows missing from it are predicted.
+    timings : dict, optional
+        Receives the seconds spent in the `preprocess`, `cache` and
+        `predict` stages.
+
+    Returns
+    -------
+    dict
+        A python dictionary holding a `predictions` list in input order,
+        with `None` for each failed row, and an `errors` list describing
+        why each of those rows could not be scored.
+
+    """
+    model = _as_pipeline(model)
+    started = time.perf_counter()
+    # Data preprocessing.
+    feature_vector_df = _load_feature_frame(data)
+    prep_data = model.preprocess(feature_vector_df)
+    missing = prep_data.isna().to_numpy()
+    valid = ~missing.any(axis=1)
+    outputs = [None] * len(prep_data)
+    rows = np.flatnonzero(valid)
+    started = _record_stage(timings, 'preprocess', started)
+    if len(rows):
+        features = prep_data.to_numpy()
+        keys = {}
+        if cache is not None:
+            for row in rows:
+                keys[row] = cache.key(features[row])
+                outputs[row] = cache.get(keys[row], model.model_version)
+            rows = np.array([row for row in rows if outputs[row] is None], dtype=int)
+            started = _record_stage(timings, 'cache', started)
+    if len(rows):
+        # Perform a single prediction over every remaining valid row.
+        prediction = np.reshape(model.predict(features[rows]), (len(rows), -1))
+        for row, output in zip(rows, prediction.tolist()):
+            outputs[row] = output
+            if cache is not None:
+                cache.put(keys[row], model.model_version, output)
+        _record_stage(timings, 'predict', started)
+    predictions = [output if output is None or len(output) > 1 else output[0]
+                   for output in outputs]
+    errors = [{'row': int(row),
+               'error': _describe_invalid_row(feature_vector_df.iloc[row],
+                                              prep_data.columns[missing[row]],
+                                              model.categorical_encoders)}
+              for row in np.flatnonzero(~valid)]
+    return {'predictions': predictions, 'errors': errors}
+
+def make_matrix_prediction(columns, matrix, model):
+    """Predict for a batch of preprocessed features given as a matrix.
+
+    This serves binary feature matrix payloads, whose columns already hold
+    the numeric features of our model. When the columns are given in the
+    model's order as float64 values, the matrix is passed to the model
+    without being copied. These batches bypass the prediction cache.
+
+    Parameters
+    ----------
+    columns : list
+        The name of each column of `matrix`. Columns not used by the model
+        are ignored.
+    matrix : Numpy ndarray
+        A 2-D float32 or float64 array of features, with one row per
+        record. Categorical features hold the numbers of their codes, e.g.
+        5 for 'level_5', and calendar features replace the `time` column.
+    model : FittedPipeline or <class: sklearn.estimator>
+        The model returned by `load_model()`, or an sklearn model object.
+
+    Returns
+    -------
+    tuple
+        A float64 array of predictions shaped (n_rows, n_outputs), holding
+        NaN for each failed row, along with an `errors` list describing why
+        each of those rows could not be scored.
+
+    Raises
+    ------
+    ValueError
+        If any of the model's features are missing from `columns`.
+    """
+    model = _as_pipeline(model)
+    position = {column: index for index, column in enumerate(columns)}
+    absent = [column for column in model.columns if column not in position]
+    if absent:
+        raise ValueError('The feature matrix is missing columns: ' + ', '.join(absent))
+    X = matrix
+    if list(columns) != list(model.columns):
+        X = X[:, [position[column] for column in model.columns]]
+    X = X.astype(np.float64, copy=False)
+    index = {column: i for i, column in enumerate(model.columns)}
+
+    # Apply the fill values, copying the matrix only if one is needed.
+    for column, value in (model.fill_values or {}).items():
+        gaps = np.isnan(X[:, index[column]])
+        if gaps.any():
+            if not X.flags.writeable or X is matrix:
+                X = X.copy()
+            X[gaps, index[column]] = value
+    invalid = np.isnan(X)
+    unknown = np.zeros_like(invalid)
+    for column, encoder in (model.categorical_encoders or {}).items():
+        values = X[:, index[column]]
+        unknown[:, index[column]] = ~np.isnan(values) & ~np.isin(values, encoder.values_)
+    invalid |= unknown
+    valid = ~invalid.any(axis=1)
+
+    n_rows = len(X)
+    if n_rows and valid.all():
+        prediction = np.reshape(model.predict(X), (n_rows, -1))
+    else:
+        # Perform a single prediction over the valid rows only.
+        scored = np.reshape(model.predict(X[valid]), (int(valid.sum()), -1)) if valid.any() \
+            else np.empty((0, 1))
+        prediction = np.full((n_rows, scored.shape[1]), np.nan)
+        prediction[valid] = scored
+    errors = [{'row': int(row),
+               'error': _describe_invalid_row(dict(zip(model.columns, X[row].tolist())),
+                                              [column for column, bad in zip(model.columns, invalid[row]) if bad],
+                                              model.categorical_encoders or {})}
+              for row in np.flatnonzero(~valid)]
+    return prediction, errors
+
+def _forecast_table(weather, columns):
+    """Private helper function giving the `time` and the given columns of
+    weather forecasts as a mapping of columns."""
+    if isinstance(weather, dict) and weather and all(isinstance(values, list) for values in weather.values()):
+        table = {name: weather[name] for name in ['time'] + columns if name in weather}
+    elif isinstance(weather, list) and weather and all(isinstance(record, dict) for record in weather):
+        table = {name: [record.get(name) for record in weather] for name in ['time'] + columns}
+    else:
+        raise ValueError('Expected weather forecasts as a list of records or a mapping of columns.')
+    if 'time' not in table:
+        raise ValueError('The weather forecasts have no time column.')
+    if len({len(values) for values in table.values()}) > 1:
+        raise ValueError('The weather forecast columns differ in length.')
+    return table
+
+def _forecast_column(values, categorical, encoder=None):
+    """Private helper function converting a column of weather forecasts to
+    floats, along with a boolean array flagging the values which were given
+    but are invalid, e.g. unknown codes."""
+    if categorical:
+        # Codes are mapped by the encoder fitted in training, if there is one.
+        encode = encoder.encode if encoder is not None else _FeaturePlan._to_code
+        floats = np.array([encode(value) for value in values], dtype=np.float64)
+    else:
+        try:
+            floats = np.asarray(values, dtype=np.float64)
+            if floats.ndim == 1:
+                return floats, np.zeros(len(floats), dtype=bool)
+        except (TypeError, ValueError):
+            pass
+        floats = np.array([_FeaturePlan._to_float(value) for value in values], dtype=np.float64)
+    given = np.array([not (_FeaturePlan._is_missing(value) or isinstance(value, str) and not value.strip())
+                      for value in values], dtype=bool)
+    return floats, np.isnan(floats) & given
+
+def _describe_forecast_row(invalid, missing):
+    """Private helper function explaining why a forecast slot could not be
+    scored, naming each field which was invalid or missing."""
+    reasons = [f'Unknown {column} code {value!r}' if column in _CATEGORICAL_COLUMNS
+               else f'Invalid value for {column}: {value!r}' for column, value in invalid]
+    if missing:
+        reasons.append('Missing or invalid values for: ' + ', '.join(missing))
+    return '. '.join(reasons)
+
+def _slot_time(period):
+    """Private helper function formatting the start of a slot as in our datasets."""
+    return (datetime(1970, 1, 1) + timedelta(hours=int(period) * PERIOD_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+
+def make_forecast(start, end, weather, model, max_slots=None, max_weather_age_hours=PERIOD_HOURS,
+                  timings=None):
+    """Forecast the shortfall of every three-hour slot within a time range.
+
+    The grid of slots from `start` to `end` is generated, and the calendar
+    features of every slot derived in one vectorized step. Each slot is
+    joined to the most recent weather forecast at or before it, and all of
+    the slots are then scored with a single model call. Slots without a
+    recent enough forecast, or whose forecast holds invalid values, fail.
+
+    Parameters
+    ----------
+    start, end : str
+        The first and last times of the range, e.g. '2018-01-01 00:00:00'.
+        Both are inclusive, and `start` is rounded up to the next slot.
+    weather : dict or list
+        Weather forecasts, either as a list of records or a mapping of
+        columns to lists of values, each with its `time`.
+    model : FittedPipeline or <class: sklearn.estimator>
+        The model returned by `load_model()`, or an sklearn model object.
+    max_slots : int, optional
+        The most slots which a range may hold.
+    max_weather_age_hours : float, optional
+        The oldest a weather forecast may be at the start of a slot which
+        is joined to it, one period by default. None allows any age.
+    timings : dict, optional
+        Receives the seconds spent in the `preprocess` and `predict` stages.
+
+    Returns
+    -------
+    dict
+        The `start` of the forecast series and its `period_hours`, with a
+        `predictions` list holding one prediction per slot, or `None` for
+        each slot which failed, and an `errors` list describing why each
+        of those failed, by `time`.
+
+    Raises
+    ------
+    ValueError
+        If the range or the weather forecasts are invalid.
+    """
+    model = _as_pipeline(model)
+    started = time.perf_counter()
+    try:
+        start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    except (TypeError, ValueError):
+        raise ValueError("Expected `start` and `end` timestamps such as '2018-01-01 03:00:00'.") from None
+    if start.tzinfo is not None or end.tzinfo is not None:
+        raise ValueError('Expected timestamps without a time zone.')
+    step = timedelta(hours=PERIOD_HOURS)
+    first = -(-(start - datetime(1970, 1, 1)) // step)
+    last = (end - datetime(1970, 1, 1)) // step
+    n_slots = last - first + 1
+    if n_slots < 1:
+        raise ValueError('The range holds no slots.')
+    if max_slots and n_slots > max_slots:
+        raise ValueError(f'The range holds {n_slots} slots, more than the limit of {max_slots}.')
+    periods = np.arange(first, last + 1)
+    slots = (periods * PERIOD_HOURS).astype('datetime64[h]')
+
+    # Join each slot to the latest weather forecast at or before it.
+    table = _forecast_table(weather, model.columns)
+    weather_periods, valid = periods_of(table['time'])
+    forecasts = np.flatnonzero(valid)
+    forecasts = forecasts[np.argsort(weather_periods[forecasts], kind='stable')]
+    held = weather_periods[forecasts]
+    latest = np.searchsorted(held, periods, side='right') - 1
+    found = latest >= 0
+    age = (periods - held[np.maximum(latest, 0)]) * PERIOD_HOURS if len(held) else np.zeros(n_slots, np.int64)
+    stale = found & (age > max_weather_age_hours) if max_weather_age_hours is not None \
+        else np.zeros(n_slots, dtype=bool)
+    joined = found & ~stale
+    rows = forecasts[latest[joined]]
+
+    # The calendar features of the whole range are derived together.
+    index = {column: i for i, column in enumerate(model.columns)}
+    calendar, _ = extract_calendar_features(slots[joined], [c for c in model.columns if c in CALENDAR_FIELDS])
+    series = [definition.name for definition in model.time_series_features] \
+        if model.feature_store is not None else []
+    matrix = np.full((len(rows), len(model.columns)), np.nan)
+    for column, values in calendar.items():
+        matrix[:, index[column]] = values
+    if series:
+        matrix[:, [index[name] for name in series]] = model.feature_store.lookup(slots[joined], series)
+    # Forecasts given in slot order are used as they are.
+    in_order = len(rows) == len(table['time']) and bool((rows == np.arange(len(rows))).all())
+    invalid = collections.defaultdict(list)
+    encoders = model.categorical_encoders or {}
+    for column in model.columns:
+        if column in table and column not in calendar and column not in series:
+            values = table[column] if in_order else [table[column][row] for row in rows.tolist()]
+            matrix[:, index[column]], bad = _forecast_column(values, column in _CATEGORICAL_COLUMNS,
+                                                              encoders.get(column))
+            for row in np.flatnonzero(bad).tolist():
+                invalid[row].append((column, values[row]))
+    started = _record_stage(timings, 'preprocess', started)
+
+    prediction, errors = make_matrix_prediction(model.columns, matrix, model) if len(rows) \
+        else (np.empty((0, 1)), [])
+    _record_stage(timings, 'predict', started)
+    outputs = [None] * n_slots
+    scored = np.flatnonzero(joined)
+    for slot, output in zip(scored.tolist(), prediction.tolist()):
+        if not np.isnan(output).any():
+            outputs[slot] = output if len(output) > 1 else output[0]
+    failures = []
+    for error in errors:
+        row = error['row']
+        if row in invalid:
+            named = {column for column, _ in invalid[row]}
+            missing = [column for column, value in zip(model.columns, matrix[row].tolist())
+                       if np.isnan(value) and column not in named and column not in (model.fill_values or {})]
+            error['error'] = _describe_forecast_row(invalid[row], missing)
+        failures.append((scored[row], error['error']))
+    failures += [(slot, 'There is no weather forecast at or before this time.')
+                 for slot in np.flatnonzero(~found)]
+    failures += [(slot, f'The latest weather forecast is {int(age[slot])} hours old, '
+                        f'more than the limit of {max_weather_age_hours:g} hours.')
+                 for slot in np.flatnonzero(stale)]
+    return {'start': _slot_time(first), 'period_hours': PERIOD_HOURS, 'predictions': outputs,
+            'errors': [{'time': _slot_time(periods[slot]), 'error': error}
+                       for slot, error in sorted(failures)]}
+
+def make_stream_prediction(lines, model, chunk_size=512, cache=None):
+    """Score a stream of newline-delimited JSON feature records in chunks.
+
+    Records are read lazily from `lines`, and each chunk of records is
+    scored with a single call to `make_batch_prediction()`. Only one chunk
+    is held in memory at a time, and no further input is read until the
+    results of the previous chunk have been consumed.
+
+    Parameters
+    ----------
+    lines : iterable
+        Lines of text or bytes, each holding a JSON feature record. Blank
+        lines are skipped.
+    model : FittedPipeline or <class: sklearn.estimator>
+        The model returned by `load_model()`, or an sklearn model object.
+    chunk_size : int
+        The number of records scored together.
+    cache : PredictionCache, optional
+        A cache of predictions. Only rows missing from it are predicted.
+
+    Yields
+    ------
+    dict
+        For each record in input order, its `row` number along with either
+        its `prediction` or an `error`.
+    """
+    def score(chunk):
+        records = [(row, record) for row, record in chunk if isinstance(record, dict)]
+        output = make_batch_prediction([record for _, record in records], model, cache) \
+            if records else {'predictions': [], 'errors': []}
+        # Results are matched to records by position.
+        assert len(output['predictions']) == len(records)
+        errors = {records[error['row']][0]: error['error'] for error in output['errors']}
+        predictions = {row: prediction for (row, _), prediction
+                       in zip(records, output['predictions'])}
+        for row, record in chunk:
+            if not isinstance(record, dict):
+                yield {'row': row, 'error': record if isinstance(record, str) else
+                       'Expected a JSON object holding a feature record.'}
+            elif row in errors:
+                yield {'row': row, 'error': errors[row]}
+            else:
+                yield {'row': row, 'prediction': predictions[row]}
+
+    chunk = []
+    row = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            record = f'Invalid JSON: {error}'
+        chunk.append((row, record))
+        row += 1
+        if len(chunk) >= chunk_size:
+            yield from score(chunk)
+            chunk = []
+    if chunk:
+        yield from score(chunk)
+
+def _describe_invalid_row(record, columns, encoders):
+    """Private helper function explaining why a record could not be scored.
+
+    Parameters
+    ----------
+    record : Pandas Series or dict
+        The raw feature record.
+    columns : list
+        The preprocessed features of the record which are missing.
+    encoders : dict
+        Fitted `CategoricalEncoder` objects for the categorical features.
+
+    Returns
+    -------
+    str
+        A description of the unknown codes and missing or invalid values.
+    """
+    import pandas as pd
+    unknown = [f'{column} code {record[column]!r}' for column in columns
+               if column in encoders and pd.notna(record.get(column))]
+    invalid = [column for column in columns
+               if not (column in encoders and pd.notna(record.get(column)))]
+    reasons = []
+    if unknown:
+        reasons.append('Unknown ' + ', '.join(unknown))
+    if invalid:
+        reasons.append('Missing or invalid values for: ' + ', '.join(invalid))
+    return '. '.join(reasons)
@@ -0,0 +1,325 @@
+"""
+
+    Registry of the models served by our API.
+
+    Description: This file contains an in-memory registry of named models.
+    A new version of a model is loaded and warmed up with a synthetic
+    prediction before it atomically replaces the version being served,
+    which is kept for an instant rollback. Models are loaded on first use,
+    and the least recently used are unloaded again when the registry grows
+    beyond its memory limit. The registry may also watch each artifact for
+    changes, reloading a model whenever it is retrained.
+
+"""
+
+# Registry Dependencies
+import collections
+import logging
+import math
+import os
+import threading
+import time
+from model import load_model, make_prediction
+
+logger = logging.getLogger(__name__)
+
+# A loaded version of a model. Requests hold on to the version they started
+# with, so that swapping or unloading it never disturbs them. The seconds
+# taken to load and to warm up the model are kept for reporting.
+LoadedModel = collections.namedtuple('LoadedModel', ['name', 'path', 'pipeline', 'decoder',
+                                                     'model_version', 'loaded_at',
+                                                     'load_seconds', 'warm_up_seconds'])
+
+
+def artifact_size(path):
+    """The size of a model file, or of all files within a model directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _modified(path):
+    """Private helper function giving the last modification time of an artifact."""
+    if os.path.isdir(path):
+        return max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, name))
+                                               for name in os.listdir(path)])
+    return os.path.getmtime(path)
+
+
+def synthetic_record(pipeline):
+    """A valid feature record for `pipeline`, with which to warm it up."""
+    record = {column: 0.0 for column in pipeline.columns}
+    for column, encoder in (pipeline.categorical_encoders or {}).items():
+        if len(encoder.categories_):
+            record[column] = str(encoder.categories_[0])
+    record['time'] = '2018-01-01 00:00:00'
+    return record
+
+
+class _Entry:
+    """Private record of one version of a model, which may be unloaded."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.size = artifact_size(path)
+        self.modified = _modified(path)
+        self.loaded = None
+        # The version last loaded, kept while the entry is unloaded.
+        self.model_version = None
+        # Held while the entry is being loaded, so that it is loaded once.
+        self.loading = threading.Lock()
+
+
+class ModelRegistry:
+    """Named models, each with a served and a previous version.
+
+    Parameters
+    ----------
+    schema : RequestSchema, optional
+        The schema against which single records are validated, compiled
+        for each loaded model.
+    max_bytes : int, optional
+        The memory limit of the loaded models, estimated by the size of
+        their artifacts. The least recently used models are unloaded to
+        stay within it, and loaded again when next used. 0 means no limit.
+    check_interval : float, optional
+        How often, in seconds, to check whether the artifacts of the served
+        models have changed, reloading those which have. 0 disables this.
+    feature_store : FeatureStore, optional
+        Serves the time-series features of the models which use them.
+    """
+
+    def __init__(self, schema=None, max_bytes=0, check_interval=0, feature_store=None):
+        self.schema = schema
+        self.feature_store = feature_store
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self._active = {}
+        self._previous = {}
+        # Loaded entries, least recently used first.
+        self._resident = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._watcher = None
+        # The newest modification time loaded from each artifact.
+        self._seen = {}
+
+    def add_listener(self, listener):
+        """Call `listener(name, old, new)` whenever a served model is swapped.
+
+        `old` and `new` are `LoadedModel` tuples, or None.
+        """
+        self._listeners.append(listener)
+
+    def register(self, name, path, load=False):
+        """Register the artifact of a named model, to be loaded on first use.
+
+        Parameters
+        ----------
+        name : str
+            The name under which the model is served.
+        path : str
+            The model artifact, as accepted by `load_model()`.
+        load : bool
+            Whether to load and warm up the model immediately.
+        """
+        if load:
+            return self.load(name, path)
+        with self._lock:
+            self._active[name] = _Entry(name, path)
+
+    def names(self):
+        """The names of the registered models."""
+        return list(self._active)
+
+    def get(self, name):
+        """The served version of a model, loading it if needed.
+
+        Raises
+        ------
+        KeyError
+            If no model is registered under `name`.
+        """
+        self._ensure_watching()
+        entry = self._active[name]
+        loaded = entry.loaded
+        if loaded is None:
+            loaded = self._load_entry(entry)
+            self._notify(name, None, loaded)
+            return loaded
+        # Marking the model as recently used never waits for the lock, which
+        # may be held while another model is swapped in.
+        if self.max_bytes and self._lock.acquire(blocking=False):
+            try:
+                if id(entry) in self._resident:
+                    self._resident.move_to_end(id(entry))
+            finally:
+                self._lock.release()
+        return loaded
+
+    def load(self, name, path=None):
+        """Load a new version of a model, swapping it in once warmed up.
+
+        The version being replaced is kept, so that it may be restored with
+        `rollback()`. If the new version fails to load or warm up, the
+        served version is left in place.
+
+        Parameters
+        ----------
+        name : str
+            The name under which the model is served.
+        path : str, optional
+            The model artifact. Defaults to that of the served version.
+
+        Returns
+        -------
+        LoadedModel
+            The newly served version.
+        """
+        if path is None:
+            path = self._active[name].path
+        entry = _Entry(name, path)
+        loaded = self._load_entry(entry)
+        with self._lock:
+            old = self._active.get(name)
+            self._active[name] = entry
+            if old is not None:
+                self._previous[name] = old
+            self._seen[path] = max(entry.modified, self._seen.get(path, 0))
+            self._forget()
+            # The replaced version may now be unloaded to make room.
+            self._evict(keep=entry)
+        self._notify(name, old.loaded if old is not None else None, loaded)
+        logger.info('Serving %s version %s from %s', name, loaded.model_version, path)
+        return loaded
+
+    def rollback(self, name):
+        """Serve the previous version of a model again, returning it.
+
+        If the previous version was unloaded, it is loaded again from its
+        artifact before being served, which must still hold that version.
+
+        Raises
+        ------
+        KeyError
+            If the model has no previous version.
+        ValueError
+            If the artifact of the unloaded previous version now holds a
+            different version. The served version is left in place.
+        """
+        previous = self._previous[name]
+        loaded = self._load_entry(previous, version=previous.model_version)
+        with self._lock:
+            if self._previous.get(name) is not previous:
+                raise ValueError(f'The previous version of {name} changed while rolling back.')
+            current = self._active[name]
+            self._active[name], self._previous[name] = previous, current
+            self._evict(keep=previous)
+        self._notify(name, current.loaded, loaded)
+        logger.info('Rolled %s back to version %s', name, loaded.model_version)
+        return loaded
+
+    def describe(self):
+        """The served and previous versions of each model, e.g. for JSON."""
+        def entry_info(entry):
+            if entry is None:
+                return None
+            return {'path': entry.path, 'size_bytes': entry.size, 'resident': entry.loaded is not None,
+                    'model_version': entry.model_version,
+                    'loaded_at': entry.loaded.loaded_at if entry.loaded else None,
+                    'load_seconds': entry.loaded.load_seconds if entry.loaded else None,
+                    'warm_up_seconds': entry.loaded.warm_up_seconds if entry.loaded else None}
+        with self._lock:
+            return {
+                'max_bytes': self.max_bytes,
+                'resident_bytes': sum(entry.size for entry in self._resident.values()),
+                'models': {name: {'active': entry_info(entry),
+                                  'previous': entry_info(self._previous.get(name))}
+                           for name, entry in self._active.items()},
+            }
+
+    def _load_entry(self, entry, version=None):
+        """Load and warm up an entry, then make room for it in memory. If
+        `version` is given, the artifact must still hold that version.
+
+        The registry lock is only held to record the loaded entry, so that
+        requests for the models already loaded never wait for a load.
+        """
+        with entry.loading:
+            if entry.loaded is not None:
+                return entry.loaded
+            started = time.perf_counter()
+            pipeline = load_model(entry.path)
+            if version is not None and pipeline.model_version != version:
+                raise ValueError(f'{entry.path} now holds version {pipeline.model_version} of {entry.name}, '
+                                 f'rather than version {version}.')
+            if pipeline.time_series_features and self.feature_store is not None:
+                pipeline.attach_feature_store(self.feature_store)
+            decoder = self.schema.compile(pipeline) if self.schema is not None else None
+            loaded = time.perf_counter()
+            # Warm up the model with a synthetic prediction before serving it.
+            prediction = make_prediction(synthetic_record(pipeline), pipeline, decoder=decoder)
+            if not all(math.isfinite(value) for value in prediction):
+                raise ValueError(f'{entry.path} gave an invalid warm-up prediction: {prediction}')
+            with self._lock:
+                entry.loaded = LoadedModel(entry.name, entry.path, pipeline, decoder,
+                                           pipeline.model_version, time.time(), loaded - started,
+                                           time.perf_counter() - loaded)
+                entry.model_version = pipeline.model_version
+                self._resident[id(entry)] = entry
+                self._evict(keep=entry)
+                return entry.loaded
+
+    def _evict(self, keep):
+        # Called with the lock held. Neither `keep` nor the served version
+        # of its model is unloaded, and versions only kept for rollback are
+        # unloaded before those being served.
+        if not self.max_bytes:
+            return
+        total = sum(entry.size for entry in self._resident.values())
+        active = set(map(id, self._active.values()))
+        candidates = sorted(self._resident.items(), key=lambda item: item[0] in active)
+        for key, entry in candidates:
+            if total <= self.max_bytes:
+                break
+            if entry is keep or entry is self._active.get(keep.name):
+                continue
+            del self._resident[key]
+            entry.loaded = None
+            total -= entry.size
+            logger.info('Unloaded %s from %s to stay within the memory limit', entry.name, entry.path)
+
+    def _forget(self):
+        # Called with the lock held. Versions which are neither served nor
+        # kept for rollback no longer count towards the memory limit.
+        live = set(map(id, self._active.values())) | set(map(id, self._previous.values()))
+        for key in [key for key in self._resident if key not in live]:
+            self._resident.pop(key).loaded = None
+
+    def _notify(self, name, old, new):
+        for listener in self._listeners:
+            listener(name, old, new)
+
+    def _ensure_watching(self):
+        # The watcher is started on first use, so that it runs within each
+        # worker process of a forking server.
+        if not self.check_interval or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            for name, entry in list(self._active.items()):
+                try:
+                    # Rolled back versions are not reloaded until the
+                    # artifact changes again.
+                    if _modified(entry.path) > self._seen.get(entry.path, entry.modified):
+                        self.load(name, entry.path)
+                except Exception:
+                    # Keep serving the current version, and retry on the next check.
+                    logger.exception('Could not reload %s from %s', name, entry.path)
@@ -0,0 +1,55 @@
+"""
+
+    Monitoring helpers for our API.
+
+    Description: This file contains functions used to report on the
+    resources used by the processes serving our model.
+
+"""
+
+# Monitoring Dependencies
+import os
+import resource
+import sys
+
+_SMAPS_FIELDS = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared_clean',
+                 'Shared_Dirty': 'shared_dirty', 'Private_Clean': 'private_clean',
+                 'Private_Dirty': 'private_dirty'}
+
+
+def process_memory(pid=None):
+    """Report the resident memory of a process.
+
+    On Linux, resident memory is split into the pages shared with other
+    processes, such as those inherited copy-on-write from a forking server,
+    and the pages private to this process. The private memory is the cost
+    of running one more worker.
+
+    Parameters
+    ----------
+    pid : int, optional
+        The process to report on. Defaults to the current process.
+
+    Returns
+    -------
+    dict
+        Memory sizes in bytes. Only the peak resident memory (`max_rss`) is
+        available for the current process on other platforms.
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    if not os.path.exists(path):
+        if pid is not None and pid != os.getpid():
+            return {}
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, while macOS reports bytes.
+        return {'max_rss': max_rss if sys.platform == 'darwin' else max_rss * 1024}
+
+    memory = {}
+    with open(path) as smaps:
+        for line in smaps:
+            name, _, value = line.partition(':')
+            if name in _SMAPS_FIELDS:
+                memory[_SMAPS_FIELDS[name]] = int(value.split()[0]) * 1024
+    memory['shared'] = memory.get('shared_clean', 0) + memory.get('shared_dirty', 0)
+    memory['private'] = memory.get('private_clean', 0) + memory.get('private_dirty', 0)
+    return memory
@@ -0,0 +1,233 @@
+"""
+
+    Online updating of our linear model.
+
+    Description: This file contains a least squares linear model which is
+    updated as the actual shortfalls of earlier periods arrive, rather than
+    refitted from all of the training data. It keeps the sufficient
+    statistics XᵀX and Xᵀy of every observation seen, along with the
+    inverse of XᵀX, so that each new observation updates its coefficients
+    in O(features²) by the Sherman-Morrison formula (recursive least
+    squares). The coefficients are periodically recomputed exactly from the
+    statistics, so rounding errors cannot accumulate.
+
+    Updated models are published as pipelines which our API may serve, each
+    replacing the previous artifact atomically.
+
+"""
+
+# Online Model Dependencies
+import hashlib
+import os
+import pickle
+import tempfile
+import numpy as np
+from model import FittedPipeline
+from predictors import LinearPredictor
+
+TARGET = 'load_shortfall_3h'
+
+
+class OnlineLinearRegression:
+    """Ordinary least squares with an intercept, updated incrementally.
+
+    After any sequence of `fit()` and `partial_fit()` calls, the
+    coefficients match those of a single fit to every observation seen.
+
+    Parameters
+    ----------
+    refresh_every : int
+        The number of incremental updates after which the coefficients are
+        recomputed exactly from the sufficient statistics.
+    """
+
+    def __init__(self, refresh_every=1000):
+        self.refresh_every = refresh_every
+        # The statistics of the features augmented with a constant 1, whose
+        # coefficient is the intercept.
+        self.gram_ = None
+        self.moment_ = None
+        self.inverse_ = None
+        self.weights_ = None
+        self.n_samples_ = 0
+        self._updates = 0
+
+    @staticmethod
+    def _augment(X):
+        X = np.asarray(X, dtype=np.float64)
+        return np.column_stack([X, np.ones(len(X))])
+
+    @property
+    def coef_(self):
+        return self.weights_[:-1]
+
+    @property
+    def intercept_(self):
+        return self.weights_[-1]
+
+    def fit(self, X, y):
+        """Fit the model to a batch of observations, from scratch.
+
+        Raises
+        ------
+        numpy.linalg.LinAlgError
+            If the features are linearly dependent, e.g. when there are
+            fewer observations than features.
+        """
+        A = self._augment(X)
+        y = np.asarray(y, dtype=np.float64).reshape(-1)
+        self.gram_ = A.T @ A
+        self.moment_ = A.T @ y
+        self.n_samples_ = len(y)
+        self.refresh()
+        return self
+
+    def partial_fit(self, X, y):
+        """Update the model with new observations, one at a time."""
+        if self.gram_ is None:
+            return self.fit(X, y)
+        A = self._augment(X)
+        y = np.asarray(y, dtype=np.float64).reshape(-1)
+        for a, target in zip(A, y):
+            self.gram_ += np.outer(a, a)
+            self.moment_ += a * target
+            # (G + aaᵀ)⁻¹ = G⁻¹ - G⁻¹a aᵀG⁻¹ / (1 + aᵀG⁻¹a)
+            inverse_a = self.inverse_ @ a
+            gain = inverse_a / (1.0 + a @ inverse_a)
+            self.weights_ += gain * (target - a @ self.weights_)
+            self.inverse_ -= np.outer(gain, inverse_a)
+            self._updates += 1
+            if self._updates >= self.refresh_every:
+                self.refresh()
+        self.n_samples_ += len(y)
+        return self
+
+    def refresh(self):
+        """Recompute the coefficients exactly from the sufficient statistics."""
+        self.inverse_ = np.linalg.inv(self.gram_)
+        self.weights_ = np.linalg.solve(self.gram_, self.moment_)
+        self._updates = 0
+
+    def predict(self, X):
+        """Predict with the current coefficients."""
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+
+def _observations(pipeline, data):
+    """Private helper function preparing labelled rows for the model.
+
+    Returns
+    -------
+    tuple
+        The standardised features and targets of the usable rows, along
+        with the positions of the rows which were skipped because a feature
+        or the target was missing or invalid.
+    """
+    X = pipeline.preprocess(data).to_numpy()
+    y = np.asarray(data[TARGET], dtype=np.float64) if TARGET in data else np.full(len(X), np.nan)
+    usable = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+    X = X[usable]
+    if pipeline.scaler_mean is not None:
+        X = (X - pipeline.scaler_mean) / pipeline.scaler_scale
+    return X, y[usable], np.flatnonzero(~usable)
+
+
+def start_online_model(pipeline, data):
+    """Fit an online model to the training data of a served pipeline.
+
+    Parameters
+    ----------
+    pipeline : FittedPipeline
+        The served pipeline, whose preprocessing constants and
+        standardisation are kept by the online model.
+    data : Pandas DataFrame
+        The labelled training data, e.g. `df_train.csv`.
+
+    Returns
+    -------
+    FittedPipeline
+        A pipeline holding an `OnlineLinearRegression`.
+
+    Raises
+    ------
+    ValueError
+        If the pipeline uses time-series features, which new observations
+        do not carry.
+    """
+    if pipeline.time_series_features:
+        raise ValueError('Online updates are not supported for pipelines with time-series features.')
+    online = FittedPipeline(OnlineLinearRegression(), columns=pipeline.columns,
+                            fill_values=pipeline.fill_values,
+                            categorical_encoders=pipeline.categorical_encoders,
+                            scaler_mean=pipeline.scaler_mean, scaler_scale=pipeline.scaler_scale)
+    X, y, _ = _observations(online, data)
+    online.estimator.fit(X, y)
+    return online
+
+
+def update_online_model(online, data):
+    """Update an online model with newly labelled rows.
+
+    Parameters
+    ----------
+    online : FittedPipeline
+        A pipeline returned by `start_online_model()`.
+    data : Pandas DataFrame
+        Feature records along with their actual `load_shortfall_3h`.
+
+    Returns
+    -------
+    tuple
+        The number of rows used, and the positions of those skipped.
+    """
+    X, y, skipped = _observations(online, data)
+    online.estimator.partial_fit(X, y)
+    return len(y), skipped
+
+
+def _write_atomically(path, artifact):
+    """Private helper function replacing a file in a single step, so that
+    readers see either the old or the new contents."""
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path))
+    try:
+        with os.fdopen(descriptor, 'wb') as temporary_file:
+            pickle.dump(artifact, temporary_file)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def save_online_model(online, path):
+    """Save the state of an online model, replacing any previous state."""
+    _write_atomically(path, online)
+
+
+def load_online_model(path):
+    """Load the state of an online model saved by `save_online_model()`."""
+    with open(path, 'rb') as state_file:
+        return pickle.load(state_file)
+
+
+def publish_online_model(online, path):
+    """Write the current coefficients of an online model for serving.
+
+    The artifact is a `FittedPipeline` holding a `LinearPredictor`, which
+    replaces any previous artifact atomically. An API watching `path`
+    therefore reloads it without ever reading a partial file.
+
+    Returns
+    -------
+    FittedPipeline
+        The published pipeline.
+    """
+    estimator = online.estimator
+    weights = np.ascontiguousarray(estimator.weights_)
+    published = FittedPipeline(LinearPredictor(weights[:-1].copy(), weights[-1]), columns=online.columns,
+                               fill_values=online.fill_values,
+                               categorical_encoders=online.categorical_encoders,
+                               scaler_mean=online.scaler_mean, scaler_scale=online.scaler_scale,
+                               model_version=hashlib.sha1(weights.tobytes()).hexdigest()[:12])
+    _write_atomically(path, published)
+    return published
@@ -0,0 +1,113 @@
+"""
+
+    Content-addressed cache of model predictions.
+
+    Description: This file contains a bounded cache of predictions, keyed by
+    a hash of the preprocessed feature vector and the version of the model
+    which scored it. Repeated requests for the same features skip
+    prediction entirely.
+
+"""
+
+# Cache Dependencies
+import collections
+import hashlib
+import threading
+import time
+
+
+class PredictionCache:
+    """A thread-safe LRU cache of predictions, with an optional TTL.
+
+    Entries belong to a single model version. Looking up or storing a
+    prediction for another version empties the cache, so that it is
+    invalidated automatically whenever a different model is loaded.
+
+    Parameters
+    ----------
+    max_entries : int
+        The largest number of predictions held. The least recently used
+        prediction is evicted to make room for a new one.
+    ttl_seconds : float, optional
+        How long a prediction may be served from the cache.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds or None
+        self.model_version = None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def key(features):
+        """The canonical hash of a preprocessed float64 feature vector."""
+        return hashlib.blake2b(features.tobytes(), digest_size=16).digest()
+
+    def _bind(self, model_version):
+        # Called with the lock held.
+        if model_version != self.model_version:
+            if self._entries:
+                self._invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key, model_version):
+        """Look up a prediction made by the given model version.
+
+        Returns
+        -------
+        list or None
+            The cached prediction, or None on a miss.
+        """
+        with self._lock:
+            self._bind(model_version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, model_version, prediction):
+        """Store a prediction made by the given model version."""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._bind(model_version)
+            self._entries[key] = (prediction, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """Remove every cached prediction."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters describing the use of the cache so far."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'model_version': self.model_version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,292 @@
+"""
+
+    Native predictors for serving trained models without sklearn.
+
+    Description: This file contains lightweight replacements for the
+    `predict()` method of trained sklearn models, along with the compact
+    artifact formats they are exported to. Loading these artifacts does not
+    import sklearn.
+
+"""
+
+# Predictor Dependencies
+import json
+import os
+import numpy as np
+
+# The versions of each native model artifact format.
+FORMAT_VERSIONS = {'linear': 1, 'forest': 1}
+
+_META_FILE = 'meta.json'
+
+
+class LinearPredictor:
+    """Computes `X @ coef + intercept` for an exported linear model.
+
+    Parameters
+    ----------
+    coef : Numpy ndarray
+        The model coefficients, shaped as the `coef_` of the sklearn model.
+    intercept : float or Numpy ndarray
+        The model intercept, shaped as the `intercept_` of the sklearn model.
+    """
+
+    def __init__(self, coef, intercept):
+        self.coef_ = coef
+        self.intercept_ = np.asarray(intercept, dtype=np.float64)
+        # Predictions are computed as a single matrix product.
+        self._weights = np.asarray(coef, dtype=np.float64).T
+
+    @property
+    def n_features_in_(self):
+        return self._weights.shape[0]
+
+    def predict(self, X, out=None):
+        """Predict with the linear model.
+
+        Parameters
+        ----------
+        X : Numpy ndarray
+            A float64 feature matrix.
+        out : Numpy ndarray, optional
+            A preallocated array in which to write the predictions.
+
+        Returns
+        -------
+        Numpy ndarray
+            The predictions, shaped as those of the sklearn model.
+        """
+        out = np.dot(X, self._weights, out=out)
+        out += self.intercept_
+        return out
+
+
+class ForestPredictor:
+    """Averages the trees of an exported tree ensemble over flat node arrays.
+
+    The nodes of every tree are stored in shared contiguous arrays, and all
+    trees are traversed for a batch of rows together, one level at a time.
+    Children which are leaves are referenced by their bitwise complement
+    (a negative index), so that (row, tree) pairs reaching a leaf are
+    dropped from the traversal of deeper levels without any further lookup.
+
+    Parameters
+    ----------
+    feature : Numpy ndarray
+        The int32 feature index tested at each node.
+    threshold : Numpy ndarray
+        The float32 threshold at each node. Rows go left when their feature
+        value is at most this threshold.
+    children : Numpy ndarray
+        The int32 indices of the left and right child of each node, shaped
+        (n_nodes, 2). Leaves are given as `~index`.
+    value : Numpy ndarray
+        The float32 predictions at each node, shaped (n_nodes, n_outputs).
+    roots : Numpy ndarray
+        The int32 index of the root node of each tree, given as `~index`
+        when the tree is a single leaf.
+    max_depth : int
+        The depth of the deepest tree.
+    """
+
+    # The number of (row, tree) pairs traversed together, bounding memory use.
+    _CHUNK_SIZE = 1 << 18
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self._flat_children = children.reshape(-1)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def predict(self, X):
+        """Predict with the tree ensemble.
+
+        Parameters
+        ----------
+        X : Numpy ndarray
+            A feature matrix. Features are compared as float32, as by sklearn.
+
+        Returns
+        -------
+        Numpy ndarray
+            The mean prediction of the trees, shaped as those of the sklearn
+            model.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        n_outputs = self.value.shape[1]
+        out = np.empty((n_rows, n_outputs))
+        chunk = max(1, self._CHUNK_SIZE // self.n_estimators)
+        for start in range(0, n_rows, chunk):
+            rows = X[start:start + chunk].reshape(-1)
+            n_chunk = len(rows) // n_features
+            # One entry per (tree, row) pair, holding its current node. Pairs
+            # are grouped by tree, so that neighbouring lookups share nodes.
+            nodes = np.repeat(self.roots, n_chunk)
+            offsets = np.tile(np.arange(0, len(rows), n_features, dtype=np.int32),
+                              self.n_estimators)
+            active = np.flatnonzero(nodes >= 0)
+            for _ in range(self.max_depth):
+                if not len(active):
+                    break
+                current = nodes[active]
+                go_right = rows[offsets[active] + self.feature[current]] > self.threshold[current]
+                current = self._flat_children[2 * current + go_right]
+                nodes[active] = current
+                # Only pairs which have not yet reached a leaf are traversed further.
+                active = active[current >= 0]
+            leaves = self.value[~nodes].reshape(self.n_estimators, n_chunk, n_outputs)
+            out[start:start + chunk] = leaves.mean(axis=0, dtype=np.float64)
+        return out[:, 0] if n_outputs == 1 else out
+
+
+def export_linear_model(pipeline, path):
+    """Write the linear model of a fitted pipeline in the native format.
+
+    The artifact is a directory holding the coefficients as a `.npy` file,
+    which may be memory-mapped, and a JSON header with everything else.
+    Standardisation is folded into the coefficients.
+
+    Parameters
+    ----------
+    pipeline : FittedPipeline
+        A fitted pipeline holding a linear sklearn model.
+    path : str
+        The directory to write the artifact to.
+    """
+    estimator = pipeline.estimator
+    coef = np.asarray(estimator.coef_, dtype=np.float64)
+    intercept = np.asarray(estimator.intercept_, dtype=np.float64)
+    if pipeline.scaler_mean is not None:
+        # (x - mean) / scale @ coef == x @ (coef / scale) - mean @ (coef / scale)
+        coef = coef / pipeline.scaler_scale
+        intercept = intercept - coef @ pipeline.scaler_mean
+
+    _write_artifact(path, 'linear', pipeline, {'intercept': intercept.tolist()},
+                    {'coef': np.ascontiguousarray(coef)})
+
+
+def export_forest_model(pipeline, path):
+    """Write the tree ensemble of a fitted pipeline in the native format.
+
+    The nodes of every tree are flattened into shared int32 and float32
+    arrays, each saved as a `.npy` file which may be memory-mapped.
+    Standardisation is folded into the thresholds.
+
+    Parameters
+    ----------
+    pipeline : FittedPipeline
+        A fitted pipeline holding a sklearn random forest, extra trees or
+        decision tree regressor.
+    path : str
+        The directory to write the artifact to.
+    """
+    estimator = pipeline.estimator
+    trees = [tree.tree_ for tree in getattr(estimator, 'estimators_', [estimator])]
+    sizes = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    feature, threshold, children, value = [], [], [], []
+    for root, tree in zip(roots, trees):
+        leaf = tree.children_left < 0
+        tree_feature = np.where(leaf, 0, tree.feature)
+        tree_threshold = np.where(leaf, 0.0, tree.threshold)
+        if pipeline.scaler_mean is not None:
+            # (x - mean) / scale <= t  is equivalent to  x <= t * scale + mean
+            tree_threshold = (tree_threshold * pipeline.scaler_scale[tree_feature]
+                              + pipeline.scaler_mean[tree_feature])
+        tree_children = np.stack([tree.children_left, tree.children_right], axis=1)
+        tree_children = np.where(leaf[:, None], 0, tree_children)
+        # Leaf children are referenced by the complement of their index.
+        tree_children = np.where(leaf[tree_children], ~(root + tree_children), root + tree_children)
+        tree_children[leaf] = -1
+        feature.append(tree_feature)
+        threshold.append(tree_threshold)
+        children.append(tree_children)
+        value.append(tree.value[:, :, 0])
+
+    # Round thresholds down to float32, so that comparing float32 features
+    # against them gives the same result as against the float64 thresholds.
+    threshold = np.concatenate(threshold)
+    threshold32 = threshold.astype(np.float32)
+    rounded_up = threshold32 > threshold
+    threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+
+    root_is_leaf = np.array([tree.node_count == 1 for tree in trees])
+    arrays = {
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': threshold32,
+        'children': np.concatenate(children).astype(np.int32),
+        'value': np.concatenate(value).astype(np.float32),
+        'roots': np.where(root_is_leaf, ~roots, roots).astype(np.int32),
+    }
+    _write_artifact(path, 'forest', pipeline, {'max_depth': max(tree.max_depth for tree in trees)},
+                    arrays)
+
+
+def _write_artifact(path, kind, pipeline, meta, arrays):
+    """Private helper function writing a native model artifact.
+
+    Each array is saved as its own `.npy` file, so that it may be
+    memory-mapped, alongside a JSON header holding everything else.
+    """
+    meta = dict(meta, **{
+        'format': kind,
+        'version': FORMAT_VERSIONS[kind],
+        'model_version': pipeline.model_version,
+        'columns': list(pipeline.columns),
+        'fill_values': None if pipeline.fill_values is None else
+        {column: float(value) for column, value in pipeline.fill_values.items()},
+        'categorical_encoders': {column: encoder.to_dict() for column, encoder
+                                 in pipeline.categorical_encoders.items()},
+        'time_series_features': [list(definition) for definition in pipeline.time_series_features],
+        'arrays': sorted(arrays),
+    })
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    with open(os.path.join(path, _META_FILE), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+
+def is_native_artifact(path):
+    """Whether `path` holds a native model artifact."""
+    return os.path.isfile(os.path.join(path, _META_FILE))
+
+
+def load_native_model(path, mmap=True):
+    """Load a native model artifact.
+
+    Parameters
+    ----------
+    path : str
+        The directory written by `export_linear_model()` or
+        `export_forest_model()`.
+    mmap : bool
+        Whether to memory-map the model arrays rather than reading them.
+
+    Returns
+    -------
+    tuple
+        The `LinearPredictor` or `ForestPredictor`, along with the
+        artifact's JSON header.
+    """
+    with open(os.path.join(path, _META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    kind = meta.get('format')
+    if kind not in FORMAT_VERSIONS or meta.get('version', 0) > FORMAT_VERSIONS[kind]:
+        raise ValueError(f"{path} holds an unsupported model artifact: "
+                         f"{kind} version {meta.get('version')}.")
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+              for name in meta['arrays']}
+    if kind == 'forest':
+        return ForestPredictor(max_depth=meta['max_depth'], **arrays), meta
+    intercept = np.asarray(meta['intercept'], dtype=np.float64)
+    return LinearPredictor(arrays['coef'], intercept), meta
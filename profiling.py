@@ -0,0 +1,180 @@
+"""
+
+    On-demand profiling of requests to our API.
+
+    Description: This file contains a WSGI middleware which runs selected
+    requests under cProfile, and writes each profile to a local directory
+    along with a description of the request. Requests are selected by an
+    admin token sent with the request, or by sampling one in every N
+    prediction requests. The middleware is only installed when profiling is
+    enabled, so that it adds nothing to requests otherwise.
+
+"""
+
+# Profiling Dependencies
+import cProfile
+import hmac
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+# The header and query parameter which may carry the admin token.
+TOKEN_HEADER = 'X-Profile-Token'
+TOKEN_PARAMETER = 'profile'
+
+# Only requests to these routes are profiled.
+_PROFILED_PREFIX = '/api_v0.1'
+
+# The orders in which a text report may list functions.
+SORT_KEYS = [key.value for key in pstats.SortKey]
+_PROFILE_ID = re.compile(r'^[0-9T]+-\d+-\d+$')
+
+
+def is_admin(token, supplied):
+    """Whether `supplied` matches the admin token, in constant time."""
+    return bool(token) and bool(supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+class ProfilingMiddleware:
+    """Profiles selected requests, writing each profile to a directory.
+
+    Only one request is profiled at a time. Requests selected while another
+    is being profiled are served without profiling. The response of a
+    profiled request is fully generated within the profiler, so streamed
+    responses are buffered.
+
+    Parameters
+    ----------
+    app : callable
+        The WSGI application to profile.
+    directory : str
+        Where profiles are written.
+    token : str, optional
+        The admin token which requests a profile when sent in the
+        `X-Profile-Token` header or `profile` query parameter.
+    sample_every : int, optional
+        Profile one in every this many prediction requests. 0 disables
+        sampling.
+    max_profiles : int
+        The number of profiles kept, after which the oldest are deleted.
+    """
+
+    def __init__(self, app, directory, token='', sample_every=0, max_profiles=100):
+        self.app = app
+        self.directory = directory
+        self.token = token
+        self.sample_every = sample_every
+        self.max_profiles = max_profiles
+        self._requests = itertools.count()
+        self._saved = itertools.count()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _trigger(self, environ):
+        if not environ.get('PATH_INFO', '').startswith(_PROFILED_PREFIX):
+            return None
+        if self.token:
+            supplied = environ.get('HTTP_' + TOKEN_HEADER.upper().replace('-', '_'))
+            if supplied is None and TOKEN_PARAMETER in environ.get('QUERY_STRING', ''):
+                supplied = parse_qs(environ['QUERY_STRING']).get(TOKEN_PARAMETER, [None])[0]
+            if is_admin(self.token, supplied):
+                return 'token'
+        if self.sample_every and next(self._requests) % self.sample_every == 0:
+            return 'sample'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None or not self._lock.acquire(blocking=False):
+            return self.app(environ, start_response)
+        try:
+            statuses = []
+
+            def capture_status(status, headers, exc_info=None):
+                statuses.append(status)
+                return start_response(status, headers, exc_info)
+
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.app(environ, capture_status)
+                try:
+                    body = list(response)
+                finally:
+                    if hasattr(response, 'close'):
+                        response.close()
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - started
+            self._save(profiler, environ, statuses[-1] if statuses else None, duration, trigger)
+            return body
+        finally:
+            self._lock.release()
+
+    def _save(self, profiler, environ, status, duration, trigger):
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(self._saved)}"
+        path = os.path.join(self.directory, profile_id)
+        profiler.dump_stats(path + '.pstats')
+        metadata = {
+            'id': profile_id,
+            'created': time.time(),
+            'trigger': trigger,
+            'pid': os.getpid(),
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'content_type': environ.get('CONTENT_TYPE'),
+            'content_length': int(environ.get('CONTENT_LENGTH') or 0),
+            'status': status,
+            'duration_ms': duration * 1000,
+        }
+        with open(path + '.json', 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=2)
+        for old in list_profiles(self.directory)[self.max_profiles:]:
+            for suffix in ('.json', '.pstats'):
+                try:
+                    os.remove(os.path.join(self.directory, old['id'] + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles(directory):
+    """The descriptions of the saved profiles, newest first."""
+    profiles = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as metadata_file:
+                    profiles.append(json.load(metadata_file))
+            except (OSError, ValueError):
+                continue
+    return sorted(profiles, key=lambda profile: profile['created'], reverse=True)
+
+
+def profile_path(directory, profile_id):
+    """The path of a saved pstats profile, or None if there is no such profile."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(directory, profile_id + '.pstats')
+    return path if os.path.isfile(path) else None
+
+
+def profile_report(path, sort='cumulative', limit=50):
+    """A text summary of a saved profile, listing its costliest functions.
+
+    Raises
+    ------
+    ValueError
+        If `sort` is not one of `SORT_KEYS`.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key {sort!r}, expected one of: {', '.join(SORT_KEYS)}")
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats(sort).print_stats(limit)
+    return output.getvalue()
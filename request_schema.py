@@ -0,0 +1,352 @@
+"""
+
+    Schema-validating decoder for single-record prediction requests.
+
+    Description: This file contains the schema of the feature records sent
+    to our API, which is derived from the columns of the training data. At
+    startup the schema is compiled against the served model into a decoder,
+    which validates a request payload and writes its values straight into
+    the model's feature row in a single pass. Invalid payloads are reported
+    field by field, rather than failing deep within preprocessing.
+
+"""
+
+# Schema Dependencies
+import json
+import math
+import re
+import threading
+from datetime import datetime
+import numpy as np
+from features import CALENDAR_FIELDS
+
+try:
+    # orjson parses payloads several times faster than the standard library.
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# The version of the request schema file format.
+SCHEMA_VERSION = 1
+
+# The kinds of values a field may hold.
+FIELD_KINDS = ('number', 'string', 'time')
+
+_MISSING = object()
+_CODE_PATTERN = re.compile(r'\d+')
+
+
+class RequestError(ValueError):
+    """Raised when a request payload cannot be decoded into features.
+
+    Parameters
+    ----------
+    message : str
+        A description of the problem.
+    status : int
+        The HTTP status code with which to answer the request.
+    fields : list, optional
+        A `{'field', 'error'}` mapping for each invalid field.
+    """
+
+    def __init__(self, message, status=400, fields=None):
+        super().__init__(message)
+        self.status = status
+        self.fields = fields or []
+
+    def to_dict(self):
+        """The error as the body of an API response."""
+        output = {'error': str(self)}
+        if self.fields:
+            output['fields'] = self.fields
+        return output
+
+
+def loads(payload):
+    """Parse a JSON payload, unwrapping a JSON-encoded string if needed.
+
+    Parameters
+    ----------
+    payload : str or bytes
+        The body of a request. This is either a JSON value, or a JSON string
+        holding one, as sent by `utils/request.py`.
+
+    Returns
+    -------
+    object
+        The parsed JSON value.
+
+    Raises
+    ------
+    RequestError
+        If the payload is not valid JSON.
+    """
+    try:
+        data = _loads(payload)
+        if isinstance(data, str):
+            data = _loads(data)
+    except ValueError as error:
+        raise RequestError(f'Invalid JSON: {error}') from None
+    return data
+
+
+class RequestSchema:
+    """The fields of a feature record, and the kind of value each holds.
+
+    Parameters
+    ----------
+    fields : dict
+        Maps each field name to one of `FIELD_KINDS`.
+    nullable : list, optional
+        The fields which may be null, e.g. as they were missing in training.
+    """
+
+    def __init__(self, fields, nullable=None):
+        unknown = set(fields.values()).difference(FIELD_KINDS)
+        if unknown:
+            raise ValueError(f'Unknown field kinds: {sorted(unknown)}')
+        self.fields = dict(fields)
+        self.nullable = set(nullable or [])
+
+    @classmethod
+    def from_training_data(cls, data, target='load_shortfall_3h'):
+        """Derive the schema from the columns of the training data.
+
+        Parameters
+        ----------
+        data : Pandas DataFrame
+            The training data, e.g. as read from `df_train.csv`.
+        target : str
+            The column holding the response variable, which is excluded.
+
+        Returns
+        -------
+        RequestSchema
+            Numeric columns are numbers, the `time` column a timestamp, and
+            all other columns strings. Columns holding missing values in
+            training are nullable.
+        """
+        import pandas as pd
+        fields = {}
+        for column, dtype in data.dtypes.items():
+            if column == target or column.startswith('Unnamed:'):
+                continue
+            if column == 'time':
+                fields[column] = 'time'
+            elif pd.api.types.is_numeric_dtype(dtype):
+                fields[column] = 'number'
+            else:
+                fields[column] = 'string'
+        nullable = [column for column in fields if data[column].isna().any()]
+        return cls(fields, nullable)
+
+    def to_dict(self):
+        """The schema as plain python values, e.g. for JSON."""
+        return {'version': SCHEMA_VERSION, 'fields': self.fields, 'nullable': sorted(self.nullable)}
+
+    @classmethod
+    def from_dict(cls, schema):
+        """Rebuild a schema from the values given by `to_dict()`."""
+        if schema.get('version', 0) > SCHEMA_VERSION:
+            raise ValueError(f"Request schema version {schema['version']} is not supported.")
+        return cls(schema['fields'], schema.get('nullable'))
+
+    def save(self, path):
+        """Write the schema to a JSON file."""
+        with open(path, 'w') as schema_file:
+            json.dump(self.to_dict(), schema_file, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read a schema written by `save()`."""
+        with open(path) as schema_file:
+            return cls.from_dict(json.load(schema_file))
+
+    def compile(self, pipeline):
+        """Compile the schema into a decoder for the given model.
+
+        Parameters
+        ----------
+        pipeline : FittedPipeline
+            The model which will score the decoded records.
+
+        Returns
+        -------
+        RecordDecoder
+            A decoder filling the model's feature rows.
+        """
+        return RecordDecoder(self, pipeline.columns, pipeline.categorical_encoders,
+                             pipeline.fill_values,
+                             [definition.name for definition in pipeline.time_series_features],
+                             pipeline.feature_store)
+
+
+class RecordDecoder:
+    """Validates single feature records while filling a model feature row.
+
+    Each thread fills its own preallocated row, which is overwritten by the
+    next record decoded on that thread.
+
+    Parameters
+    ----------
+    schema : RequestSchema
+        The fields a feature record may hold.
+    columns : list
+        The features used by our model, in the order in which it was trained.
+    encoders : dict, optional
+        Fitted `CategoricalEncoder` objects for the categorical features.
+    fill_values : dict, optional
+        Constants fitted in training with which to replace missing values.
+    time_series : list, optional
+        The names of the model's time-series features, which are not sent
+        in records but looked up for the period of their `time`.
+    feature_store : FeatureStore, optional
+        Serves the time-series features. Those it does not know, or all of
+        them when omitted, are replaced by their fill values.
+
+    Raises
+    ------
+    ValueError
+        If the schema does not provide every feature of the model.
+    """
+
+    def __init__(self, schema, columns, encoders=None, fill_values=None, time_series=None,
+                 feature_store=None):
+        encoders = encoders or {}
+        fill_values = fill_values or {}
+        time_series = time_series or []
+        self.schema = schema
+        self.columns = list(columns)
+        self.feature_store = feature_store
+        self._fields = []
+        self._calendar = []
+        self._series = []
+        absent = []
+        for index, column in enumerate(self.columns):
+            if column in CALENDAR_FIELDS and column not in schema.fields:
+                self._calendar.append((index, column))
+                continue
+            if column in time_series:
+                if column not in fill_values:
+                    absent.append(column)
+                self._series.append((index, column, fill_values.get(column)))
+                continue
+            kind = schema.fields.get(column)
+            if kind is None:
+                absent.append(column)
+                continue
+            fill = fill_values.get(column) if column in schema.nullable else None
+            self._fields.append((index, column, kind, fill, encoders.get(column)))
+        if (self._calendar or self._series) and schema.fields.get('time') != 'time':
+            absent.append('time')
+        if absent:
+            raise ValueError('The request schema does not provide the model features: '
+                             + ', '.join(absent))
+        self._local = threading.local()
+
+    def _row(self):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(self.columns)))
+        return row
+
+    def decode(self, payload):
+        """Decode a request payload into a feature row.
+
+        Parameters
+        ----------
+        payload : str, bytes or dict
+            The body of a request, or an already parsed feature record.
+
+        Returns
+        -------
+        Numpy ndarray
+            A (1, n_features) row ready for prediction.
+
+        Raises
+        ------
+        RequestError
+            With status 400 if the payload is not a JSON object, or 422 if
+            any of its fields are missing or invalid.
+        """
+        record = payload if isinstance(payload, dict) else loads(payload)
+        if not isinstance(record, dict):
+            raise RequestError('Expected a JSON object holding a feature record.')
+        row = self._row()
+        values = row[0]
+        errors = []
+        for index, column, kind, fill, encoder in self._fields:
+            value = record.get(column, _MISSING)
+            if value is _MISSING or value is None:
+                if fill is None:
+                    errors.append({'field': column, 'error': 'This field is required.'
+                                   if value is _MISSING else 'This field may not be null.'})
+                else:
+                    values[index] = fill
+            elif kind == 'number':
+                if type(value) not in (int, float) or not math.isfinite(value):
+                    errors.append({'field': column, 'error': f'Expected a number, got {value!r}.'})
+                else:
+                    values[index] = value
+            elif not isinstance(value, str):
+                errors.append({'field': column, 'error': f'Expected a string, got {value!r}.'})
+            else:
+                if encoder is not None:
+                    values[index] = encoder.encode(value)
+                else:
+                    # Without a fitted encoder, codes map to the number they hold.
+                    match = _CODE_PATTERN.search(value)
+                    values[index] = float(match.group()) if match else np.nan
+                if math.isnan(values[index]):
+                    errors.append({'field': column, 'error': f'Unknown code {value!r}.'})
+        if self._calendar or self._series:
+            time = self._parse_time(record.get('time', _MISSING), errors)
+            if time is not None:
+                for index, column in self._calendar:
+                    values[index] = _calendar_value(time, column)
+                if self._series:
+                    self._fill_series(time, values)
+        if errors:
+            raise RequestError('The feature record is invalid.', status=422, fields=errors)
+        return row
+
+    def _fill_series(self, time, values):
+        series = [math.nan] * len(self._series) if self.feature_store is None else \
+            self.feature_store.lookup_record(time, [column for _, column, _ in self._series])
+        for (index, _, fill), value in zip(self._series, series):
+            values[index] = fill if math.isnan(value) else value
+
+    @staticmethod
+    def _parse_time(value, errors):
+        if value is _MISSING or value is None:
+            errors.append({'field': 'time', 'error': 'This field is required.'})
+            return None
+        try:
+            time = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            time = None
+        if time is None or time.tzinfo is not None:
+            errors.append({'field': 'time', 'error': "Expected a timestamp such as "
+                                                     f"'2018-01-01 03:00:00', got {value!r}."})
+            return None
+        return time
+
+
+def _calendar_value(time, field):
+    """Private helper function giving a calendar feature of a timestamp."""
+    if field == 'Year':
+        return time.year
+    if field == 'Month_of_year':
+        return time.month
+    if field == 'Week_of_year':
+        return time.isocalendar()[1]
+    if field == 'Day_of_year':
+        return time.timetuple().tm_yday
+    if field == 'Day_of_month':
+        return time.day
+    if field == 'Day_of_week':
+        return time.weekday()
+    if field == 'Hour_of_week':
+        return time.weekday() * 24 + time.hour
+    return time.hour
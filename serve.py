@@ -0,0 +1,94 @@
+"""
+
+    Production server for our API.
+
+    Description: This file launches our API behind the gunicorn WSGI server.
+    Our model is loaded once within the master process, which then forks
+    the worker processes. The workers share the model's memory pages
+    copy-on-write, rather than each loading their own copy.
+
+    Usage: python serve.py
+
+    The number of workers, threads per worker, keep-alive and bind address
+    are set within `config.py`.
+
+"""
+
+# Server Dependencies
+import gc
+import os
+import config
+from gunicorn.app.base import BaseApplication
+from monitoring import process_memory
+
+
+def _megabytes(size):
+    return f'{size / 2**20:.1f} MiB'
+
+
+def post_worker_init(worker):
+    """Report the memory used by each worker once it is ready."""
+    memory = process_memory()
+    if 'private' in memory:
+        worker.log.info(f"Worker {os.getpid()} memory: rss {_megabytes(memory['rss'])}, "
+                        f"shared {_megabytes(memory['shared'])}, "
+                        f"private {_megabytes(memory['private'])} (cost of this extra worker)")
+
+
+def when_ready(server):
+    """Report the memory used by the master process, holding our model."""
+    memory = process_memory()
+    if 'rss' in memory:
+        server.log.info(f"Master {os.getpid()} memory: rss {_megabytes(memory['rss'])}")
+
+
+class ProductionServer(BaseApplication):
+    """gunicorn application serving our API from preloaded, shared memory.
+
+    Parameters
+    ----------
+    options : dict
+        gunicorn settings.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        # Avoid collections while loading, then move every object loaded so
+        # far into the permanent generation. The collector then never writes
+        # to their pages, which therefore stay shared with the workers. It
+        # is enabled again straight away, in the master and so in every
+        # worker forked from it, as frozen objects are never collected.
+        gc.disable()
+        try:
+            from api import app
+            gc.collect()
+            gc.freeze()
+        finally:
+            gc.enable()
+        return app
+
+
+def server_options():
+    """The gunicorn settings for our API, taken from `config.py`."""
+    return {
+        'bind': config.SERVER_BIND,
+        'workers': config.SERVER_WORKERS,
+        'threads': config.SERVER_THREADS,
+        'keepalive': config.SERVER_KEEPALIVE_SECONDS,
+        'timeout': config.SERVER_TIMEOUT_SECONDS,
+        'worker_class': 'gthread' if config.SERVER_THREADS > 1 else 'sync',
+        'preload_app': True,
+        'post_worker_init': post_worker_init,
+        'when_ready': when_ready,
+    }
+
+
+if __name__ == '__main__':
+    ProductionServer(server_options()).run()
@@ -0,0 +1,45 @@
+"""
+
+    Shared fixtures for the tests of our API.
+
+    Description: The tests import the modules at the root of this repo, and
+    serve the trained model artifacts found within `assets/`, whose paths
+    are relative to the root. They are therefore run from the root, e.g.
+    with `python -m pytest`.
+
+"""
+
+# Test Dependencies
+import json
+import os
+import sys
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+MODEL_PATH = os.path.join(ROOT, 'assets', 'trained-models', 'load_shortfall_simple_lm_regression.pkl')
+TEST_DATA_PATH = os.path.join(ROOT, 'utils', 'data', 'df_test.csv')
+
+
+@pytest.fixture(scope='session')
+def pipeline():
+    """The trained demonstration pipeline."""
+    from model import load_model
+    return load_model(MODEL_PATH)
+
+
+@pytest.fixture(scope='session')
+def records():
+    """The first rows of the test set, as JSON feature records."""
+    import pandas as pd
+    test = pd.read_csv(TEST_DATA_PATH).drop(columns=['Unnamed: 0'])
+    return json.loads(test.iloc[:8].to_json(orient='records'))
+
+
+@pytest.fixture(scope='session')
+def client():
+    """A client of our API, serving the default model."""
+    os.chdir(ROOT)
+    import api
+    return api.app.test_client()
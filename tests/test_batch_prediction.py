@@ -0,0 +1,70 @@
+"""
+
+    Tests of batch prediction.
+
+"""
+
+# Test Dependencies
+import json
+import numpy as np
+import pytest
+from model import make_batch_prediction, make_prediction
+from request_schema import RequestError
+
+
+def test_batch_matches_single_predictions(pipeline, records):
+    output = make_batch_prediction(records, pipeline)
+    assert output['errors'] == []
+    singles = [make_prediction(dict(record), pipeline)[0] for record in records]
+    np.testing.assert_allclose(output['predictions'], singles)
+
+
+def test_columnar_payload_matches_records(pipeline, records):
+    columns = {name: [record[name] for record in records] for name in records[0]}
+    assert make_batch_prediction(columns, pipeline) == make_batch_prediction(records, pipeline)
+
+
+def test_invalid_rows_are_reported_individually(pipeline, records):
+    records = [dict(record) for record in records[:3]]
+    records[1]['Seville_pressure'] = 'sp99'
+    output = make_batch_prediction(records, pipeline)
+    assert output['predictions'][1] is None
+    assert output['predictions'][0] is not None and output['predictions'][2] is not None
+    assert output['errors'] == [{'row': 1, 'error': "Unknown Seville_pressure code 'sp99'"}]
+
+
+@pytest.mark.parametrize('payload', [[{}, {}], [{}, {'time': '2018-01-01 00:00:00'}], [{'Seville_pressure': 'sp1'}, {}]])
+def test_every_row_gets_a_prediction_or_an_error(pipeline, records, payload):
+    payload = payload + [dict(records[0])]
+    output = make_batch_prediction(payload, pipeline)
+    assert len(output['predictions']) == len(payload)
+    failed = [error['row'] for error in output['errors']]
+    assert failed == [row for row, prediction in enumerate(output['predictions']) if prediction is None]
+    assert failed == list(range(len(payload) - 1))
+
+
+def test_batch_route_answers_empty_records_row_by_row(client):
+    response = client.post('/api_v0.1/batch', data='[{}, {}]')
+    assert response.status_code == 200
+    assert response.get_json()['predictions'] == [None, None]
+    assert [error['row'] for error in response.get_json()['errors']] == [0, 1]
+
+
+@pytest.mark.parametrize('payload', [[1, 2], [{'time': '2018-01-01 00:00:00'}, 3],
+                                     {'a': [1, 2], 'b': [1]}])
+def test_malformed_payloads_are_rejected(pipeline, payload):
+    with pytest.raises(RequestError):
+        make_batch_prediction(payload, pipeline)
+
+
+@pytest.mark.parametrize('body', ['[1,2]', '{"a":[1,2],"b":[1]}', '3'])
+def test_batch_route_answers_malformed_bodies_with_400(client, body):
+    response = client.post('/api_v0.1/batch', data=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_batch_route(client, records):
+    response = client.post('/api_v0.1/batch', data=json.dumps(records))
+    assert response.status_code == 200
+    assert len(response.get_json()['predictions']) == len(records)
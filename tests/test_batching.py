@@ -0,0 +1,68 @@
+"""
+
+    Tests of the micro-batching of single-record requests.
+
+"""
+
+# Test Dependencies
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from batching import MicroBatcher
+from model import make_prediction
+
+
+def test_batched_predictions_match_single_predictions(pipeline, records):
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=50)
+    with ThreadPoolExecutor(len(records)) as pool:
+        batched = list(pool.map(lambda record: make_prediction(dict(record), pipeline, batcher=batcher),
+                                records))
+    singles = [make_prediction(dict(record), pipeline) for record in records]
+    np.testing.assert_allclose(batched, singles)
+    stats = batcher.stats()
+    assert stats['records'] == len(records)
+    assert stats['batches'] < len(records)
+
+
+def test_rows_are_not_modified(pipeline, records):
+    batcher = MicroBatcher()
+    row = pipeline.preprocess_record(dict(records[0]))[0]
+    before = row.copy()
+    np.testing.assert_allclose(batcher.predict(pipeline, row, timeout=5),
+                               np.ravel(pipeline.predict(before[np.newaxis])))
+    np.testing.assert_array_equal(row, before)
+
+
+def test_errors_are_raised_to_every_request(pipeline, records):
+    batcher = MicroBatcher(max_batch_size=2, max_wait_ms=50)
+    good = batcher.submit(pipeline, pipeline.preprocess_record(dict(records[0]))[0])
+    bad = batcher.submit(pipeline, np.zeros(3))
+    with pytest.raises(ValueError):
+        bad.result(5)
+    with pytest.raises(ValueError):
+        good.result(5)
+
+
+def test_forked_children_start_their_own_scheduler(pipeline, records):
+    batcher = MicroBatcher(max_wait_ms=1)
+    row = pipeline.preprocess_record(dict(records[0]))[0]
+    expected = batcher.predict(pipeline, row, timeout=5)
+    pid = os.fork()
+    if pid == 0:
+        # Exit the child without running pytest's cleanup.
+        try:
+            code = 0 if batcher.predict(pipeline, row, timeout=5) == expected else 1
+        except BaseException:
+            code = 2
+        os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_warm_up_requests_are_not_batched(client, monkeypatch):
+    import api
+    import config
+    monkeypatch.setattr(config, 'MICRO_BATCHING', True)
+    monkeypatch.setattr(api, 'warming_up', True)
+    assert api._batcher(config.MODEL_NAME) is None
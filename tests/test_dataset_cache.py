@@ -0,0 +1,79 @@
+"""
+
+    Tests of the memory-mapped columnar cache of our datasets.
+
+"""
+
+# Test Dependencies
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import TEST_DATA_PATH
+from dataset_cache import build_cache, read_dataset, read_schema, source_hash
+
+COLUMNS = ['time', 'Seville_pressure', 'Madrid_wind_speed', 'Valencia_pressure']
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """A small copy of the test set, so that each test builds its own cache."""
+    path = tmp_path / 'df_test.csv'
+    pd.read_csv(TEST_DATA_PATH).head(50).to_csv(path, index=False)
+    return str(path)
+
+
+def test_cache_matches_read_csv(dataset):
+    expected = pd.read_csv(dataset)
+    cached = read_dataset(dataset)
+    assert list(cached.columns) == list(expected.columns) and len(cached) == len(expected)
+    np.testing.assert_array_equal(cached['time'].to_numpy(),
+                                  pd.to_datetime(expected['time']).to_numpy(dtype='datetime64[s]'))
+    for column in ['Seville_pressure', 'Valencia_wind_deg']:
+        assert cached[column].astype(str).tolist() == expected[column].astype(str).tolist()
+    for column in ['Madrid_wind_speed', 'Valencia_pressure', 'Bilbao_rain_1h']:
+        np.testing.assert_array_equal(cached[column].to_numpy(), expected[column].to_numpy())
+
+
+def test_cache_is_built_once(dataset):
+    cache_path = build_cache(dataset)
+    schema_path = os.path.join(cache_path, 'schema.json')
+    with open(schema_path) as schema_file:
+        schema = json.load(schema_file)
+    assert schema['source_hash'] == source_hash(dataset) and schema['rows'] == 50
+    built = os.path.getmtime(schema_path)
+    assert read_schema(dataset)[0] == cache_path
+    read_dataset(dataset)
+    assert os.path.getmtime(schema_path) == built
+
+
+def test_columns_are_projected(dataset, monkeypatch):
+    _, schema = read_schema(dataset)
+    loaded = []
+
+    def load(file, **kwargs):
+        loaded.append(os.path.basename(file))
+        assert kwargs == {'mmap_mode': 'r'}
+        return np.lib.format.open_memmap(file, mode='r')
+    monkeypatch.setattr(np, 'load', load)
+    cached = read_dataset(dataset, columns=list(reversed(COLUMNS)))
+    assert list(cached.columns) == list(reversed(COLUMNS))
+    files = {entry['name']: entry['file'] for entry in schema['columns']}
+    assert loaded == [files[column] for column in reversed(COLUMNS)]
+    with pytest.raises(KeyError, match='no_such_column'):
+        read_dataset(dataset, columns=['time', 'no_such_column'])
+
+
+def test_cache_is_rebuilt_when_the_source_changes(dataset):
+    old_cache = build_cache(dataset)
+    data = pd.read_csv(dataset)
+    data.loc[0, 'Madrid_wind_speed'] = 123.25
+    data.to_csv(dataset, index=False)
+    cached = read_dataset(dataset, columns=['Madrid_wind_speed'])
+    assert cached['Madrid_wind_speed'].iloc[0] == 123.25
+    new_cache, schema = read_schema(dataset)
+    assert new_cache != old_cache and schema['source_hash'] == source_hash(dataset)
+    # The cache of the previous version is removed.
+    assert not os.path.exists(old_cache)
+    assert sorted(os.listdir(os.path.dirname(new_cache))) == [os.path.basename(new_cache)]
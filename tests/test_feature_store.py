@@ -0,0 +1,49 @@
+"""
+
+    Tests of the feature store serving time-series features.
+
+"""
+
+# Test Dependencies
+import json
+import numpy as np
+import pandas as pd
+from feature_store import FeatureStore, TimeSeriesFeature, time_series_features
+
+DEFINITIONS = [TimeSeriesFeature('load_shortfall_3h', 'lag', 1),
+               TimeSeriesFeature('load_shortfall_3h', 'mean', 3)]
+
+
+def _frame(times, values):
+    return pd.DataFrame({'time': times, 'load_shortfall_3h': values})
+
+
+def test_store_matches_offline_features():
+    times = pd.date_range('2018-01-01', periods=12, freq='3h').strftime('%Y-%m-%d %H:%M:%S')
+    values = np.arange(12, dtype=float) ** 2
+    values[4] = np.nan
+    data = _frame(times, values)
+    offline = time_series_features(data, DEFINITIONS).to_numpy()
+    for row in range(len(data)):
+        store = FeatureStore(DEFINITIONS)
+        store.ingest(data.iloc[:row])
+        np.testing.assert_allclose(store.lookup(data['time'].iloc[[row]]), offline[[row]])
+
+
+def test_stale_backfill_does_not_overwrite_newer_values():
+    store = FeatureStore(DEFINITIONS)
+    assert store.ingest(_frame(['2018-01-02 00:00:00'], [10.0])) == 1
+    # Exactly `capacity` periods earlier, so held in the same slot.
+    stale = pd.Timestamp('2018-01-02') - pd.Timedelta(hours=3 * store.capacity)
+    assert store.ingest(_frame([str(stale)], [99.0])) == 0
+    assert store.lookup(['2018-01-02 03:00:00'])[0].tolist() == [10.0, 10.0]
+
+
+def test_observations_without_time_are_rejected(client, monkeypatch):
+    import config
+    monkeypatch.setattr(config, 'ADMIN_TOKEN', 'secret')
+    response = client.post('/admin/observations', headers={'X-Admin-Token': 'secret'},
+                           data=json.dumps([{'time': '2018-01-01 00:00:00', 'load_shortfall_3h': 1.0},
+                                            {'load_shortfall_3h': 2.0}]))
+    assert response.status_code == 400
+    assert response.get_json()['fields'] == [{'field': 'time', 'error': 'This field is required.'}]
@@ -0,0 +1,64 @@
+"""
+
+    Tests of calendar feature extraction and categorical encoding.
+
+"""
+
+# Test Dependencies
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from features import CALENDAR_FIELDS, CategoricalEncoder, epoch_hours, extract_calendar_features
+
+
+def test_calendar_features_match_pandas():
+    times = pd.Series(pd.date_range('2015-12-25', '2017-01-05', freq='7h'))
+    features, valid = extract_calendar_features(times.dt.strftime('%Y-%m-%d %H:%M:%S'))
+    assert valid.all()
+    expected = {
+        'Year': times.dt.year, 'Month_of_year': times.dt.month,
+        'Week_of_year': times.dt.isocalendar().week, 'Day_of_year': times.dt.dayofyear,
+        'Day_of_month': times.dt.day, 'Day_of_week': times.dt.dayofweek,
+        'Hour_of_week': times.dt.dayofweek * 24 + times.dt.hour, 'Hour_of_day': times.dt.hour,
+    }
+    for field in CALENDAR_FIELDS:
+        np.testing.assert_array_equal(features[field], expected[field].to_numpy(dtype=np.int64))
+
+
+def test_datetime64_values_match_strings():
+    times = np.array(['2018-01-01T03:00:00', '2016-02-29T21:00:00'], dtype='datetime64[s]')
+    from_datetimes, _ = extract_calendar_features(times)
+    from_strings, _ = extract_calendar_features(['2018-01-01 03:00:00', '2016-02-29 21:00:00'])
+    for field in CALENDAR_FIELDS:
+        np.testing.assert_array_equal(from_datetimes[field], from_strings[field])
+
+
+def test_other_formats_fall_back_without_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        features, valid = extract_calendar_features(
+            ['2018-01-01T06:30:00', '1 Jan 2018 09:00', 'bad', None], ['Hour_of_day'])
+    np.testing.assert_array_equal(valid, [True, True, False, False])
+    np.testing.assert_array_equal(features['Hour_of_day'], [6, 9, 0, 0])
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        extract_calendar_features(['2018-01-01 00:00:00'], ['Minute'])
+
+
+def test_epoch_hours():
+    hours, valid = epoch_hours(['1970-01-01 05:00:00', '2018-01-01 03:00:00', 'bad'])
+    np.testing.assert_array_equal(hours, [5, 420771, 0])
+    np.testing.assert_array_equal(valid, [True, True, False])
+
+
+def test_categorical_encoder_round_trip():
+    encoder = CategoricalEncoder('Seville_pressure').fit(['sp25', 'sp1', None, 'sp25'])
+    restored = CategoricalEncoder.from_dict('Seville_pressure', encoder.to_dict())
+    assert restored.encode('sp25') == 25.0
+    assert np.isnan(restored.encode('sp99'))
+    values, unknown = restored.transform(['sp1', 'sp99', None])
+    np.testing.assert_array_equal(values, [1.0, np.nan, np.nan])
+    np.testing.assert_array_equal(unknown, [False, True, False])
@@ -0,0 +1,72 @@
+"""
+
+    Tests of the time-range forecast endpoint.
+
+"""
+
+# Test Dependencies
+import json
+import numpy as np
+import pytest
+from model import make_forecast, make_prediction
+
+START, END = '2018-01-01 00:00:00', '2018-01-01 21:00:00'
+
+
+def _errors(output):
+    return {error['time']: error['error'] for error in output['errors']}
+
+
+def test_forecast_matches_single_predictions(pipeline, records):
+    output = make_forecast(START, END, records, pipeline)
+    assert output['start'] == START and output['errors'] == []
+    singles = [make_prediction(dict(record), pipeline)[0] for record in records]
+    np.testing.assert_allclose(output['predictions'], singles)
+
+
+def test_columnar_weather_matches_records(pipeline, records):
+    columns = {name: [record[name] for record in records] for name in records[0]}
+    assert make_forecast(START, END, columns, pipeline) == make_forecast(START, END, records, pipeline)
+
+
+def test_slots_without_recent_weather_fail(pipeline, records):
+    weather = records[:2] + records[4:]
+    output = make_forecast('2017-12-31 21:00:00', END, weather, pipeline)
+    errors = _errors(output)
+    assert errors['2017-12-31 21:00:00'] == 'There is no weather forecast at or before this time.'
+    # The 03:00 forecast is three hours old at 06:00, and six hours old at 09:00.
+    assert output['predictions'][3] is not None
+    assert errors['2018-01-01 09:00:00'] == \
+        'The latest weather forecast is 6 hours old, more than the limit of 3 hours.'
+    assert output['predictions'][4] is None
+    relaxed = make_forecast(START, END, weather, pipeline, max_weather_age_hours=None)
+    assert relaxed['errors'] == []
+
+
+@pytest.mark.parametrize('change, error', [
+    ({'Seville_pressure': 'lvl5'}, "Unknown Seville_pressure code 'lvl5'"),
+    ({'Madrid_wind_speed': [1, 2]}, 'Invalid value for Madrid_wind_speed: [1, 2]'),
+    ({'Madrid_humidity': 'abc', 'Bilbao_rain_1h': None},
+     "Invalid value for Madrid_humidity: 'abc'. Missing or invalid values for: Bilbao_rain_1h"),
+])
+def test_invalid_weather_values_are_reported_by_field(pipeline, records, change, error):
+    weather = [dict(record) for record in records]
+    weather[1].update(change)
+    output = make_forecast(START, END, weather, pipeline)
+    assert output['predictions'][1] is None
+    assert _errors(output) == {'2018-01-01 03:00:00': error}
+
+
+def test_list_values_in_every_row_are_reported(pipeline, records):
+    weather = [dict(record, Madrid_wind_speed=[1, 2]) for record in records]
+    output = make_forecast(START, END, weather, pipeline)
+    assert output['predictions'] == [None] * len(records)
+    assert set(_errors(output).values()) == {'Invalid value for Madrid_wind_speed: [1, 2]'}
+
+
+def test_forecast_route(client, records):
+    response = client.post('/api_v0.1/forecast', data=json.dumps({'start': START, 'end': END, 'weather': records}))
+    assert response.status_code == 200
+    assert len(response.get_json()['predictions']) == len(records)
+    response = client.post('/api_v0.1/forecast', data=json.dumps({'start': 'bad', 'end': END, 'weather': records}))
+    assert response.status_code == 422
@@ -0,0 +1,23 @@
+"""
+
+    Tests of the liveness and readiness checks.
+
+"""
+
+def test_not_ready_before_warm_up(client, monkeypatch):
+    import api
+    monkeypatch.setattr(api, 'ready', False)
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'starting'}
+    assert client.get('/live').get_json() == {'status': 'live'}
+
+
+def test_ready_after_warm_up(client):
+    response = client.get('/ready')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ready'
+    assert {'imports', 'model_load', 'model_warm_up', 'route_warm_up', 'total'} <= set(body['startup_seconds'])
+    assert client.get('/live').status_code == 200
+
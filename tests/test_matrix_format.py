@@ -0,0 +1,86 @@
+"""
+
+    Tests of the binary feature matrix format and the routes accepting it.
+
+"""
+
+# Test Dependencies
+import json
+import struct
+import numpy as np
+import pytest
+from matrix_format import MAGIC, MEDIA_TYPE, decode_matrix, encode_matrix
+from model import make_batch_prediction, make_matrix_prediction
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_round_trip(dtype):
+    matrix = np.arange(12, dtype=dtype).reshape(4, 3) / 7
+    payload = encode_matrix(['a', 'b', 'c'], matrix, model_version='v1')
+    header, decoded = decode_matrix(payload)
+    assert header['columns'] == ['a', 'b', 'c'] and header['model_version'] == 'v1'
+    assert decoded.dtype == dtype and not decoded.flags.writeable
+    np.testing.assert_array_equal(decoded, matrix)
+    # The values start at an aligned offset, so that they are read in place.
+    assert (len(payload) - matrix.nbytes) % 8 == 0
+
+
+def test_empty_matrix_round_trip():
+    header, decoded = decode_matrix(encode_matrix(['a'], np.empty((0, 1))))
+    assert decoded.shape == (0, 1)
+
+
+def test_encode_rejects_a_column_mismatch():
+    with pytest.raises(ValueError):
+        encode_matrix(['a', 'b'], np.zeros((2, 3)))
+
+
+def _payload(header, values=b''):
+    text = json.dumps(header).encode()
+    return struct.pack('<4sI', MAGIC, len(text)) + text + values
+
+
+@pytest.mark.parametrize('payload, message', [
+    (b'LS', 'too short'),
+    (b'NOPE' + encode_matrix(['a'], np.zeros((1, 1)))[4:], 'should start with'),
+    (struct.pack('<4sI', MAGIC, 5) + b'{bad}', 'header is invalid'),
+    (_payload({'columns': ['a'], 'dtype': '<i4', 'shape': [1, 1]}, bytes(4)), 'header is invalid'),
+    (_payload({'columns': ['a'], 'dtype': '<f8', 'shape': [1, 1], 'version': 99}, bytes(8)), 'not supported'),
+    (_payload({'columns': ['a', 'b'], 'dtype': '<f8', 'shape': [1, 1]}, bytes(8)), 'names 2'),
+    (_payload({'columns': ['a'], 'dtype': '<f8', 'shape': [2, 1]}, bytes(8)), 'does not hold 2 rows'),
+])
+def test_decode_rejects_invalid_payloads(payload, message):
+    with pytest.raises(ValueError, match=message):
+        decode_matrix(payload)
+
+
+def test_matrix_predictions_match_batch_predictions(pipeline, records):
+    matrix = pipeline.preprocess(records).to_numpy()
+    # Columns may be given in any order, and in float32.
+    order = list(reversed(pipeline.columns))
+    prediction, errors = make_matrix_prediction(order, matrix[:, ::-1].astype(np.float32), pipeline)
+    assert errors == []
+    np.testing.assert_allclose(prediction[:, 0], make_batch_prediction(records, pipeline)['predictions'],
+                               rtol=1e-5)
+    with pytest.raises(ValueError, match='missing columns'):
+        make_matrix_prediction(pipeline.columns[1:], matrix[:, 1:], pipeline)
+
+
+@pytest.mark.parametrize('route', ['/api_v0.1', '/api_v0.1/batch'])
+def test_routes_answer_matrices(client, pipeline, records, route):
+    matrix = pipeline.preprocess(records).to_numpy()
+    matrix[1, pipeline.columns.index('Seville_pressure')] = 99
+    response = client.post(route, data=encode_matrix(pipeline.columns, matrix), content_type=MEDIA_TYPE)
+    assert response.status_code == 200 and response.mimetype == MEDIA_TYPE
+    header, prediction = decode_matrix(response.get_data())
+    assert header['columns'] == ['load_shortfall_3h']
+    assert np.isnan(prediction[1, 0]) and not np.isnan(np.delete(prediction, 1)).any()
+    assert [error['row'] for error in header['errors']] == [1]
+
+
+@pytest.mark.parametrize('body', [b'', b'not a matrix', encode_matrix(['a'], np.zeros((1, 1)))[:-1],
+                                  encode_matrix(['a'], np.zeros((1, 1)))])
+def test_routes_answer_invalid_matrices_with_400(client, body):
+    response = client.post('/api_v0.1/batch', data=body, content_type=MEDIA_TYPE)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
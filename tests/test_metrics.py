@@ -0,0 +1,91 @@
+"""
+
+    Tests of the metrics exposed in the Prometheus text format.
+
+"""
+
+# Test Dependencies
+import json
+import re
+from metrics import Counter, Gauge, Histogram, Registry
+
+# A sample line of the text exposition format: a name, optional labels and a value.
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? '
+                    r'(-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+def _samples(text):
+    """The value of each sample of a rendered registry, by name and labels."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            assert SAMPLE.match(line), line
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_exposition_format():
+    registry = Registry()
+    counter = registry.register(Counter('requests_total', 'Requests.', ['route']))
+    gauge = registry.register(Gauge('in_flight', 'In flight.'))
+    histogram = registry.register(Histogram('seconds', 'Durations.', ['route'], buckets=[0.1, 1]))
+    counter.inc('/a "quoted"\nroute')
+    counter.inc('/b', amount=2)
+    gauge.inc()
+    gauge.dec()
+    for value in [0.05, 0.5, 5]:
+        histogram.observe('/a', value=value)
+    text = registry.render()
+    assert '# HELP requests_total Requests.\n# TYPE requests_total counter' in text
+    assert '# TYPE seconds histogram' in text
+    samples = _samples(text)
+    assert samples['requests_total{route="/a \\"quoted\\"\\nroute"}'] == 1
+    assert samples['requests_total{route="/b"}'] == 2
+    assert samples['in_flight'] == 0
+    assert samples['seconds_bucket{route="/a",le="0.1"}'] == 1
+    assert samples['seconds_bucket{route="/a",le="1.0"}'] == 2
+    assert samples['seconds_bucket{route="/a",le="+Inf"}'] == 3
+    assert samples['seconds_count{route="/a"}'] == 3
+    assert samples['seconds_sum{route="/a"}'] == 5.55
+
+
+def test_gauge_functions_and_removal():
+    registry = Registry()
+    memory = registry.register(Gauge('memory_bytes', 'Memory.', function=lambda: 42))
+    info = registry.register(Gauge('model_info', 'Model.', ['version']))
+    info.set('v1', value=1)
+    info.remove('v1')
+    info.set('v2', value=1)
+    samples = _samples(registry.render())
+    assert samples['memory_bytes'] == 42
+    assert 'model_info{version="v1"}' not in samples and samples['model_info{version="v2"}'] == 1
+
+
+def test_metrics_route_counts_requests(client, records):
+    route = 'load_shortfall_requests_total{route="/api_v0.1",status="200"}'
+    before = _samples(client.get('/metrics').get_data(as_text=True)).get(route, 0)
+    assert client.post('/api_v0.1', data=json.dumps(records[0])).status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    samples = _samples(response.get_data(as_text=True))
+    assert samples[route] == before + 1
+    assert samples['load_shortfall_stage_duration_seconds_count{route="/api_v0.1",stage="preprocess"}'] >= 1
+    assert any(name.startswith('load_shortfall_model_info{') for name in samples)
+
+
+def test_warm_up_requests_are_neither_recorded_nor_cached(client, records, monkeypatch):
+    import api
+    import config
+    monkeypatch.setattr(api, 'warming_up', True)
+    route = 'load_shortfall_requests_total{route="/api_v0.1",status="200"}'
+    record = dict(records[0], Madrid_wind_speed=123.25)
+    before = _samples(client.get('/metrics').get_data(as_text=True)).get(route, 0)
+    assert client.post('/api_v0.1', data=json.dumps(record)).status_code == 200
+    assert _samples(client.get('/metrics').get_data(as_text=True)).get(route, 0) == before
+    assert api._cache(config.MODEL_NAME) is None
+    # The record was not cached while warming up, so it is a miss once the server is ready.
+    monkeypatch.setattr(api, 'warming_up', False)
+    misses = api._cache(config.MODEL_NAME).stats()['misses']
+    assert client.post('/api_v0.1', data=json.dumps(record)).status_code == 200
+    assert api._cache(config.MODEL_NAME).stats()['misses'] == misses + 1
@@ -0,0 +1,101 @@
+"""
+
+    Tests of the registry of served models.
+
+"""
+
+# Test Dependencies
+import json
+import pickle
+import threading
+import time
+import pytest
+from conftest import MODEL_PATH
+from model import load_model
+from model_registry import ModelRegistry
+
+
+def _artifact(path, version):
+    """Write a copy of the trained pipeline holding the given version."""
+    pipeline = load_model(MODEL_PATH)
+    pipeline.model_version = version
+    with open(path, 'wb') as artifact:
+        pickle.dump(pipeline, artifact)
+    return str(path)
+
+
+def test_load_and_rollback(tmp_path):
+    registry = ModelRegistry()
+    registry.load('model', _artifact(tmp_path / 'a.pkl', 'a'))
+    assert registry.load('model', _artifact(tmp_path / 'b.pkl', 'b')).model_version == 'b'
+    assert registry.rollback('model').model_version == 'a'
+    assert registry.get('model').model_version == 'a'
+    assert registry.rollback('model').model_version == 'b'
+
+
+def test_served_versions_are_not_unloaded(tmp_path):
+    registry = ModelRegistry(max_bytes=1)
+    registry.load('model', _artifact(tmp_path / 'a.pkl', 'a'))
+    registry.load('model', _artifact(tmp_path / 'b.pkl', 'b'))
+    models = registry.describe()['models']['model']
+    assert models['active']['resident'] and not models['previous']['resident']
+    assert models['previous']['model_version'] == 'a'
+    # The unloaded previous version is loaded again from its unchanged artifact.
+    assert registry.rollback('model').model_version == 'a'
+
+
+def test_rollback_fails_if_the_previous_artifact_changed(tmp_path):
+    registry = ModelRegistry(max_bytes=1)
+    path = _artifact(tmp_path / 'model.pkl', 'a')
+    registry.load('model', path)
+    registry.load('model', _artifact(tmp_path / 'model.pkl', 'b'))
+    with pytest.raises(ValueError, match='rather than version a'):
+        registry.rollback('model')
+    assert registry.get('model').model_version == 'b'
+
+
+def test_rollback_without_previous_version():
+    registry = ModelRegistry()
+    registry.register('model', MODEL_PATH)
+    with pytest.raises(KeyError):
+        registry.rollback('model')
+
+
+@pytest.mark.parametrize('body', ['[1]', '"path"', '{"path": 3}'])
+def test_reload_route_rejects_other_bodies(client, monkeypatch, body):
+    import api
+    import config
+    monkeypatch.setattr(config, 'ADMIN_TOKEN', 'secret')
+    response = client.post(f'/admin/models/{config.MODEL_NAME}/reload', headers={'X-Admin-Token': 'secret'},
+                           data=body)
+    assert response.status_code == 400
+    assert api.models.get(config.MODEL_NAME).path == config.MODEL_PATH
+    assert 'error' in json.loads(response.data)
+
+
+def test_requests_do_not_wait_for_a_reload(tmp_path, monkeypatch):
+    import model_registry
+    registry = ModelRegistry(max_bytes=10**9)
+    registry.load('model', _artifact(tmp_path / 'a.pkl', 'a'))
+    registry.register('other', _artifact(tmp_path / 'b.pkl', 'b'))
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load(path):
+        started.set()
+        release.wait(5)
+        return load_model(path)
+    monkeypatch.setattr(model_registry, 'load_model', slow_load)
+    reload = threading.Thread(target=registry.load, args=('model',))
+    lazy = threading.Thread(target=registry.get, args=('other',))
+    reload.start()
+    lazy.start()
+    try:
+        assert started.wait(5)
+        began = time.perf_counter()
+        assert registry.get('model').model_version == 'a'
+        assert time.perf_counter() - began < 1
+    finally:
+        release.set()
+        reload.join()
+        lazy.join()
+    assert registry.get('other').model_version == 'b'
@@ -0,0 +1,45 @@
+"""
+
+    Tests of the online updating of our linear model.
+
+"""
+
+# Test Dependencies
+import os
+import numpy as np
+import pandas as pd
+from conftest import ROOT
+from model import load_model
+from online_model import (OnlineLinearRegression, load_online_model, publish_online_model, save_online_model,
+                          start_online_model, update_online_model)
+
+TRAIN_DATA_PATH = os.path.join(ROOT, 'utils', 'data', 'df_train.csv')
+
+
+def test_partial_fit_matches_a_full_fit():
+    generator = np.random.default_rng(0)
+    X = generator.normal(size=(200, 5))
+    y = X @ np.arange(1.0, 6.0) + 3.0 + generator.normal(scale=0.1, size=200)
+    full = OnlineLinearRegression().fit(X, y)
+    online = OnlineLinearRegression(refresh_every=50).fit(X[:20], y[:20]).partial_fit(X[20:], y[20:])
+    np.testing.assert_allclose(online.coef_, full.coef_, rtol=1e-8)
+    np.testing.assert_allclose(online.intercept_, full.intercept_, rtol=1e-8)
+    assert online.n_samples_ == 200
+
+
+def test_updates_match_a_refit_of_the_pipeline(pipeline, tmp_path):
+    train = pd.read_csv(TRAIN_DATA_PATH)
+    online = start_online_model(pipeline, train.iloc[:4000])
+    used, skipped = update_online_model(online, train.iloc[4000:])
+    refit = start_online_model(pipeline, train)
+    assert used + len(skipped) == len(train) - 4000
+    np.testing.assert_allclose(online.estimator.weights_, refit.estimator.weights_, rtol=1e-6)
+
+    save_online_model(online, tmp_path / 'state.pkl')
+    restored = load_online_model(tmp_path / 'state.pkl')
+    np.testing.assert_array_equal(restored.estimator.weights_, online.estimator.weights_)
+    published = publish_online_model(online, str(tmp_path / 'published.pkl'))
+    served = load_model(str(tmp_path / 'published.pkl'))
+    assert served.model_version == published.model_version
+    X = online.preprocess(train.iloc[:8]).to_numpy()
+    np.testing.assert_allclose(served.predict(X), online.predict(X))
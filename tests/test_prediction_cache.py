@@ -0,0 +1,56 @@
+"""
+
+    Tests of the cache of predictions.
+
+"""
+
+# Test Dependencies
+import numpy as np
+from model import make_prediction
+from prediction_cache import PredictionCache
+
+
+def test_keys_depend_on_the_feature_values():
+    features = np.arange(4, dtype=np.float64)
+    assert PredictionCache.key(features) == PredictionCache.key(features.copy())
+    assert PredictionCache.key(features) != PredictionCache.key(features + 1)
+
+
+def test_least_recently_used_predictions_are_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put(b'a', 'v1', [1.0])
+    cache.put(b'b', 'v1', [2.0])
+    assert cache.get(b'a', 'v1') == [1.0]
+    cache.put(b'c', 'v1', [3.0])
+    assert cache.get(b'b', 'v1') is None
+    assert cache.get(b'a', 'v1') == [1.0] and cache.get(b'c', 'v1') == [3.0]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_another_model_version_invalidates_the_cache():
+    cache = PredictionCache()
+    cache.put(b'a', 'v1', [1.0])
+    assert cache.get(b'a', 'v2') is None
+    assert cache.get(b'a', 'v1') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_predictions_expire(monkeypatch):
+    import prediction_cache
+    now = [100.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put(b'a', 'v1', [1.0])
+    now[0] += 5
+    assert cache.get(b'a', 'v1') == [1.0]
+    now[0] += 6
+    assert cache.get(b'a', 'v1') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_cached_predictions_match_the_model(pipeline, records):
+    cache = PredictionCache()
+    first = make_prediction(dict(records[0]), pipeline, cache)
+    assert make_prediction(dict(records[0]), pipeline, cache) == first == make_prediction(dict(records[0]), pipeline)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
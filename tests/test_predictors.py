@@ -0,0 +1,104 @@
+"""
+
+    Tests of the native predictors exported from sklearn models.
+
+"""
+
+# Test Dependencies
+import json
+import os
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+from conftest import MODEL_PATH
+from model import FittedPipeline, load_model, make_batch_prediction, make_prediction
+from predictors import export_forest_model, export_linear_model
+
+NATIVE_MODEL_PATH = os.path.splitext(MODEL_PATH)[0] + '.linear'
+
+
+def _data(n_outputs=1, n_rows=300, n_features=6, seed=0):
+    generator = np.random.default_rng(seed)
+    X = generator.normal(loc=50, scale=20, size=(n_rows, n_features))
+    y = np.column_stack([np.sin(X[:, output] / 7) * 100 + X[:, -1] for output in range(n_outputs)])
+    return X, y[:, 0] if n_outputs == 1 else y
+
+
+def _export(estimator, X, y, path, export):
+    """Fit a standardised pipeline, export it, and load the native version."""
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    estimator.fit((X - mean) / scale, y)
+    pipeline = FittedPipeline(estimator, columns=[f'x{i}' for i in range(X.shape[1])],
+                              scaler_mean=mean, scaler_scale=scale, model_version='test')
+    export(pipeline, str(path))
+    return pipeline, load_model(str(path))
+
+
+@pytest.mark.parametrize('estimator, n_outputs', [
+    (RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0), 1),
+    (ExtraTreesRegressor(n_estimators=10, random_state=0), 1),
+    (DecisionTreeRegressor(max_depth=5, random_state=0), 1),
+    (RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0), 2),
+])
+def test_forest_matches_sklearn(tmp_path, estimator, n_outputs):
+    X, y = _data(n_outputs)
+    pipeline, native = _export(estimator, X, y, tmp_path / 'model.forest', export_forest_model)
+    test, _ = _data(n_outputs, n_rows=500, seed=1)
+    expected = pipeline.estimator.predict((test - pipeline.scaler_mean) / pipeline.scaler_scale)
+    assert native.predict(test).shape == expected.shape
+    assert np.allclose(native.predict(test), expected)
+    assert np.allclose(native.predict(test), pipeline.predict(test))
+
+
+def test_single_leaf_trees_are_exported(tmp_path):
+    X, _ = _data()
+    # A constant target leaves every tree as a single leaf.
+    estimator = RandomForestRegressor(n_estimators=5, random_state=0)
+    pipeline, native = _export(estimator, X, np.full(len(X), 7.5), tmp_path / 'model.forest',
+                               export_forest_model)
+    assert all(tree.tree_.node_count == 1 for tree in pipeline.estimator.estimators_)
+    assert np.allclose(native.predict(X), 7.5)
+
+
+def test_mixed_single_leaf_and_deep_trees(tmp_path):
+    X, y = _data()
+    estimator = RandomForestRegressor(n_estimators=4, max_depth=6, random_state=0)
+    pipeline, _ = _export(estimator, X, y, tmp_path / 'model.forest', export_forest_model)
+    # Replace one tree of the ensemble by a single leaf.
+    stump = DecisionTreeRegressor().fit(X[:5], np.full(5, y.mean()))
+    pipeline.estimator.estimators_[1] = stump
+    export_forest_model(pipeline, str(tmp_path / 'mixed.forest'))
+    native = load_model(str(tmp_path / 'mixed.forest'))
+    assert np.allclose(native.predict(X), pipeline.predict(X))
+
+
+def test_linear_model_with_folded_scaler_matches_the_pipeline(pipeline, records, tmp_path):
+    export_linear_model(pipeline, str(tmp_path / 'model.linear'))
+    native = load_model(str(tmp_path / 'model.linear'))
+    assert native.scaler_mean is None and native.model_version == pipeline.model_version
+    X = pipeline.preprocess(records).to_numpy()
+    np.testing.assert_allclose(native.predict(X), pipeline.predict(X), rtol=1e-10)
+    for record in records:
+        np.testing.assert_allclose(make_prediction(dict(record), native), make_prediction(dict(record), pipeline),
+                                   rtol=1e-10)
+
+
+def test_multi_output_linear_model(tmp_path):
+    X, y = _data(n_outputs=2)
+    pipeline, native = _export(LinearRegression(), X, y, tmp_path / 'model.linear', export_linear_model)
+    np.testing.assert_allclose(native.predict(X), pipeline.predict(X), rtol=1e-10)
+
+
+def test_committed_native_artifact_matches_the_pickled_model(pipeline, records, tmp_path):
+    # The committed artifact is up to date with `utils/export_model.py`.
+    export_linear_model(pipeline, str(tmp_path / 'model.linear'))
+    with open(os.path.join(NATIVE_MODEL_PATH, 'meta.json')) as committed, \
+            open(tmp_path / 'model.linear' / 'meta.json') as exported:
+        assert json.load(committed) == json.load(exported)
+    native = load_model(NATIVE_MODEL_PATH)
+    assert native.model_version == pipeline.model_version
+    assert native.time_series_features == pipeline.time_series_features
+    np.testing.assert_allclose(make_batch_prediction(records, native)['predictions'],
+                               make_batch_prediction(records, pipeline)['predictions'], rtol=1e-10)
@@ -0,0 +1,43 @@
+"""
+
+    Tests of the on-demand profiling of requests.
+
+"""
+
+# Test Dependencies
+import cProfile
+import pytest
+from profiling import SORT_KEYS, profile_report
+
+PROFILE_ID = '20180101T000000-1-1'
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    """A profiling directory holding one profile, readable with the model admin token."""
+    import config
+    profiler = cProfile.Profile()
+    profiler.runcall(sorted, range(100))
+    profiler.dump_stats(str(tmp_path / f'{PROFILE_ID}.pstats'))
+    monkeypatch.setattr(config, 'PROFILING_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'PROFILING_TOKEN', '')
+    monkeypatch.setattr(config, 'ADMIN_TOKEN', 'secret')
+    return tmp_path
+
+
+def test_reports_accept_every_sort_key(profiles):
+    for sort in SORT_KEYS:
+        assert 'function calls' in profile_report(str(profiles / f'{PROFILE_ID}.pstats'), sort=sort)
+    with pytest.raises(ValueError):
+        profile_report(str(profiles / f'{PROFILE_ID}.pstats'), sort='bogus')
+
+
+def test_profiles_are_readable_with_the_admin_token(client, profiles):
+    headers = {'X-Admin-Token': 'secret'}
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get(f'/admin/profiles/{PROFILE_ID}', headers=headers).status_code == 200
+    response = client.get(f'/admin/profiles/{PROFILE_ID}?format=text&sort=time', headers=headers)
+    assert response.status_code == 200
+    response = client.get(f'/admin/profiles/{PROFILE_ID}?format=text&sort=bogus', headers=headers)
+    assert response.status_code == 400
+    assert 'bogus' in response.get_json()['error']
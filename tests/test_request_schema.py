@@ -0,0 +1,76 @@
+"""
+
+    Tests of the request schema and its compiled record decoder.
+
+"""
+
+# Test Dependencies
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import TEST_DATA_PATH
+from request_schema import RequestError, RequestSchema, loads
+
+
+@pytest.fixture(scope='module')
+def schema():
+    return RequestSchema.from_training_data(pd.read_csv(TEST_DATA_PATH))
+
+
+def test_schema_from_training_data(schema):
+    assert 'Unnamed: 0' not in schema.fields
+    assert schema.fields['time'] == 'time'
+    assert schema.fields['Seville_pressure'] == 'string'
+    assert schema.fields['Madrid_wind_speed'] == 'number'
+    assert schema.nullable == {'Valencia_pressure'}
+
+
+def test_schema_round_trip(schema, tmp_path):
+    schema.save(tmp_path / 'schema.json')
+    restored = RequestSchema.load(tmp_path / 'schema.json')
+    assert restored.fields == schema.fields and restored.nullable == schema.nullable
+    with pytest.raises(ValueError):
+        RequestSchema.from_dict(dict(schema.to_dict(), version=99))
+    with pytest.raises(ValueError):
+        RequestSchema({'time': 'date'})
+
+
+def test_compile_requires_every_model_feature(schema, pipeline):
+    fields = dict(schema.fields)
+    del fields['Bilbao_rain_1h']
+    with pytest.raises(ValueError, match='Bilbao_rain_1h'):
+        RequestSchema(fields).compile(pipeline)
+
+
+def test_decoded_rows_match_the_pandas_path(schema, pipeline, records):
+    decoder = schema.compile(pipeline)
+    for record in records:
+        np.testing.assert_array_equal(decoder.decode(json.dumps(record)),
+                                      pipeline.preprocess(dict(record)).to_numpy())
+
+
+@pytest.mark.parametrize('change, error', [
+    ({'Madrid_wind_speed': True}, 'Expected a number, got True.'),
+    ({'Madrid_wind_speed': '3.5'}, "Expected a number, got '3.5'."),
+    ({'Seville_pressure': 25}, 'Expected a string, got 25.'),
+    ({'time': '2018-01-01T00:00:00+01:00'},
+     "Expected a timestamp such as '2018-01-01 03:00:00', got '2018-01-01T00:00:00+01:00'."),
+])
+def test_invalid_values_are_named(schema, pipeline, records, change, error):
+    field, = change
+    with pytest.raises(RequestError) as raised:
+        schema.compile(pipeline).decode(dict(records[0], **change))
+    assert raised.value.status == 422
+    assert raised.value.fields == [{'field': field, 'error': error}]
+
+
+@pytest.mark.parametrize('payload', ['[1, 2]', '3', b'{"time": '])
+def test_other_payloads_are_rejected(schema, pipeline, payload):
+    with pytest.raises(RequestError) as raised:
+        schema.compile(pipeline).decode(payload)
+    assert raised.value.status == 400
+
+
+def test_loads_unwraps_json_strings(records):
+    assert loads(json.dumps(json.dumps(records[0]))) == records[0]
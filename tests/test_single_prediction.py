@@ -0,0 +1,82 @@
+"""
+
+    Tests of single-record prediction.
+
+"""
+
+# Test Dependencies
+import json
+import os
+import numpy as np
+import pytest
+from model import make_prediction
+from request_schema import RequestError, RequestSchema
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'trained-models',
+                           'load_shortfall_request_schema.json')
+
+
+@pytest.fixture(scope='module')
+def decoder(pipeline):
+    return RequestSchema.load(SCHEMA_PATH).compile(pipeline)
+
+
+def test_fast_path_matches_pandas_path(pipeline, records):
+    record = records[0]
+    fast = make_prediction(dict(record), pipeline)
+    pandas = pipeline.predict(pipeline.preprocess(dict(record)).to_numpy())
+    np.testing.assert_allclose(fast, np.ravel(pandas))
+
+
+def test_json_strings_are_accepted(pipeline, records):
+    assert make_prediction(json.dumps(records[0]), pipeline) == make_prediction(dict(records[0]), pipeline)
+
+
+@pytest.mark.parametrize('change, field, error', [
+    ({'Seville_pressure': 'sp99'}, 'Seville_pressure', "Unknown code 'sp99'."),
+    ({'Madrid_wind_speed': None}, 'Madrid_wind_speed', 'This field may not be null.'),
+    ({'Madrid_wind_speed': 'abc'}, 'Madrid_wind_speed', "Expected a number, got 'abc'."),
+    ({'time': 'bad'}, 'time', "Expected a timestamp such as '2018-01-01 03:00:00', got 'bad'."),
+])
+@pytest.mark.parametrize('with_schema', [False, True])
+def test_invalid_fields_are_reported(pipeline, decoder, records, change, field, error, with_schema):
+    record = dict(records[0], **change)
+    with pytest.raises(RequestError) as raised:
+        make_prediction(record, pipeline, decoder=decoder if with_schema else None)
+    assert raised.value.status == 422
+    assert raised.value.fields == [{'field': field, 'error': error}]
+
+
+def test_missing_fields_are_reported(pipeline, records):
+    record = dict(records[0])
+    del record['Bilbao_rain_1h']
+    with pytest.raises(RequestError) as raised:
+        make_prediction(record, pipeline)
+    assert raised.value.fields == [{'field': 'Bilbao_rain_1h', 'error': 'This field is required.'}]
+
+
+def test_fill_values_replace_missing_pressure(pipeline, decoder, records):
+    record = dict(records[0], Valencia_pressure=None)
+    assert np.isfinite(make_prediction(record, pipeline)[0])
+    assert make_prediction(record, pipeline) == make_prediction(record, pipeline, decoder=decoder)
+
+
+def test_prediction_route_answers_invalid_records_with_422(client, records):
+    response = client.post('/api_v0.1', data=json.dumps(dict(records[0], Seville_pressure='sp99')))
+    assert response.status_code == 422
+    assert response.get_json()['fields'][0]['field'] == 'Seville_pressure'
+
+
+def test_timestamps_in_other_formats_use_the_pandas_path(pipeline, records):
+    record = dict(records[0], time='1 Jan 2018 00:00')
+    assert pipeline.preprocess_record(record) is None
+    assert make_prediction(record, pipeline) == make_prediction(dict(records[0]), pipeline)
+
+
+def test_read_only_features_are_not_standardised_in_place(pipeline, records):
+    X = pipeline.preprocess(dict(records[0])).to_numpy().copy()
+    expected = pipeline.predict(X)
+    X.flags.writeable = False
+    before = X.copy()
+    np.testing.assert_allclose(pipeline.predict(X, overwrite=True), expected)
+    np.testing.assert_array_equal(X, before)
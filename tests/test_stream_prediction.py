@@ -0,0 +1,48 @@
+"""
+
+    Tests of streamed predictions.
+
+"""
+
+# Test Dependencies
+import json
+import numpy as np
+from model import make_prediction, make_stream_prediction
+
+
+def _lines(records):
+    return [json.dumps(record) + '\n' for record in records]
+
+
+def test_stream_matches_single_predictions(pipeline, records):
+    results = list(make_stream_prediction(_lines(records), pipeline, chunk_size=3))
+    assert [result['row'] for result in results] == list(range(len(records)))
+    np.testing.assert_allclose([result['prediction'] for result in results],
+                               [make_prediction(dict(record), pipeline)[0] for record in records])
+
+
+def test_chunks_of_empty_records_are_reported(pipeline, records):
+    results = list(make_stream_prediction(_lines([{}, {}, records[0]]), pipeline, chunk_size=2))
+    assert [result['row'] for result in results] == [0, 1, 2]
+    assert 'error' in results[0] and 'error' in results[1]
+    assert results[2]['prediction'] == make_prediction(dict(records[0]), pipeline)[0]
+
+
+def test_stream_route_answers_every_line(client, records):
+    body = '\n' + json.dumps(records[0]) + '\n\n{"time": \n{}\n[1]\n' + json.dumps(records[1]) + '\n'
+    response = client.post('/api_v0.1/stream', data=body)
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    # Blank lines are skipped, and every other line is answered in order.
+    assert [result['row'] for result in results] == [0, 1, 2, 3, 4]
+    assert 'prediction' in results[0] and 'prediction' in results[4]
+    assert results[1]['error'].startswith('Invalid JSON')
+    assert 'error' in results[2]
+    assert results[3]['error'] == 'Expected a JSON object holding a feature record.'
+
+
+def test_stream_route_answers_empty_records(client):
+    response = client.post('/api_v0.1/stream', data='{}\n{}\n')
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(result['row'], 'error' in result) for result in results] == [(0, True), (1, True)]
@@ -0,0 +1,44 @@
+"""
+    Simple script to benchmark the calendar features derived from `time`.
+
+    Description: This script compares the per-row cost of deriving the
+    calendar features by re-parsing the `time` column once per feature, as
+    done within our notebook, against the single-pass vectorised extractor
+    used by the API.
+
+"""
+
+# Dependencies
+import os
+import sys
+import timeit
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from features import extract_calendar_features, CALENDAR_FIELDS
+
+
+def notebook_calendar_features(data):
+    """Derive the calendar features as our notebook does."""
+    data['Year'] = pd.to_datetime(data['time']).dt.year
+    data['Month_of_year'] = pd.to_datetime(data['time']).dt.month
+    data['Week_of_year'] = pd.to_datetime(data['time']).dt.isocalendar().week
+    data['Day_of_year'] = pd.to_datetime(data['time']).dt.dayofyear
+    data['Day_of_month'] = pd.to_datetime(data['time']).dt.day
+    data['Day_of_week'] = pd.to_datetime(data['time']).dt.dayofweek
+    data['Hour_of_week'] = ((pd.to_datetime(data['time']).dt.dayofweek) * 24 + 24) - (24 - pd.to_datetime(data['time']).dt.hour)
+    data['Hour_of_day'] = pd.to_datetime(data['time']).dt.hour
+    return data
+
+
+for path in ['./data/df_test.csv', './data/df_train.csv']:
+    data = pd.read_csv(path, usecols=['time'])
+    repeats = 20
+    notebook = min(timeit.repeat(lambda: notebook_calendar_features(data.copy()),
+                                 number=1, repeat=repeats))
+    single_pass = min(timeit.repeat(lambda: extract_calendar_features(data['time'], CALENDAR_FIELDS),
+                                    number=1, repeat=repeats))
+    print(f"{path} ({len(data)} rows)")
+    print(f"  notebook:    {notebook / len(data) * 1e6:.3f} us/row")
+    print(f"  single pass: {single_pass / len(data) * 1e6:.3f} us/row")
+    print(f"  speed-up:    {notebook / single_pass:.1f}x")
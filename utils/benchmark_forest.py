@@ -0,0 +1,62 @@
+"""
+    Simple script to benchmark the native tree ensemble engine
+
+    Description: This script trains the random forest chosen within our
+    notebook, exports it to the native format, and compares its accuracy and
+    prediction time against sklearn at several batch sizes of `df_test.csv`.
+
+    Usage: python benchmark_forest.py [n_estimators]
+
+"""
+
+# Dependencies
+import os
+import sys
+import tempfile
+import timeit
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model import FittedPipeline, load_model, _preprocess_data, fit_categorical_encoders
+from predictors import export_forest_model
+from dataset_cache import read_dataset
+
+n_estimators = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+# Train the forest on our preprocessed training data
+train = read_dataset('./data/df_train.csv')
+categorical_encoders = fit_categorical_encoders(train)
+fill_values = {'Valencia_pressure': float(train['Valencia_pressure'].mean())}
+X_train = _preprocess_data(train, categorical_encoders, fill_values)
+forest = RandomForestRegressor(n_estimators=n_estimators, min_samples_leaf=1,
+                               max_features=0.9, n_jobs=-1, random_state=42)
+print (f"Training a {n_estimators} tree forest...")
+forest.fit(X_train.to_numpy(), train['load_shortfall_3h'])
+pipeline = FittedPipeline(forest, columns=X_train.columns, fill_values=fill_values,
+                          categorical_encoders=categorical_encoders, model_version='benchmark')
+
+# Export it to the native format
+with tempfile.TemporaryDirectory() as export_path:
+    export_forest_model(pipeline, export_path)
+    native = load_model(export_path)
+    artifact_size = sum(os.path.getsize(os.path.join(export_path, name))
+                        for name in os.listdir(export_path))
+    print(f"Native artifact size: {artifact_size / 2**20:.1f} MiB "
+          f"({native.estimator.feature.shape[0]} nodes)")
+
+    test = read_dataset('./data/df_test.csv')
+    X_test = pipeline.preprocess(test).to_numpy()
+    expected = forest.predict(X_test)
+    predicted = native.predict(X_test)
+    print(f"Max absolute difference from sklearn: {np.max(np.abs(predicted - expected)):.6f}")
+
+    # Both engines are timed on a single thread.
+    forest.n_jobs = 1
+    for batch_size in [1, 64, len(X_test)]:
+        batch = X_test[:batch_size]
+        repeats = 5 if batch_size > 64 else 50
+        sklearn_time = min(timeit.repeat(lambda: forest.predict(batch), number=1, repeat=repeats))
+        native_time = min(timeit.repeat(lambda: native.predict(batch), number=1, repeat=repeats))
+        print(f"batch size {batch_size:>5}: sklearn {sklearn_time * 1e3:8.2f} ms, "
+              f"native {native_time * 1e3:8.2f} ms, speed-up {sklearn_time / native_time:.1f}x")
@@ -0,0 +1,168 @@
+"""
+    Simple script to benchmark each stage of our inference pipeline
+
+    Description: This script times every stage of serving a prediction in
+    isolation, on rows of `df_test.csv` at several batch sizes: decoding the
+    JSON payload, building the DataFrame, encoding the categorical features,
+    deriving the calendar features, predicting and serialising the
+    response, along with the whole of `make_prediction()` and the Flask
+    routes. The load time and size of each model artifact are measured too.
+
+    Results may be saved as a baseline. Later runs are compared against it,
+    failing when any measurement has grown by more than a given percentage.
+
+    Usage: python benchmark_pipeline.py [--save-baseline] [--baseline FILE]
+                                        [--threshold PERCENT] [--output FILE]
+
+"""
+
+# Dependencies
+import argparse
+import json
+import os
+import sys
+import timeit
+import pandas as pd
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+# Serve the API's artifacts however this script is launched.
+os.environ.setdefault('LOAD_SHORTFALL_MODEL_PATH', os.path.join(
+    root, 'assets/trained-models/load_shortfall_simple_lm_regression.pkl'))
+os.environ.setdefault('LOAD_SHORTFALL_REQUEST_SCHEMA_PATH', os.path.join(
+    root, 'assets/trained-models/load_shortfall_request_schema.json'))
+os.environ.setdefault('LOAD_SHORTFALL_PREDICTION_CACHE_SIZE', '0')
+
+from model import (load_model, make_prediction, make_batch_prediction, _load_feature_frame,
+                   _preprocess_data, _TIME_FEATURES)
+from features import extract_calendar_features
+from request_schema import loads
+from model_registry import artifact_size
+
+BATCH_SIZES = [1, 32, 1024, 'full']
+
+ARTIFACTS = {
+    'sklearn': os.path.join(root, 'assets/trained-models/load_shortfall_simple_lm_regression.pkl'),
+    'native': os.path.join(root, 'assets/trained-models/load_shortfall_simple_lm_regression.linear'),
+}
+
+
+def measure(function, repeat=3):
+    """The fastest mean time of a call to `function` over several runs, in
+    seconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def benchmark_stages(test, pipeline, client):
+    """Time each pipeline stage at each batch size.
+
+    Returns
+    -------
+    dict
+        Maps each `stage[batch size]` to its time in seconds.
+    """
+    results = {}
+    for size in BATCH_SIZES:
+        rows = test if size == 'full' else test.iloc[:size]
+        payload = (rows.iloc[0].to_json() if size == 1 else rows.to_json(orient='records')).encode()
+        records = loads(payload)
+        frame = _load_feature_frame(records)
+        prepared = pipeline.preprocess(frame).to_numpy()
+        predictions = make_batch_prediction(records, pipeline)
+        route = '/api_v0.1' if size == 1 else '/api_v0.1/batch'
+
+        stages = {
+            'json_decode': lambda: loads(payload),
+            'dataframe_build': lambda: _load_feature_frame(records),
+            'categorical_encoding': lambda: [encoder.transform(frame[column].to_numpy())
+                                             for column, encoder in pipeline.categorical_encoders.items()],
+            'time_features': lambda: extract_calendar_features(frame['time'], _TIME_FEATURES),
+            'preprocess': lambda: _preprocess_data(frame, pipeline.categorical_encoders,
+                                                   pipeline.fill_values, pipeline.columns),
+            'predict': lambda: pipeline.predict(prepared),
+            'serialization': lambda: json.dumps(predictions),
+            'end_to_end': (lambda: make_prediction(payload, pipeline)) if size == 1 else
+                          (lambda: make_batch_prediction(records, pipeline)),
+            'flask_route': lambda: client.post(route, data=payload, content_type='application/json'),
+        }
+        for stage, function in stages.items():
+            results[f'{stage}[{size}]'] = measure(function)
+    return results
+
+
+def benchmark_artifacts():
+    """Time the loading of each model artifact, and measure its size."""
+    results = {}
+    for engine, path in ARTIFACTS.items():
+        if not os.path.exists(path):
+            continue
+        results[f'model_load[{engine}]'] = measure(lambda: load_model(path))
+        results[f'artifact_bytes[{engine}]'] = artifact_size(path)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List the measurements which have regressed from the baseline.
+
+    Parameters
+    ----------
+    results : dict
+        The measurements of this run.
+    baseline : dict
+        The measurements of the baseline run.
+    threshold : float
+        The percentage by which a measurement may grow before it is counted
+        as a regression.
+
+    Returns
+    -------
+    list
+        A description of each regression.
+    """
+    regressions = []
+    for name, value in results.items():
+        before = baseline.get(name)
+        if before and value > before * (1 + threshold / 100):
+            regressions.append(f'{name}: {before:.6g} -> {value:.6g} (+{(value / before - 1) * 100:.0f}%)')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark each stage of the inference pipeline.')
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument('--data', default=os.path.join(here, 'data', 'df_test.csv'))
+    parser.add_argument('--baseline', default=os.path.join(here, 'benchmark_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results of this run as the baseline.')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='The percentage by which a stage may slow down before the run fails.')
+    parser.add_argument('--output', default=None, help='Also write the results to this file.')
+    args = parser.parse_args()
+
+    import api
+    test = pd.read_csv(args.data)
+    results = benchmark_stages(test, api.static_model, api.app.test_client())
+    results.update(benchmark_artifacts())
+
+    for name, value in results.items():
+        unit = f'{value:>14,.0f} bytes' if name.startswith('artifact_bytes') else f'{value * 1e6:>14,.1f} us'
+        print(f'{name:<34}{unit}')
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f'Saved baseline to: {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} measurements regressed by more than {args.threshold}%:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'\nNo measurement regressed by more than {args.threshold}% from {args.baseline}.')
@@ -0,0 +1,32 @@
+"""
+    Simple file to export our trained model for native serving
+
+    Description: This script converts the linear model or tree ensemble
+    pickled by `train_model.py` into a compact native format, which our API
+    may load without importing sklearn. Select it by setting the
+    `LOAD_SHORTFALL_MODEL_ENGINE` environment variable to `native`.
+
+"""
+
+# Dependencies
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model import load_model
+from predictors import export_linear_model, export_forest_model
+
+# Load the trained pipeline
+model_path = sys.argv[1] if len(sys.argv) > 1 else \
+    '../assets/trained-models/load_shortfall_simple_lm_regression.pkl'
+pipeline = load_model(model_path)
+
+# Export its model, according to the model type
+if hasattr(pipeline.estimator, 'coef_'):
+    save_path = os.path.splitext(model_path)[0] + '.linear'
+    export = export_linear_model
+else:
+    save_path = os.path.splitext(model_path)[0] + '.forest'
+    export = export_forest_model
+print (f"Exporting {model_path} to: {save_path}")
+export(pipeline, save_path)
@@ -0,0 +1,258 @@
+"""
+
+    Simple script to benchmark the API under load
+
+    Description: This script extends `request.py` by replaying rows of
+    `df_test.csv`, or the bodies of a captured request log, against the API
+    from several concurrent clients for a fixed duration. Requests are
+    either sent back to back (closed loop), or at a fixed rate regardless of
+    how quickly they are answered (open loop). Throughput, latency
+    percentiles and error rates are written as JSON, so that runs may be
+    compared across versions of the API.
+
+    Usage: python load_test.py [--url URL] [--concurrency N] [--rate RPS]
+                               [--duration SECONDS] [--batch-size ROWS]
+                               [--no-keepalive] [--log FILE] [--start-server]
+                               [--output FILE]
+
+"""
+
+# Dependencies
+import argparse
+import collections
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import numpy as np
+import pandas as pd
+
+# The latency percentiles reported.
+PERCENTILES = {'p50': 50, 'p90': 90, 'p99': 99, 'p999': 99.9}
+
+_Result = collections.namedtuple('_Result', ['latency', 'outcome'])
+
+
+def load_payloads(data_path, batch_size, log_path=None):
+    """Prepare the request bodies to replay.
+
+    Parameters
+    ----------
+    data_path : str
+        A CSV file of feature records, such as `df_test.csv`.
+    batch_size : int
+        The number of records sent within each request. Single records are
+        sent as a JSON object, and batches as a list of records.
+    log_path : str, optional
+        A file holding one captured JSON request body per line, replayed
+        instead of `data_path`.
+
+    Returns
+    -------
+    list
+        The encoded request bodies.
+    """
+    if log_path is not None:
+        with open(log_path, 'rb') as log_file:
+            return [line.strip() for line in log_file if line.strip()]
+    records = pd.read_csv(data_path).to_json(orient='records', lines=True).splitlines()
+    if batch_size == 1:
+        return [record.encode() for record in records]
+    return [('[' + ','.join(records[start:start + batch_size]) + ']').encode()
+            for start in range(0, len(records), batch_size)]
+
+
+class LoadGenerator:
+    """Sends requests to the API from concurrent client threads.
+
+    In open-loop mode, request `i` is due `i / rate` seconds after the start
+    of the run, and its latency is measured from that time. Requests
+    delayed because every client was busy therefore count their time spent
+    waiting, as they would for real users.
+
+    Parameters
+    ----------
+    url : str
+        The route to send requests to.
+    payloads : list
+        The request bodies, which are replayed in turn.
+    concurrency : int
+        The number of client threads.
+    rate : float, optional
+        The number of requests due per second. By default each client sends
+        its next request as soon as the last is answered.
+    keepalive : bool
+        Whether each client reuses its connection between requests.
+    timeout : float
+        How long to wait for each response, in seconds.
+    """
+
+    def __init__(self, url, payloads, concurrency=1, rate=None, keepalive=True, timeout=30.0):
+        self.url = urllib.parse.urlsplit(url)
+        self.payloads = payloads
+        self.concurrency = concurrency
+        self.rate = rate or None
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sent = 0
+
+    def _next(self, start, end):
+        # Claim the next request, returning its index and due time.
+        with self._lock:
+            index = self._sent
+            self._sent += 1
+        due = start + index / self.rate if self.rate else time.perf_counter()
+        return (index, due) if due < end else (None, None)
+
+    def _client(self, start, end, results):
+        connection = None
+        headers = {'Content-Type': 'application/json'}
+        if not self.keepalive:
+            headers['Connection'] = 'close'
+        while True:
+            index, due = self._next(start, end)
+            if index is None:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(self.url.hostname, self.url.port,
+                                                            timeout=self.timeout)
+                connection.request('POST', self.url.path, self.payloads[index % len(self.payloads)],
+                                   headers)
+                response = connection.getresponse()
+                response.read()
+                outcome = response.status
+                if not self.keepalive or response.will_close:
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException) as error:
+                outcome = type(error).__name__
+                if connection is not None:
+                    connection.close()
+                connection = None
+            results.append(_Result(time.perf_counter() - due, outcome))
+        if connection is not None:
+            connection.close()
+
+    def run(self, duration):
+        """Send requests for the given number of seconds.
+
+        Returns
+        -------
+        tuple
+            A `(latency, outcome)` pair for each request, where the outcome
+            is the HTTP status code or the name of the connection error,
+            along with the time taken to send them all.
+        """
+        self._sent = 0
+        results = []
+        start = time.perf_counter()
+        end = start + duration
+        clients = [threading.Thread(target=self._client, args=(start, end, results))
+                   for _ in range(self.concurrency)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        return results, time.perf_counter() - start
+
+
+def summarise(results, elapsed, batch_size):
+    """Summarise the results of a run as plain python values, e.g. for JSON."""
+    outcomes = collections.Counter(str(result.outcome) for result in results)
+    errors = sum(count for outcome, count in outcomes.items() if outcome != '200')
+    latencies = np.array([result.latency for result in results]) * 1000
+    summary = {
+        'requests': len(results),
+        'duration_s': elapsed,
+        'throughput_rps': len(results) / elapsed,
+        'rows_per_s': (len(results) - errors) * batch_size / elapsed,
+        'errors': errors,
+        'error_rate': errors / len(results) if results else 0.0,
+        'outcomes': dict(sorted(outcomes.items())),
+    }
+    if len(latencies):
+        summary['latency_ms'] = dict(
+            {name: float(np.percentile(latencies, q)) for name, q in PERCENTILES.items()},
+            mean=float(latencies.mean()), max=float(latencies.max()))
+    return summary
+
+
+def start_server(url, timeout=60.0):
+    """Start the production server from `serve.py`, waiting until it reports itself ready."""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    # The server's output is sent to stderr, leaving stdout for the report.
+    server = subprocess.Popen([sys.executable, 'serve.py'], cwd=root, stdout=sys.stderr)
+    # /ready answers 503, raised as an OSError, until the model is warmed up.
+    ready_url = urllib.parse.urljoin(url, '/ready')
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'The server exited with code {server.returncode}.')
+        try:
+            with urllib.request.urlopen(ready_url, timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'The server was not ready within {timeout} seconds.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the API under load.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000',
+                        help='The address of the API, optionally including the route.')
+    parser.add_argument('--data', default='./data/df_test.csv')
+    parser.add_argument('--log', default=None,
+                        help='A file of captured JSON request bodies, one per line, to replay.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Requests per second for an open-loop run. 0 sends back to back.')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--no-keepalive', action='store_true',
+                        help='Open a new connection for every request.')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--start-server', action='store_true',
+                        help='Start `serve.py` for the duration of the run.')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    url = args.url
+    if not urllib.parse.urlsplit(url).path.strip('/'):
+        url = urllib.parse.urljoin(url, '/api_v0.1' if args.batch_size == 1 else '/api_v0.1/batch')
+    payloads = load_payloads(args.data, args.batch_size, args.log)
+
+    server = start_server(url) if args.start_server else None
+    try:
+        generator = LoadGenerator(url, payloads, args.concurrency, args.rate,
+                                  keepalive=not args.no_keepalive, timeout=args.timeout)
+        results, elapsed = generator.run(args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'config': {'url': url, 'source': args.log or args.data, 'concurrency': args.concurrency,
+                   'rate': args.rate or None, 'duration_s': args.duration,
+                   'batch_size': args.batch_size, 'keepalive': not args.no_keepalive},
+        'results': summarise(results, elapsed, args.batch_size),
+    }
+    if args.rate and report['results']['throughput_rps'] < 0.95 * args.rate:
+        print(f"Warning: only {report['results']['throughput_rps']:.0f} of {args.rate:.0f} "
+              "requests per second were sent. Try a higher --concurrency.", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text + '\n')
+    print(text)
@@ -0,0 +1,159 @@
+"""
+    Simple script to score a CSV file of feature records offline
+
+    Description: This script scores every row of an input CSV file with our
+    trained model, writing `time,load_shortfall_3h` predictions in input
+    order, in the format of our Kaggle submission. The file is read in
+    chunks of raw lines, which are parsed, preprocessed and predicted across
+    a pool of worker processes, so that memory use stays bounded and
+    throughput grows with the number of cores.
+
+    Usage: python score_csv.py [--model PATH] [--workers N] [--chunk-size ROWS]
+                               [input.csv] [output.csv]
+
+"""
+
+# Dependencies
+import argparse
+import collections
+import io
+import itertools
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model import load_model
+
+_pipeline = None
+
+
+def _load_worker(model_path):
+    """Private helper function loading the model once within each worker."""
+    global _pipeline
+    _pipeline = load_model(model_path)
+
+
+def _score_chunk(header, lines):
+    """Private helper function scoring a chunk of raw CSV lines.
+
+    Parameters
+    ----------
+    header : bytes
+        The header line of the input file.
+    lines : bytes
+        The chunk of data lines to score.
+
+    Returns
+    -------
+    tuple
+        The output CSV lines for the chunk, without a header, along with the
+        number of rows scored.
+    """
+    chunk = pd.read_csv(io.BytesIO(header + lines))
+    features = _pipeline.preprocess(chunk).to_numpy()
+    # Rows holding missing or invalid features are written without a prediction.
+    valid = ~np.isnan(features).any(axis=1)
+    prediction = np.full(len(chunk), np.nan)
+    if valid.any():
+        prediction[valid] = np.reshape(_pipeline.predict(features[valid]), (int(valid.sum()), -1))[:, 0]
+    output = pd.DataFrame({'time': chunk['time'], 'load_shortfall_3h': prediction})
+    return output.to_csv(index=False, header=False), len(chunk)
+
+
+def _read_chunks(input_file, chunk_size):
+    """Private helper function yielding chunks of raw lines from a file.
+
+    Lines are split without being parsed, so that parsing is also spread
+    across the workers. Quoted values must not span lines.
+    """
+    while True:
+        lines = b''.join(itertools.islice(input_file, chunk_size))
+        if not lines:
+            return
+        yield lines
+
+
+def score_csv(input_path, output_path, model_path, workers=None, chunk_size=50000):
+    """Score every row of a CSV file, writing predictions in input order.
+
+    Parameters
+    ----------
+    input_path : str
+        A CSV file of feature records, with a header row.
+    output_path : str
+        The CSV file to write `time,load_shortfall_3h` predictions to.
+    model_path : str
+        The model artifact to score with, as accepted by `load_model()`.
+    workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs. With
+        a single worker, chunks are scored within this process.
+    chunk_size : int
+        The number of rows sent to a worker at a time.
+
+    Returns
+    -------
+    int
+        The number of rows scored.
+    """
+    workers = workers or os.cpu_count()
+    rows = 0
+    with open(input_path, 'rb') as input_file, open(output_path, 'w', newline='') as output_file:
+        header = input_file.readline()
+        output_file.write('time,load_shortfall_3h\n')
+        chunks = _read_chunks(input_file, chunk_size)
+        if workers == 1:
+            _load_worker(model_path)
+            for lines in chunks:
+                text, count = _score_chunk(header, lines)
+                output_file.write(text)
+                rows += count
+            return rows
+
+        with ProcessPoolExecutor(workers, initializer=_load_worker, initargs=(model_path,)) as pool:
+            # Only a few chunks per worker are in flight at once, bounding the
+            # memory held by the pool. Results are written in submission order.
+            pending = collections.deque()
+            for lines in itertools.chain(chunks, [None]):
+                if lines is not None:
+                    pending.append(pool.submit(_score_chunk, header, lines))
+                while pending and (lines is None or len(pending) >= 2 * workers):
+                    text, count = pending.popleft().result()
+                    output_file.write(text)
+                    rows += count
+    return rows
+
+
+def _peak_rss_mb():
+    """Private helper function giving the peak RSS of this process and its
+    largest worker, in MB."""
+    this = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return this, children
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a CSV file of feature records.')
+    parser.add_argument('input', nargs='?', default='./data/df_test.csv')
+    parser.add_argument('output', nargs='?', default='./data/load_shortfall_predictions.csv')
+    parser.add_argument('--model', default='../assets/trained-models/load_shortfall_simple_lm_regression.pkl')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='The number of worker processes. Defaults to the number of CPUs.')
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help='The number of rows scored by a worker at a time.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = score_csv(args.input, args.output, args.model, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    parent_rss, worker_rss = _peak_rss_mb()
+    print(f"Scored {rows} rows from {args.input} to {args.output} in {elapsed:.2f}s "
+          f"({rows / elapsed:,.0f} rows/s)")
+    if (args.workers or os.cpu_count()) > 1:
+        print(f"Peak RSS: {parent_rss:.1f} MB (main process), {worker_rss:.1f} MB (largest worker)")
+    else:
+        print(f"Peak RSS: {parent_rss:.1f} MB")
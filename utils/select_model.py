@@ -0,0 +1,275 @@
+"""
+    Simple script to select the best model for our API
+
+    Description: This script replaces the one-after-another model comparison
+    of our notebook. The features of the training data are engineered once
+    and cached on disk, keyed by a hash of the data and the version of our
+    preprocessing pipeline, so later runs skip straight to fitting. Every
+    candidate model and hyperparameter setting is then cross-validated, with
+    each fold fitted within a pool of worker processes which share the
+    cached feature matrix through memory mapping.
+
+    The results are written as a leaderboard of RMSE, fit time, single-record
+    prediction latency and artifact size. The winner is refitted on all of
+    the training data and saved as a pipeline ready to be served.
+
+    Usage: python select_model.py [--models NAME ...] [--folds N] [--workers N]
+                                  [--leaderboard FILE] [--output FILE]
+
+"""
+
+# Dependencies
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model import (FittedPipeline, FEATURE_COLUMNS, PIPELINE_VERSION, _TIME_FEATURES,
+                   _preprocess_data, fit_categorical_encoders)
+from features import CategoricalEncoder
+from dataset_cache import read_dataset, source_hash
+
+# The models compared within our notebook, each with the hyperparameters to
+# search and whether its features are standardised first.
+CANDIDATES = {
+    'linear_regression': (LinearRegression, {}, True),
+    'lasso': (Lasso, {'alpha': [0.1, 1.0, 10.0], 'max_iter': [10000]}, True),
+    'ridge': (Ridge, {'alpha': [0.1, 1.0, 10.0, 100.0]}, True),
+    'decision_tree': (DecisionTreeRegressor, {'max_depth': [5, 10, None],
+                                              'min_samples_leaf': [1, 10],
+                                              'random_state': [42]}, False),
+    'random_forest': (RandomForestRegressor, {'n_estimators': [100, 300], 'max_features': [0.9],
+                                              'n_jobs': [1], 'random_state': [42]}, False),
+}
+
+TARGET = 'load_shortfall_3h'
+
+# The columns of the training data from which our features are engineered.
+RAW_COLUMNS = ['time', TARGET] + [column for column in FEATURE_COLUMNS if column not in _TIME_FEATURES]
+
+_features = None
+_target = None
+
+
+def feature_cache_key(data_path):
+    """A key identifying the engineered features of a training data file.
+
+    The key changes whenever the data, the version of our preprocessing
+    pipeline or the features it produces change.
+    """
+    digest = hashlib.sha256(source_hash(data_path).encode())
+    digest.update(f'pipeline-v{PIPELINE_VERSION}'.encode())
+    digest.update(json.dumps(FEATURE_COLUMNS).encode())
+    return digest.hexdigest()[:16]
+
+
+def load_features(data_path, cache_dir):
+    """Engineer the features of the training data, or load them from cache.
+
+    Parameters
+    ----------
+    data_path : str
+        The raw training data, e.g. `df_train.csv`.
+    cache_dir : str
+        The directory holding cached feature matrices.
+
+    Returns
+    -------
+    tuple
+        The path of the cached features, and whether they were just built.
+    """
+    path = os.path.join(cache_dir, feature_cache_key(data_path))
+    if os.path.isdir(path):
+        return path, False
+    train = read_dataset(data_path, RAW_COLUMNS)
+    categorical_encoders = fit_categorical_encoders(train)
+    fill_values = {'Valencia_pressure': float(train['Valencia_pressure'].mean())}
+    X_train = _preprocess_data(train, categorical_encoders, fill_values)
+
+    # Written to a temporary directory first, so that concurrent or
+    # interrupted runs never see a partial cache.
+    partial = f'{path}.{os.getpid()}.partial'
+    os.makedirs(partial, exist_ok=True)
+    np.save(os.path.join(partial, 'features.npy'), X_train.to_numpy(dtype=np.float64))
+    np.save(os.path.join(partial, 'target.npy'), train[TARGET].to_numpy(dtype=np.float64))
+    meta = {'source': os.path.abspath(data_path), 'pipeline_version': PIPELINE_VERSION,
+            'columns': list(X_train.columns), 'fill_values': fill_values,
+            'categorical_encoders': {column: encoder.to_dict()
+                                     for column, encoder in categorical_encoders.items()}}
+    with open(os.path.join(partial, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    try:
+        os.rename(partial, path)
+    except OSError:
+        # Another run cached the same features first.
+        shutil.rmtree(partial)
+    return path, True
+
+
+def _load_worker(cache_path):
+    """Private helper function mapping the cached features within each worker."""
+    global _features, _target
+    _features = np.load(os.path.join(cache_path, 'features.npy'), mmap_mode='r')
+    _target = np.load(os.path.join(cache_path, 'target.npy'), mmap_mode='r')
+
+
+def _fit(name, params, rows):
+    """Private helper function fitting a candidate on the given rows.
+
+    Returns
+    -------
+    FittedPipeline
+        The fitted model, with the standardisation it was trained with.
+    """
+    estimator_class, _, scaled = CANDIDATES[name]
+    X = np.asarray(_features[rows])
+    scaler_mean = scaler_scale = None
+    if scaled:
+        scaler_mean = X.mean(axis=0)
+        scaler_scale = X.std(axis=0)
+        scaler_scale[scaler_scale == 0] = 1.0
+        X = (X - scaler_mean) / scaler_scale
+    estimator = estimator_class(**params).fit(X, _target[rows])
+    return FittedPipeline(estimator, scaler_mean=scaler_mean, scaler_scale=scaler_scale)
+
+
+def _evaluate_fold(name, params, fold, folds):
+    """Private helper function cross-validating one fold of a candidate.
+
+    Returns
+    -------
+    dict
+        The RMSE on the held out rows, the seconds taken to fit, the fastest
+        time to predict a single record, and the pickled size of the model.
+    """
+    # Folds are shuffled, as was the split within our notebook.
+    splitter = KFold(n_splits=folds, shuffle=True, random_state=42)
+    train_rows, test_rows = list(splitter.split(_features))[fold]
+    started = time.perf_counter()
+    pipeline = _fit(name, params, train_rows)
+    fit_seconds = time.perf_counter() - started
+    predictions = pipeline.predict(np.asarray(_features[test_rows]))
+    rmse = float(np.sqrt(np.mean((predictions - _target[test_rows]) ** 2)))
+    record = np.asarray(_features[test_rows[:1]])
+    latency = min(_time_call(lambda: pipeline.predict(record)) for _ in range(20))
+    return {'rmse': rmse, 'fit_seconds': fit_seconds, 'predict_latency_ms': latency * 1000,
+            'artifact_bytes': len(pickle.dumps(pipeline.estimator))}
+
+
+def _time_call(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def parameter_grid(grid):
+    """Every combination of the hyperparameters in `grid`."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def leaderboard(tasks, results):
+    """Average the fold results of each candidate setting, best first.
+
+    Parameters
+    ----------
+    tasks : list
+        The `(name, params, fold, folds)` of each evaluated fold.
+    results : list
+        The result of each task, as given by `_evaluate_fold()`.
+
+    Returns
+    -------
+    Pandas DataFrame
+        One row per candidate setting, ordered by mean RMSE.
+    """
+    rows = {}
+    for (name, params, _, _), result in zip(tasks, results):
+        rows.setdefault((name, json.dumps(params, sort_keys=True)), []).append(result)
+    board = pd.DataFrame([
+        {'model': name, 'params': params,
+         'rmse': np.mean([fold['rmse'] for fold in folds]),
+         'rmse_std': np.std([fold['rmse'] for fold in folds]),
+         'fit_seconds': np.mean([fold['fit_seconds'] for fold in folds]),
+         'predict_latency_ms': np.median([fold['predict_latency_ms'] for fold in folds]),
+         'artifact_bytes': int(np.mean([fold['artifact_bytes'] for fold in folds]))}
+        for (name, params), folds in rows.items()])
+    board = board.sort_values('rmse', ignore_index=True)
+    board.index += 1
+    board.index.name = 'rank'
+    return board
+
+
+def export_winner(cache_path, name, params, save_path):
+    """Refit the winning candidate on all training data and save it for serving."""
+    _load_worker(cache_path)
+    with open(os.path.join(cache_path, 'meta.json')) as meta_file:
+        meta = json.load(meta_file)
+    fitted = _fit(name, params, np.arange(len(_features)))
+    pipeline = FittedPipeline(
+        fitted.estimator, columns=meta['columns'], fill_values=meta['fill_values'],
+        categorical_encoders={column: CategoricalEncoder.from_dict(column, table)
+                              for column, table in meta['categorical_encoders'].items()},
+        scaler_mean=fitted.scaler_mean, scaler_scale=fitted.scaler_scale,
+        model_version=hashlib.sha1(pickle.dumps(fitted.estimator)).hexdigest()[:12])
+    with open(save_path, 'wb') as model_file:
+        pickle.dump(pipeline, model_file)
+    return pipeline
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-validate candidate models and export the best.')
+    parser.add_argument('--data', default='./data/df_train.csv')
+    parser.add_argument('--cache-dir', default='./data/feature-cache',
+                        help='Where engineered feature matrices are cached.')
+    parser.add_argument('--models', nargs='+', choices=sorted(CANDIDATES), default=sorted(CANDIDATES))
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--leaderboard', default='./leaderboard.csv',
+                        help='Where the leaderboard is written, as CSV. Not tracked by git by default.')
+    parser.add_argument('--output', default='../assets/trained-models/load_shortfall_selected_model.pkl',
+                        help='Where the winning pipeline is saved.')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    cache_path, built = load_features(args.data, args.cache_dir)
+    print(f"{'Engineered' if built else 'Loaded cached'} features from {cache_path} "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    tasks = [(name, params, fold, args.folds)
+             for name in args.models
+             for params in parameter_grid(CANDIDATES[name][1])
+             for fold in range(args.folds)]
+    print(f"Cross-validating {len(tasks) // args.folds} candidate settings over {args.folds} folds "
+          f"with {args.workers} workers...")
+    started = time.perf_counter()
+    # Larger ensembles are submitted first, so that they do not hold up the end of the run.
+    order = sorted(range(len(tasks)), key=lambda index: -tasks[index][1].get('n_estimators', 1))
+    with ProcessPoolExecutor(args.workers, initializer=_load_worker, initargs=(cache_path,)) as pool:
+        futures = {index: pool.submit(_evaluate_fold, *tasks[index]) for index in order}
+        results = [futures[index].result() for index in range(len(tasks))]
+    print(f"Cross-validation completed in {time.perf_counter() - started:.1f}s\n")
+
+    board = leaderboard(tasks, results)
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 60):
+        print(board.to_string(float_format=lambda value: f'{value:,.3f}'))
+    os.makedirs(os.path.dirname(os.path.abspath(args.leaderboard)), exist_ok=True)
+    board.to_csv(args.leaderboard)
+    print(f"\nLeaderboard saved to: {args.leaderboard}")
+
+    winner = board.iloc[0]
+    export_winner(cache_path, winner['model'], json.loads(winner['params']), args.output)
+    print(f"Exported the winning {winner['model']} {winner['params']} to: {args.output}")
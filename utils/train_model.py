@@ -5,27 +5,74 @@
 
     Description: This script is responsible for training a simple linear
     regression model which is used within the API for initial demonstration
-    purposes.
+    purposes. With `--time-series`, the model is also given the lag and
+    rolling features served by our feature store.
+
+    Usage: python train_model.py [--time-series]
 
 """
 
 # Dependencies
-import pandas as pd
+import os
+import sys
+import hashlib
 import pickle
 from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+# Reuse the preprocessing steps applied by our API.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model import _preprocess_data, fit_categorical_encoders, FittedPipeline, FEATURE_COLUMNS
+from feature_store import TIME_SERIES_FEATURES, time_series_features
+from request_schema import RequestSchema
+from dataset_cache import read_dataset
 
-# Fetch training data and preprocess for modeling
-train = pd.read_csv('./data/df_train.csv')
+# Fetch training data, through its columnar cache, and preprocess for modeling
+train = read_dataset('./data/df_train.csv')
 
 y_train = train[['load_shortfall_3h']]
-X_train = train[['Madrid_wind_speed','Bilbao_rain_1h','Valencia_wind_speed']]
+categorical_encoders = fit_categorical_encoders(train)
+fill_values = {'Valencia_pressure': float(train['Valencia_pressure'].mean())}
+# The schema of the feature records our API should accept. Time-series
+# features are served from the feature store, so are not request fields.
+request_schema = RequestSchema.from_training_data(train)
+columns = FEATURE_COLUMNS
+time_series = TIME_SERIES_FEATURES if '--time-series' in sys.argv[1:] else []
+if time_series:
+    # Each row is given the features served from the rows before it, with
+    # those which are unknown replaced by their mean.
+    series = time_series_features(train, time_series)
+    train = train.assign(**series)
+    fill_values.update({column: float(series[column].mean()) for column in series})
+    columns = FEATURE_COLUMNS + list(series.columns)
+X_train = _preprocess_data(train, categorical_encoders, fill_values, columns)
+
+# Standardise our features
+scaler = StandardScaler()
+X_scaled = scaler.fit_transform(X_train.to_numpy())
 
 # Fit model
-lm_regression = LinearRegression(normalize=True)
+lm_regression = LinearRegression()
 print ("Training Model...")
-lm_regression.fit(X_train, y_train)
+lm_regression.fit(X_scaled, y_train)
+
+# Store the model together with everything fitted to preprocess its inputs.
+pipeline = FittedPipeline(lm_regression,
+                          columns=X_train.columns,
+                          fill_values=fill_values,
+                          categorical_encoders=categorical_encoders,
+                          scaler_mean=scaler.mean_,
+                          scaler_scale=scaler.scale_,
+                          model_version=hashlib.sha1(pickle.dumps(lm_regression)).hexdigest()[:12],
+                          time_series_features=time_series)
 
 # Pickle model for use within our API
-save_path = '../assets/trained-models/load_shortfall_simple_lm_regression.pkl'
+save_path = '../assets/trained-models/' + ('load_shortfall_time_series_lm_regression.pkl' if time_series
+                                           else 'load_shortfall_simple_lm_regression.pkl')
 print (f"Training completed. Saving model to: {save_path}")
-pickle.dump(lm_regression, open(save_path,'wb'))
+pickle.dump(pipeline, open(save_path,'wb'))
+
+# Store the schema of the feature records our API should accept.
+schema_path = '../assets/trained-models/load_shortfall_request_schema.json'
+print (f"Saving request schema to: {schema_path}")
+request_schema.save(schema_path)
@@ -0,0 +1,65 @@
+"""
+    Simple script to update our linear model with new observations
+
+    Description: This script folds newly labelled rows, holding the actual
+    `load_shortfall_3h` of past periods, into an online version of our
+    linear model, without refitting it from all of the training data. The
+    state of the online model is first built from `df_train.csv` with
+    `--init`. Each update then publishes the refreshed model, atomically
+    replacing the artifact given by `--output`. An API serving that
+    artifact with `LOAD_SHORTFALL_MODEL_RELOAD_CHECK_SECONDS` set swaps in
+    each published version by itself.
+
+    Usage: python update_model.py --init
+           python update_model.py observations.csv [observations.csv ...]
+
+"""
+
+# Dependencies
+import argparse
+import fcntl
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model import load_model
+from dataset_cache import read_dataset
+from online_model import (start_online_model, update_online_model, save_online_model,
+                          load_online_model, publish_online_model)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the linear model with new observations.')
+    parser.add_argument('observations', nargs='*',
+                        help='CSV files of feature records along with their load_shortfall_3h.')
+    parser.add_argument('--init', action='store_true',
+                        help='Build the online model from the training data and the served pipeline.')
+    parser.add_argument('--data', default='./data/df_train.csv')
+    parser.add_argument('--model', default='../assets/trained-models/load_shortfall_simple_lm_regression.pkl',
+                        help='The pipeline whose preprocessing the online model keeps.')
+    parser.add_argument('--state', default='../assets/trained-models/load_shortfall_online_state.pkl')
+    parser.add_argument('--output', default='../assets/trained-models/load_shortfall_online_lm_regression.pkl',
+                        help='Where the updated model is published for serving.')
+    args = parser.parse_args()
+    if not args.init and not args.observations:
+        parser.error('Give observations to add, or --init to build the online model.')
+
+    # Updates are applied one run at a time, so that none are lost.
+    with open(args.state + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if args.init:
+            online = start_online_model(load_model(args.model), read_dataset(args.data))
+            print(f"Built the online model from {online.estimator.n_samples_} rows of {args.data}")
+        else:
+            online = load_online_model(args.state)
+        for path in args.observations:
+            used, skipped = update_online_model(online, pd.read_csv(path))
+            print(f"Added {used} rows from {path}")
+            if len(skipped):
+                print(f"Skipped {len(skipped)} rows with missing or invalid values: "
+                      f"{', '.join(map(str, skipped[:20]))}{' ...' if len(skipped) > 20 else ''}")
+        save_online_model(online, args.state)
+        published = publish_online_model(online, args.output)
+    print(f"Published version {published.model_version}, trained on "
+          f"{online.estimator.n_samples_} rows, to: {args.output}")